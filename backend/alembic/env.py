@@ -1,9 +1,12 @@
+import asyncio
 import sys
 import os
 from logging.config import fileConfig
+from typing import Any, Dict, Optional
 
-from sqlalchemy import engine_from_config
 from sqlalchemy import pool
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 
@@ -11,15 +14,17 @@ from alembic import context
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from backend.models import Base
+from backend.models.base import pool_options
+from backend.models.search import MESSAGES_FTS_TABLE, MESSAGES_TRGM_INDEX
 from backend.config import settings
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
-# 設定ファイルからデータベースURLを設定（同期版）
-sync_database_url = settings.database_url.replace("sqlite+aiosqlite://", "sqlite://")
-config.set_main_option("sqlalchemy.url", sync_database_url)
+# 設定ファイルからデータベースURLを設定（非同期ドライバのままマイグレーションを実行）
+# configparserの補間を避けるため%をエスケープ
+config.set_main_option("sqlalchemy.url", settings.database_url.replace("%", "%%"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -36,6 +41,33 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_object(
+    object: Any, name: Optional[str], type_: str, reflected: bool, compare_to: Any
+) -> bool:
+    """autogenerate対象の判定
+
+    全文検索用のSQLite FTS5仮想テーブル（messages_fts と内部テーブル）と
+    PostgreSQLのトライグラムインデックスはモデル外（backend.models.search）で
+    管理しているため比較対象から除外する。
+    """
+    if type_ == "table" and reflected and name and name.startswith(MESSAGES_FTS_TABLE):
+        return False
+    if type_ == "index" and reflected and name == MESSAGES_TRGM_INDEX:
+        return False
+    return True
+
+
+def _configure_options(dialect_name: str) -> Dict[str, Any]:
+    """方言ごとのマイグレーション設定"""
+    return {
+        "target_metadata": target_metadata,
+        "include_object": include_object,
+        "compare_type": True,
+        # SQLiteはALTER TABLEの機能が限られるため、テーブル再作成方式で変更する
+        "render_as_batch": dialect_name == "sqlite",
+    }
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -51,35 +83,50 @@ def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
         url=url,
-        target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        **_configure_options(make_url(url).get_backend_name()),
     )
 
     with context.begin_transaction():
         context.run_migrations()
 
 
-def run_migrations_online() -> None:
-    """Run migrations in 'online' mode.
+def do_run_migrations(connection: Connection) -> None:
+    """接続を使ってマイグレーションを実行"""
+    context.configure(
+        connection=connection,
+        **_configure_options(connection.dialect.name),
+    )
 
-    In this scenario we need to create an Engine
-    and associate a connection with the context.
+    with context.begin_transaction():
+        context.run_migrations()
 
-    """
-    connectable = engine_from_config(
+
+async def run_async_migrations() -> None:
+    """非同期エンジンで接続し、同期コンテキストでマイグレーションを実行"""
+    connect_args = pool_options(settings.database_url).get("connect_args", {})
+    connectable = async_engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        connect_args=connect_args,
     )
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode.
+
+    In this scenario we need to create an Engine
+    and associate a connection with the context.
 
-        with context.begin_transaction():
-            context.run_migrations()
+    """
+    asyncio.run(run_async_migrations())
 
 
 if context.is_offline_mode():
@@ -0,0 +1,106 @@
+"""
+Benchmark: per-request authentication overhead
+
+REST・WebSocketの認証で毎回行う処理（トークン検証 + ユーザー取得）を、
+キャッシュ無し（従来の動作）とキャッシュ有りで比較する。
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_auth.py [--iterations 20000]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from backend.auth.jwt_utils import JWTManager, TokenData, token_cache
+from backend.auth.user_service import UserService, user_cache
+from backend.models import Base
+from backend.models.user import User
+
+
+def _measure(func: Callable[[], Any], iterations: int) -> float:
+    """1回あたりのマイクロ秒"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+
+async def _measure_async(func: Callable[[], Awaitable[Any]], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    return round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with sessions() as db:
+        user = User(github_id=-1, username="bench", display_name="Bench", is_active=True)
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+
+    token = JWTManager.create_access_token(
+        TokenData(user_id=user_id, github_id=-1, username="bench")
+    )
+
+    def verify_uncached() -> None:
+        token_cache.clear()
+        JWTManager.verify_token(token)
+
+    def verify_cached() -> None:
+        JWTManager.verify_token(token)
+
+    async with sessions() as db:
+
+        async def authenticate_uncached() -> None:
+            token_cache.clear()
+            token_data = JWTManager.verify_token(token)
+            await UserService.get_user_by_id(db, token_data.user_id)
+            db.expunge_all()
+
+        async def authenticate_cached() -> None:
+            token_data = JWTManager.verify_token(token)
+            await UserService.get_cached_user_by_id(db, token_data.user_id)
+
+        results: Dict[str, Dict[str, float]] = {
+            "verify_token_us": {
+                "uncached": _measure(verify_uncached, args.iterations),
+                "cached": _measure(verify_cached, args.iterations),
+            },
+            "authenticate_us": {
+                "uncached": await _measure_async(authenticate_uncached, args.iterations // 4),
+                "cached": await _measure_async(authenticate_cached, args.iterations // 4),
+            },
+        }
+
+    await engine.dispose()
+    for timings in results.values():
+        timings["speedup"] = round(timings["uncached"] / timings["cached"], 1)
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "auth",
+                "params": vars(args),
+                "results": results,
+                "caches": {"tokens": token_cache.stats(), "users": user_cache.stats()},
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
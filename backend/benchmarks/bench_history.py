@@ -0,0 +1,218 @@
+"""
+Benchmark: message history response serialization
+
+100件ページの履歴取得（GET /api/v1/rooms/{id}/messages）を、以下の2通りで比較する。
+
+- orm_response_model: ORM（selectinloadでUser）→ MessageResponse → response_model
+  による再検証・シリアライズ（従来の実装）
+- projected_rows: 列の射影（MessageRow）→ 一度の json.dumps でバイト列（現在の実装）
+
+エンドポイント全体（ASGI経由）と、取得済みデータのシリアライズのみの両方を、
+1メッセージあたりのマイクロ秒で出力する。
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_history.py [--messages 2000] [--page-size 100] [--iterations 200]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+from fastapi import Depends, FastAPI, Query
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+from sqlalchemy.pool import StaticPool
+
+from backend.auth.dependencies import get_current_user
+from backend.chat.chat_service import ChatService
+from backend.chat.content_parser import parse_content
+from backend.chat.read_models import encode_message_rows
+from backend.chat.rest_router import MessageResponse, router
+from backend.models import Base
+from backend.models.base import get_read_db
+from backend.models.chat_room import ChatRoom, RoleType, RoomMember
+from backend.models.message import Message
+from backend.models.user import User
+
+
+async def _measure(func: Callable[[], Awaitable[Any]], iterations: int, per: int) -> float:
+    """1件あたりのマイクロ秒"""
+    await func()  # ウォームアップ
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    return round((time.perf_counter() - started) / iterations / per * 1e6, 2)
+
+
+async def _seed(sessions: async_sessionmaker, messages: int) -> tuple:
+    """10人が参加するルームにメッセージを作成"""
+    async with sessions() as db:
+        users = [
+            User(
+                github_id=-i,
+                username=f"bench{i}",
+                display_name=f"Bench User {i}",
+                avatar_url=f"https://avatars.githubusercontent.com/u/{i}",
+                is_active=True,
+            )
+            for i in range(1, 11)
+        ]
+        db.add_all(users)
+        await db.flush()
+        room = ChatRoom(name="bench", created_by=users[0].id)
+        db.add(room)
+        await db.flush()
+        db.add_all(
+            RoomMember(user_id=user.id, room_id=room.id, role=RoleType.MEMBER) for user in users
+        )
+        await db.commit()
+        user_ids = [user.id for user in users]
+        room_id = room.id
+
+    async with sessions() as db:
+        for i in range(messages):
+            content = f"message {i} with `inline code` and $x^{i % 7}$ math"
+            await ChatService.save_message(db, content, user_ids[i % len(user_ids)], room_id)
+    return user_ids[0], room_id
+
+
+async def _get_room_messages(db: AsyncSession, room_id: int, limit: int) -> List[Message]:
+    """従来の実装の履歴取得（ORM + selectinloadでUser。計測用のデータはアーカイブしない）"""
+    result = await db.execute(
+        select(Message)
+        .where(Message.room_id == room_id)
+        .options(selectinload(Message.user))
+        .order_by(desc(Message.id))
+        .limit(limit)
+    )
+    return list(reversed(result.scalars().all()))
+
+
+def _message_fields(message: Message) -> Dict[str, Any]:
+    """従来の実装のレスポンス用フィールド（ORMのMessageとUserから作る）"""
+    return {
+        "id": message.id,
+        "content": message.content,
+        "message_type": message.message_type.value,
+        "user": {
+            "id": message.user.id,
+            "username": message.user.username,
+            "display_name": message.user.display_name,
+            "avatar_url": message.user.avatar_url,
+        },
+        "room_id": message.room_id,
+        "parent_id": message.parent_id,
+        "has_latex": message.has_latex,
+        "has_code": message.has_code,
+        "segments": message.segments or parse_content(message.content),
+        "reply_count": message.reply_count,
+        "last_reply_at": message.last_reply_at.isoformat() if message.last_reply_at else None,
+        "created_at": message.created_at.isoformat(),
+    }
+
+
+def _legacy_app(sessions: async_sessionmaker) -> FastAPI:
+    """従来の実装（ORM + response_model）を再現したアプリ"""
+    app = FastAPI()
+
+    @app.get("/rooms/{room_id}/messages", response_model=List[MessageResponse])
+    async def get_room_messages(
+        room_id: int,
+        limit: int = Query(50, ge=1, le=100),
+        db: AsyncSession = Depends(get_read_db),
+    ):
+        messages = await _get_room_messages(db, room_id, limit)
+        return [MessageResponse(**_message_fields(message)) for message in messages]
+
+    return app
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    user_id, room_id = await _seed(sessions, args.messages)
+
+    async def read_db():
+        async with sessions() as session:
+            yield session
+
+    async with sessions() as db:
+        current_user = await db.get(User, user_id)
+
+    current_app = FastAPI()
+    current_app.include_router(router)
+    legacy_app = _legacy_app(sessions)
+    for app in (current_app, legacy_app):
+        app.dependency_overrides[get_read_db] = read_db
+        app.dependency_overrides[get_current_user] = lambda: current_user
+
+    page = args.page_size
+    results: Dict[str, Dict[str, float]] = {}
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=legacy_app), base_url="http://bench"
+    ) as legacy, httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=current_app), base_url="http://bench"
+    ) as current:
+        legacy_body = (await legacy.get(f"/rooms/{room_id}/messages?limit={page}")).json()
+        current_body = (await current.get(f"/api/v1/rooms/{room_id}/messages?limit={page}")).json()
+        assert legacy_body == current_body, "response schema differs"
+
+        results["endpoint_us_per_message"] = {
+            "orm_response_model": await _measure(
+                lambda: legacy.get(f"/rooms/{room_id}/messages?limit={page}"),
+                args.iterations,
+                page,
+            ),
+            "projected_rows": await _measure(
+                lambda: current.get(f"/api/v1/rooms/{room_id}/messages?limit={page}"),
+                args.iterations,
+                page,
+            ),
+        }
+
+    # 取得済みデータのシリアライズのみ（response_modelの検証・エンコードを含む）
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    adapter = TypeAdapter(List[MessageResponse])
+    async with sessions() as db:
+        messages = await _get_room_messages(db, room_id, page)
+        rows = await ChatService.get_room_message_rows(db, room_id, page)
+
+    async def serialize_legacy() -> None:
+        content = [MessageResponse(**_message_fields(message)) for message in messages]
+        validated = adapter.validate_python(content, from_attributes=True)
+        JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+    async def serialize_current() -> None:
+        encode_message_rows(rows)
+
+    results["serialize_us_per_message"] = {
+        "orm_response_model": await _measure(serialize_legacy, args.iterations, page),
+        "projected_rows": await _measure(serialize_current, args.iterations, page),
+    }
+
+    await engine.dispose()
+    for timings in results.values():
+        timings["speedup"] = round(timings["orm_response_model"] / timings["projected_rows"], 1)
+
+    print(
+        json.dumps(
+            {"benchmark": "history_serialization", "params": vars(args), "results": results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
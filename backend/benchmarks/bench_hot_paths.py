@@ -0,0 +1,329 @@
+"""
+Benchmark suite: ChatService / ConnectionManager hot paths
+
+シードしたSQLiteデータセット（backend.seed、seed固定で毎回同じデータ）に対して、
+リクエストごとに実行される処理を1回あたりのマイクロ秒で計測する。
+
+- save_message: 最大のルームへの投稿（コミットまで）
+- get_room_message_rows: 最大のルームの履歴ページ（最新 / 1,000件前 / 10,000件前）
+- get_user_rooms: 参加ルーム数 10 / 100 / 全ルームのユーザー
+- get_feed_rows: タイムライン投稿20,000件のフィードのページ（最新 / 10,000件前）。
+  フィードへの書き込みのみ（push）と、fan-out-on-readの投稿者2人分を合わせる場合（pull）
+- verify_token: キャッシュ無し / キャッシュ有り
+- broadcast_to_room: 10 / 100 / 1,000接続のルームへの配信（送信は何もしない偽のソケット）
+- relay_signal: 通話のoffer（SDP約4KB）の中継
+
+各ケースは --repeats 回計測した中央値を使う。結果はJSONで出力し、
+benchmarks/thresholds.json の上限（マイクロ秒）と、--baseline に渡した以前の結果
+からの悪化率（--max-regression）で回帰を判定する。回帰があれば終了コード1で終わる。
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_hot_paths.py [--messages 50000] [--output results.json]
+    PYTHONPATH=src python benchmarks/bench_hot_paths.py --baseline main.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from sqlalchemy import desc, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.auth.jwt_utils import JWTManager, TokenData, token_cache
+from backend.call.call_manager import ActiveCall, call_manager
+from backend.call.signaling import relay_signal
+from backend.chat.chat_service import ChatService
+from backend.chat.websocket_manager import ConnectionManager, connection_manager
+from backend.models import Base
+from backend.models.base import create_engines
+from backend.models.chat_room import ChatRoom, RoleType, RoomMember
+from backend.models.message import Message
+from backend.models.timeline import TimelineFeedEntry, TimelinePost, TimelinePullAuthor
+from backend.models.user import User
+from backend.seed import SeedConfig, seed_database
+from backend.timeline.feed_service import FeedService
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+DEFAULT_THRESHOLDS = BENCHMARK_DIR / "thresholds.json"
+
+HISTORY_DEPTHS = (0, 1000, 10000)
+MEMBERSHIP_COUNTS = (10, 100, None)  # None = 全ルーム
+FANOUTS = (10, 100, 1000)
+FEED_POSTS = 20_000
+FEED_DEPTHS = (0, 10000)
+
+
+class FakeWebSocket:
+    """送信内容を捨てるだけのWebSocket"""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_text(self, data: str) -> None:
+        self.sent += 1
+
+
+async def _measure(func: Callable[[], Awaitable[Any]], iterations: int, repeats: int) -> float:
+    """repeats回計測した、1回あたりのマイクロ秒の中央値"""
+    await func()  # ウォームアップ
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        samples.append((time.perf_counter() - started) / iterations * 1e6)
+    return round(statistics.median(samples), 2)
+
+
+async def _add_member_users(writer: Any, room_ids: List[int], counts: Dict[str, int]) -> Dict[str, int]:
+    """指定数のルームに参加するユーザーを作成し、ケース名 -> user_id を返す"""
+    user_ids = {}
+    async with writer.begin() as conn:
+        next_id = (await conn.execute(select(User.id).order_by(desc(User.id)).limit(1))).scalar() + 1
+        for offset, (name, count) in enumerate(counts.items()):
+            user_id = next_id + offset
+            await conn.execute(
+                insert(User.__table__),
+                [{"id": user_id, "github_id": -user_id, "username": f"bench-{name}", "is_active": True}],
+            )
+            if count:
+                await conn.execute(
+                    insert(RoomMember.__table__),
+                    [
+                        {"user_id": user_id, "room_id": room_id, "role": RoleType.MEMBER}
+                        for room_id in room_ids[:count]
+                    ],
+                )
+            user_ids[name] = user_id
+    return user_ids
+
+
+async def _add_feed(writer: Any, room_id: int, authors: List[int], readers: Dict[str, int]) -> None:
+    """authors[0]の投稿をreadersのフィードに書き込み、残りの投稿者は書き込まない投稿者にする
+
+    3投稿に1件ずつ、2件目・3件目を authors[1] / authors[2] の書き込まない投稿にする。
+    readers["pull"] だけがルームに参加し、書き込まない投稿者の投稿も読み出す。
+    """
+    pushed_author, pulled_authors = authors[0], authors[1:3]
+    posts, entries = [], []
+    for index in range(FEED_POSTS):
+        post_id = index + 1
+        fanned_out = index % 3 == 0
+        author = pushed_author if fanned_out else pulled_authors[index % 3 - 1]
+        posts.append(
+            {"id": post_id, "content": f"feed post {index}", "user_id": author, "fanned_out": fanned_out}
+        )
+        if fanned_out:
+            entries.extend({"user_id": reader, "post_id": post_id} for reader in readers.values())
+    async with writer.begin() as conn:
+        await conn.execute(insert(TimelinePost.__table__), posts)
+        await conn.execute(insert(TimelineFeedEntry.__table__), entries)
+        await conn.execute(
+            insert(TimelinePullAuthor.__table__), [{"user_id": author} for author in pulled_authors]
+        )
+        await conn.execute(
+            insert(RoomMember.__table__),
+            [{"user_id": readers["pull"], "room_id": room_id, "role": RoleType.MEMBER}],
+        )
+
+
+async def bench_database(args: argparse.Namespace, path: Path) -> Dict[str, float]:
+    writer, reader = create_engines(f"sqlite+aiosqlite:///{path}", sqlite_production=True)
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    config = SeedConfig(users=args.users, rooms=args.rooms, messages=args.messages, seed=args.seed)
+    await seed_database(writer, config)
+
+    writer_sessions = async_sessionmaker(writer, class_=AsyncSession, expire_on_commit=False)
+    reader_sessions = async_sessionmaker(reader, class_=AsyncSession, expire_on_commit=False)
+    results: Dict[str, float] = {}
+
+    async with reader_sessions() as db:
+        # 生成データでは最初のルームがメンバー数・メッセージ数とも最大
+        room_ids = list((await db.execute(select(ChatRoom.id).order_by(ChatRoom.id))).scalars())
+        room_id = room_ids[0]
+        members = list(
+            (await db.execute(select(RoomMember.user_id).where(RoomMember.room_id == room_id))).scalars()
+        )
+        cursors = {}
+        for depth in HISTORY_DEPTHS:
+            cursors[depth] = (
+                await db.execute(
+                    select(Message.id)
+                    .where(Message.room_id == room_id)
+                    .order_by(desc(Message.id))
+                    .offset(depth)
+                    .limit(1)
+                )
+            ).scalar() if depth else None
+
+    membership_users = await _add_member_users(
+        writer,
+        room_ids,
+        {f"rooms_{count or 'all'}": count or len(room_ids) for count in MEMBERSHIP_COUNTS},
+    )
+    feed_users = await _add_member_users(writer, room_ids, {"feed_push": 0, "feed_pull": 0})
+    feed_readers = {"push": feed_users["feed_push"], "pull": feed_users["feed_pull"]}
+    await _add_feed(writer, room_id, members[:3], feed_readers)
+
+    async with writer_sessions() as db:
+
+        async def save() -> None:
+            await ChatService.save_message(db, "benchmark message with `code` and $x^2$", members[0], room_id)
+            db.expunge_all()
+
+        results["save_message"] = await _measure(save, args.iterations // 10, args.repeats)
+
+    async with reader_sessions() as db:
+        for depth, before_id in cursors.items():
+
+            async def history(before_id=before_id) -> None:
+                await ChatService.get_room_message_rows(db, room_id, args.page_size, before_id)
+
+            results[f"get_room_message_rows.depth_{depth}"] = await _measure(
+                history, args.iterations, args.repeats
+            )
+
+        for name, user_id in membership_users.items():
+
+            async def rooms(user_id=user_id) -> None:
+                await ChatService.get_user_rooms(db, user_id)
+
+            results[f"get_user_rooms.{name}"] = await _measure(rooms, args.iterations // 2, args.repeats)
+
+        for mode, user_id in feed_readers.items():
+            for depth in FEED_DEPTHS:
+                # depth件前の投稿IDをカーソルにする（投稿IDは1から連番）
+                before_id = FEED_POSTS + 1 - depth if depth else None
+
+                async def feed(user_id=user_id, before_id=before_id) -> None:
+                    await FeedService.get_feed_rows(db, user_id, args.page_size, before_id)
+
+                results[f"get_feed_rows.{mode}.depth_{depth}"] = await _measure(
+                    feed, args.iterations, args.repeats
+                )
+
+    await writer.dispose()
+    if reader is not writer:
+        await reader.dispose()
+    return results
+
+
+async def bench_in_memory(args: argparse.Namespace) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    token = JWTManager.create_access_token(TokenData(user_id=1, github_id=-1, username="bench"))
+
+    async def verify_uncached() -> None:
+        token_cache.clear()
+        JWTManager.verify_token(token)
+
+    async def verify_cached() -> None:
+        JWTManager.verify_token(token)
+
+    results["verify_token.uncached"] = await _measure(verify_uncached, args.iterations * 10, args.repeats)
+    results["verify_token.cached"] = await _measure(verify_cached, args.iterations * 10, args.repeats)
+
+    message = {
+        "type": "message_received",
+        "payload": {
+            "id": 1,
+            "content": "benchmark message with `code` and $x^2$",
+            "user": {"id": 1, "username": "bench", "display_name": "Bench", "avatar_url": None},
+            "room_id": 1,
+            "segments": [["text", "benchmark message with "], ["inline_code", "code"]],
+        },
+        "timestamp": "2024-01-01T00:00:00",
+    }
+    for fanout in FANOUTS:
+        manager = ConnectionManager()
+        manager.active_connections = {user_id: FakeWebSocket() for user_id in range(fanout)}
+        manager.room_connections = {1: set(range(fanout))}
+
+        async def broadcast(manager=manager) -> None:
+            await manager.broadcast_to_room(1, message)
+
+        results[f"broadcast_to_room.fanout_{fanout}"] = await _measure(
+            broadcast, max(10, args.iterations * 10 // fanout), args.repeats
+        )
+
+    # 2人の通話での中継（グローバルな接続・通話マネージャーを使う）
+    caller, callee = User(id=1, username="caller"), User(id=2, username="callee")
+    connection_manager.active_connections.update({1: FakeWebSocket(), 2: FakeWebSocket()})
+    call_manager.calls[1] = ActiveCall(1, 1, None, {1: {"id": 1}, 2: {"id": 2}})
+    call_manager.user_calls.update({1: 1, 2: 1})
+    sdp = "v=0\r\n" + "a=candidate:0 1 UDP 2122252543 198.51.100.1 50000 typ host\r\n" * 60
+    offer = {"target_user_id": callee.id, "sdp": sdp}
+
+    async def relay() -> None:
+        await relay_signal(caller, "call_offer", offer)
+
+    results["relay_signal.offer"] = await _measure(relay, args.iterations * 10, args.repeats)
+    return results
+
+
+def check(
+    results: Dict[str, float],
+    thresholds: Dict[str, float],
+    baseline: Dict[str, float],
+    max_regression: float,
+) -> List[str]:
+    """回帰の一覧（上限超過と、基準結果からの悪化）"""
+    failures = []
+    for name, value in results.items():
+        limit = thresholds.get(name)
+        if limit is not None and value > limit:
+            failures.append(f"{name}: {value}us exceeds threshold {limit}us")
+        previous = baseline.get(name)
+        if previous and value > previous * (1 + max_regression):
+            failures.append(
+                f"{name}: {value}us is {value / previous - 1:.0%} slower than baseline {previous}us"
+            )
+    return failures
+
+
+async def main(args: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory(prefix="bench-hot-paths-") as workdir:
+        results = await bench_database(args, Path(workdir) / "bench.db")
+    results.update(await bench_in_memory(args))
+
+    thresholds = json.loads(args.thresholds.read_text()) if args.thresholds.exists() else {}
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else {}
+    failures = check(results, thresholds.get("max_us", {}), baseline, args.max_regression)
+
+    report = {
+        "benchmark": "hot_paths",
+        "params": {
+            key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()
+        },
+        "unit": "us_per_call",
+        "results": results,
+        "failures": failures,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--thresholds", type=Path, default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--baseline", type=Path, default=None, help="比較対象の以前の結果JSON")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="基準結果からの許容悪化率")
+    parser.add_argument("--output", type=Path, default=None)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,117 @@
+"""
+Benchmark: GitHub login round trips against the local stub server
+
+スタブGitHubサーバーを同一プロセスで起動し、ログイン時のGitHub呼び出し
+（コード交換 + ユーザー情報・メール取得）を以下の2通りで比較する。
+
+- per_call_client: 呼び出しごとにhttpx.AsyncClientを作成（従来の動作）
+- shared_client: 共有クライアント（keep-alive）。メールはユーザー情報で非公開の場合だけ取得
+
+Usage:
+    PYTHONPATH=src:. python benchmarks/bench_login.py [--logins 500] [--concurrency 20] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """パーセンタイル（ミリ秒）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+    return round(ordered[index] * 1000, 3)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_logins(
+    mode: str, logins: int, concurrency: int, shared: Optional[httpx.AsyncClient]
+) -> Dict[str, Any]:
+    from backend.auth.github_oauth import GitHubOAuthService
+
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login(index: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            if shared is not None:
+                token = await GitHubOAuthService.exchange_code_for_token(f"code{index}", "http://localhost")
+                user = await GitHubOAuthService.get_user_info(token) if token else None
+            else:
+                # 従来の実装と同様に、呼び出しごとに新しいクライアント（接続）を使う
+                async with httpx.AsyncClient() as client:
+                    token = await GitHubOAuthService.exchange_code_for_token(
+                        f"code{index}", "http://localhost", client=client
+                    )
+                async with httpx.AsyncClient() as client:
+                    user = await GitHubOAuthService.get_user_info(token, client=client) if token else None
+            if user is None or not user.email:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "logins_per_sec": round(logins / elapsed, 1),
+        "p50_ms": _percentile(latencies, 50),
+        "p99_ms": _percentile(latencies, 99),
+        "failures": failures,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ["GITHUB_STUB_LATENCY_MS"] = str(args.latency_ms)
+    from benchmarks import github_stub
+
+    github_stub.LATENCY_SECONDS = args.latency_ms / 1000
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(github_stub.app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    from backend.auth.github_oauth import GitHubOAuthService
+
+    base_url = f"http://127.0.0.1:{port}"
+    GitHubOAuthService.GITHUB_TOKEN_URL = f"{base_url}/login/oauth/access_token"
+    GitHubOAuthService.GITHUB_USER_URL = f"{base_url}/user"
+    GitHubOAuthService.GITHUB_USER_EMAIL_URL = f"{base_url}/user/emails"
+
+    results = [await run_logins("per_call_client", args.logins, args.concurrency, None)]
+    shared = GitHubOAuthService.open_client()
+    results.append(await run_logins("shared_client", args.logins, args.concurrency, shared))
+    await GitHubOAuthService.close_client()
+
+    server.should_exit = True
+    await server_task
+
+    print(json.dumps({"benchmark": "github_login", "params": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="スタブの1レスポンスあたりの遅延")
+    asyncio.run(main(parser.parse_args()))
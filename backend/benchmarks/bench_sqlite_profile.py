@@ -0,0 +1,126 @@
+"""
+Benchmark: default SQLite engine vs SQLite production profile
+
+同一のワークロード（並行書き込み + 並行履歴読み取り）を、既定のエンジンと
+本番プロファイル（WAL・pragma調整・読み書きエンジン分離）で実行し比較する。
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_sqlite_profile.py [--duration 5] [--writers 4] [--readers 16]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.chat.chat_service import ChatService
+from backend.models import Base
+from backend.models.base import create_engines
+from backend.models.chat_room import ChatRoom, RoomMember
+from backend.models.user import User
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """パーセンタイル（ミリ秒）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+    return round(ordered[index] * 1000, 3)
+
+
+async def _seed(session_factory: async_sessionmaker, writers: int) -> int:
+    """ベンチマーク用のユーザーとルームを作成"""
+    async with session_factory() as db:
+        users = [User(github_id=-(i + 1), username=f"bench{i}") for i in range(writers)]
+        db.add_all(users)
+        await db.flush()
+        room = ChatRoom(name="bench", created_by=users[0].id)
+        db.add(room)
+        await db.flush()
+        db.add_all(RoomMember(user_id=user.id, room_id=room.id) for user in users)
+        await db.commit()
+        return room.id
+
+
+async def run_profile(path: Path, production: bool, args: argparse.Namespace) -> Dict[str, Any]:
+    """1つのプロファイルでワークロードを実行"""
+    url = f"sqlite+aiosqlite:///{path}"
+    writer, reader = create_engines(url, sqlite_production=production)
+    writer_sessions = async_sessionmaker(writer, class_=AsyncSession, expire_on_commit=False)
+    reader_sessions = async_sessionmaker(reader, class_=AsyncSession, expire_on_commit=False)
+
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    room_id = await _seed(writer_sessions, args.writers)
+
+    write_latencies: List[float] = []
+    read_latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def write_loop(user_id: int) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with writer_sessions() as db:
+                    await ChatService.save_message(db, "benchmark $x^2$ message", user_id, room_id)
+                write_latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+
+    async def read_loop() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with reader_sessions() as db:
+                    await ChatService.get_room_message_rows(db, room_id, limit=50)
+                read_latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                errors += 1
+
+    await asyncio.gather(
+        *(write_loop(user_id) for user_id in range(1, args.writers + 1)),
+        *(read_loop() for _ in range(args.readers)),
+    )
+
+    await writer.dispose()
+    if reader is not writer:
+        await reader.dispose()
+
+    return {
+        "profile": "production" if production else "default",
+        "writes_per_sec": round(len(write_latencies) / args.duration, 1),
+        "reads_per_sec": round(len(read_latencies) / args.duration, 1),
+        "write_p50_ms": _percentile(write_latencies, 50),
+        "write_p99_ms": _percentile(write_latencies, 99),
+        "read_p50_ms": _percentile(read_latencies, 50),
+        "read_p99_ms": _percentile(read_latencies, 99),
+        "read_mean_ms": round(statistics.fmean(read_latencies) * 1000, 3) if read_latencies else 0.0,
+        "errors": errors,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [
+            await run_profile(Path(tmp) / "default.db", False, args),
+            await run_profile(Path(tmp) / "production.db", True, args),
+        ]
+    print(json.dumps({"benchmark": "sqlite_profile", "params": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
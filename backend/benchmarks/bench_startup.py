@@ -0,0 +1,203 @@
+"""
+Benchmark suite: worker cold start
+
+オートスケールで追加されたワーカーが応答できるようになるまでの時間を計測する。
+それぞれ新しいPythonプロセスで --repeats 回計測し、中央値を使う。
+
+- import_ms: `import backend.main` にかかる時間（インタプリタの起動を除く）
+- first_request_ms: uvicornのプロセスを起動してから GET /health が200を返すまで
+  （インポート、起動処理（lifespan）、最初のリクエストの処理を含む）
+
+あわせて `python -X importtime` の結果から、自己時間の大きいモジュールと
+backendの各モジュールの累積時間を出力する（-X importtime自体の計測負荷で値は大きめになる）。
+
+benchmarks/thresholds.json の startup_ms の上限と、--baseline に渡した以前の結果
+からの悪化率（--max-regression）で回帰を判定する。回帰があれば終了コード1で終わる。
+
+Usage:
+    PYTHONPATH=src python benchmarks/bench_startup.py [--repeats 5] [--output results.json]
+    PYTHONPATH=src python benchmarks/bench_startup.py --baseline main.json --max-regression 0.25
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARK_DIR.parent
+DEFAULT_THRESHOLDS = BENCHMARK_DIR / "thresholds.json"
+
+TIMED_IMPORT = (
+    "import time; started = time.perf_counter(); import backend.main; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def _env(database_url: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "bench-startup-secret")
+    env.update(
+        {
+            "DATABASE_URL": database_url,
+            "PYTHONPATH": os.pathsep.join([str(BACKEND_DIR / "src"), env.get("PYTHONPATH", "")]),
+        }
+    )
+    return env
+
+
+def _create_schema(path: Path) -> str:
+    """計測用のSQLiteデータベースを作成し、アプリ用のURLを返す（起動処理がテーブルを読むため）"""
+    from sqlalchemy import create_engine
+
+    from backend.models import Base
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    """新しいプロセスで backend.main をインポートする時間（ミリ秒）"""
+    output = subprocess.run(
+        [sys.executable, "-c", TIMED_IMPORT],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def import_profile(env: Dict[str, str], top: int) -> Dict[str, object]:
+    """-X importtime の結果（自己時間の大きいモジュールと、backendのモジュールの累積時間。ミリ秒）"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stderr
+    modules: List[Tuple[str, float, float]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    by_self = sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+    return {
+        "top_self_ms": {name: round(self_ms, 2) for name, self_ms, _ in by_self},
+        "backend_cumulative_ms": {
+            name: round(cumulative_ms, 2)
+            for name, _, cumulative_ms in modules
+            if name == "backend" or name.startswith("backend.")
+        },
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_request(env: Dict[str, str], timeout: float = 60) -> float:
+    """uvicornの起動から GET /health が200を返すまでの時間（ミリ秒）"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "backend.main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError("server did not respond")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def check(
+    results: Dict[str, float],
+    thresholds: Dict[str, float],
+    baseline: Dict[str, float],
+    max_regression: float,
+) -> List[str]:
+    """回帰の一覧（上限超過と、基準結果からの悪化）"""
+    failures = []
+    for name, value in results.items():
+        limit = thresholds.get(name)
+        if limit is not None and value > limit:
+            failures.append(f"{name}: {value}ms exceeds budget {limit}ms")
+        previous = baseline.get(name)
+        if previous and value > previous * (1 + max_regression):
+            failures.append(
+                f"{name}: {value}ms is {value / previous - 1:.0%} slower than baseline {previous}ms"
+            )
+    return failures
+
+
+def main(args: argparse.Namespace) -> int:
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        env = _env(_create_schema(Path(workdir) / "bench.db"))
+        measure_import(env)  # ウォームアップ（バイトコードのコンパイルとOSのページキャッシュ）
+        imports = [measure_import(env) for _ in range(args.repeats)]
+        first_requests = [measure_first_request(env) for _ in range(args.repeats)]
+        profile = import_profile(env, args.top)
+
+    results = {
+        "import_ms": round(statistics.median(imports), 1),
+        "first_request_ms": round(statistics.median(first_requests), 1),
+    }
+    thresholds = json.loads(args.thresholds.read_text()) if args.thresholds.exists() else {}
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else {}
+    failures = check(results, thresholds.get("startup_ms", {}), baseline, args.max_regression)
+
+    report = {
+        "benchmark": "startup",
+        "params": {
+            key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()
+        },
+        "unit": "ms",
+        "results": results,
+        "samples": {
+            "import_ms": [round(value, 1) for value in imports],
+            "first_request_ms": [round(value, 1) for value in first_requests],
+        },
+        "importtime": profile,
+        "failures": failures,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="出力する自己時間の大きいモジュールの数")
+    parser.add_argument("--thresholds", type=Path, default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--baseline", type=Path, default=None, help="比較対象の以前の結果JSON")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="基準結果からの許容悪化率")
+    parser.add_argument("--output", type=Path, default=None)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Stub GitHub OAuth/API server for offline login load tests
+
+ログインで使うGitHubのエンドポイントだけを返す最小のサーバー。
+GITHUB_STUB_LATENCY_MS で各レスポンスに遅延を加え、実際のAPIの往復時間を模擬する。
+
+Usage:
+    GITHUB_STUB_LATENCY_MS=50 uvicorn benchmarks.github_stub:app --port 9000
+    GITHUB_OAUTH_BASE_URL=http://127.0.0.1:9000 GITHUB_API_BASE_URL=http://127.0.0.1:9000 \\
+        uvicorn backend.main:app
+"""
+import asyncio
+import os
+import zlib
+
+from fastapi import FastAPI, Form, Header, HTTPException
+
+LATENCY_SECONDS = float(os.environ.get("GITHUB_STUB_LATENCY_MS", "0")) / 1000
+
+app = FastAPI(title="GitHub stub")
+
+
+def _user_id(authorization: str) -> int:
+    """アクセストークンから決定的なユーザーIDを作る（同じコードなら同じユーザー）"""
+    token = authorization.removeprefix("token ").strip()
+    if not token.startswith("stub-"):
+        raise HTTPException(status_code=401, detail="Bad credentials")
+    return zlib.crc32(token.encode()) % 1_000_000 + 1
+
+
+async def _delay() -> None:
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+
+
+@app.post("/login/oauth/access_token")
+async def access_token(code: str = Form(...)):
+    await _delay()
+    return {"access_token": f"stub-{code}", "token_type": "bearer", "scope": "user:email"}
+
+
+@app.get("/user")
+async def user(authorization: str = Header(...)):
+    await _delay()
+    user_id = _user_id(authorization)
+    return {
+        "id": user_id,
+        "login": f"stub{user_id}",
+        "name": f"Stub User {user_id}",
+        # 半数のユーザーはメールアドレス非公開（/user/emails から取得される）
+        "email": f"stub{user_id}@example.com" if user_id % 2 else None,
+        "avatar_url": f"https://avatars.githubusercontent.com/u/{user_id}",
+        "bio": None,
+    }
+
+
+@app.get("/user/emails")
+async def user_emails(authorization: str = Header(...)):
+    await _delay()
+    user_id = _user_id(authorization)
+    return [
+        {"email": f"stub{user_id}@users.noreply.github.com", "primary": False, "verified": True},
+        {"email": f"stub{user_id}@example.com", "primary": True, "verified": True},
+    ]
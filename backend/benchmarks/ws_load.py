@@ -0,0 +1,463 @@
+"""
+Load test: WebSocket chat delivery latency under uvicorn
+
+実際のアプリ（backend.main:app）をuvicornの別プロセスで起動し、多数の /ws/chat
+クライアントをルームに接続してメッセージを送り合う。ルームの人数はZipf分布で
+偏らせる（最大のルームに多くのクライアントが集まる）。
+
+- 各クライアントは平均 --rate 件/分のポアソン過程でメッセージを送る
+- 配信遅延は送信から各受信者（送信者自身を含む）が受け取るまでの時間。
+  メッセージごとに最後の受信者までの時間も集計する
+- 計測期間（--duration）中に送ったメッセージのみを集計する（--warmup の間は送るが数えない）
+- サーバープロセスのCPU使用率とRSS、負荷生成側（このプロセス）のCPU使用率を記録する。
+  負荷生成側のCPUが100%に近い場合は、遅延にクライアント側の処理待ちが含まれる
+
+結果はJSONで保存されるため、ブランチ間で --compare により比較できる。
+
+Usage:
+    PYTHONPATH=src python benchmarks/ws_load.py [--clients 2000] [--rooms 50] [--duration 30]
+    PYTHONPATH=src python benchmarks/ws_load.py --clients 500 --compare benchmarks/results/ws_load-main.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARK_DIR.parent
+
+# トークンを発行するこのプロセスとサーバーで同じ鍵を使う
+os.environ.setdefault("SECRET_KEY", "ws-load-test-secret")
+
+import websockets  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from backend.auth.jwt_utils import JWTManager, TokenData  # noqa: E402
+from backend.models import Base  # noqa: E402
+from backend.models.chat_room import ChatRoom, RoleType, RoomMember  # noqa: E402
+from backend.models.user import User  # noqa: E402
+from backend.seed import zipf_weights  # noqa: E402
+
+MESSAGE_PREFIX = "lt:"
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/max（ミリ秒）"""
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(values)
+
+    def at(percent: float) -> float:
+        index = min(int(len(ordered) * percent / 100), len(ordered) - 1)
+        return round(ordered[index] * 1000, 2)
+
+    return {"p50_ms": at(50), "p95_ms": at(95), "p99_ms": at(99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _raise_fd_limit(needed: int) -> None:
+    """クライアント数に応じてファイルディスクリプタの上限を引き上げる"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(soft, needed))
+    if wanted > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+def _git_revision() -> Dict[str, Optional[str]]:
+    def run(*args: str) -> Optional[str]:
+        try:
+            return subprocess.check_output(["git", *args], cwd=BACKEND_DIR, text=True).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": run("rev-parse", "--short", "HEAD"), "branch": run("rev-parse", "--abbrev-ref", "HEAD")}
+
+
+def assign_rooms(clients: int, rooms: int, exponent: float, rng: random.Random) -> List[int]:
+    """クライアントごとの接続先ルーム（0始まりの番号）をZipf分布で決める"""
+    weights = zipf_weights(rooms, exponent)
+    assignment = rng.choices(range(rooms), weights=weights, k=clients)
+    # どのルームにも最低1人は入れる
+    for room in range(min(rooms, clients)):
+        assignment[room] = room
+    return assignment
+
+
+async def prepare_database(database_url: str, assignment: List[int], rooms: int) -> List[Tuple[int, int, str]]:
+    """ユーザー・ルーム・メンバーシップを作成し、(user_id, room_id, token) を返す"""
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(User.__table__),
+            [
+                {
+                    "id": index + 1,
+                    "github_id": -(index + 1),
+                    "username": f"load{index + 1}",
+                    "display_name": f"Load {index + 1}",
+                    "is_active": True,
+                }
+                for index in range(len(assignment))
+            ],
+        )
+        await conn.execute(
+            insert(ChatRoom.__table__),
+            [
+                {"id": room + 1, "name": f"load-room-{room + 1}", "is_private": False, "created_by": 1}
+                for room in range(rooms)
+            ],
+        )
+        await conn.execute(
+            insert(RoomMember.__table__),
+            [
+                {"user_id": index + 1, "room_id": room + 1, "role": RoleType.MEMBER}
+                for index, room in enumerate(assignment)
+            ],
+        )
+    await engine.dispose()
+
+    clients = []
+    for index, room in enumerate(assignment):
+        user_id = index + 1
+        token = JWTManager.create_access_token(
+            TokenData(user_id=user_id, github_id=-user_id, username=f"load{user_id}")
+        )
+        clients.append((user_id, room + 1, token))
+    return clients
+
+
+class ProcessSampler:
+    """/proc からプロセスのCPU時間とRSSを定期的に読む（Linux）"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: List[float] = []
+        self.rss_mb: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._ticks = os.sysconf("SC_CLK_TCK")
+
+    def _cpu_seconds(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime, stime（stat の14, 15番目のフィールド）
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def _rss_mb(self) -> float:
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return 0.0
+
+    async def _run(self) -> None:
+        previous_cpu, previous_at = self._cpu_seconds(), time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            cpu, now = self._cpu_seconds(), time.perf_counter()
+            self.cpu_percent.append((cpu - previous_cpu) / (now - previous_at) * 100)
+            self.rss_mb.append(self._rss_mb())
+            previous_cpu, previous_at = cpu, now
+
+    def start(self) -> None:
+        if Path(f"/proc/{self.pid}/stat").exists():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> Dict[str, Optional[float]]:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if not self.cpu_percent:
+            return {"cpu_percent_avg": None, "cpu_percent_max": None, "rss_mb_max": None}
+        return {
+            "cpu_percent_avg": round(sum(self.cpu_percent) / len(self.cpu_percent), 1),
+            "cpu_percent_max": round(max(self.cpu_percent), 1),
+            "rss_mb_max": round(max(self.rss_mb), 1),
+        }
+
+
+@dataclass
+class LoadStats:
+    """負荷試験中の集計"""
+
+    measuring: bool = False
+    connected: int = 0
+    connect_failures: int = 0
+    closed_early: int = 0
+    sent: int = 0
+    received: int = 0
+    errors: int = 0
+    deliveries: List[float] = field(default_factory=list)
+    # 送信した計測対象メッセージ: 本文 -> [送信時刻, 想定受信者数, 受信数, 最大遅延]
+    pending: Dict[str, List[Any]] = field(default_factory=dict)
+
+
+async def run_client(
+    url: str,
+    user_id: int,
+    room_id: int,
+    room_sizes: Dict[int, int],
+    rate_per_second: float,
+    stats: LoadStats,
+    ready: asyncio.Event,
+    stop: asyncio.Event,
+    connect_limit: asyncio.Semaphore,
+    rng: random.Random,
+) -> None:
+    """1クライアント: 接続し、受信を処理しながらポアソン過程で送信する"""
+    try:
+        async with connect_limit:
+            ws = await websockets.connect(url, max_size=None, ping_interval=None, open_timeout=30)
+    except Exception:
+        stats.connect_failures += 1
+        return
+    stats.connected += 1
+
+    async def receive() -> None:
+        async for raw in ws:
+            data = json.loads(raw)
+            kind = data.get("type")
+            if kind == "message_received":
+                stats.received += 1
+                entry = stats.pending.get(data["payload"]["content"])
+                if entry is not None:
+                    latency = time.perf_counter() - entry[0]
+                    stats.deliveries.append(latency)
+                    entry[2] += 1
+                    entry[3] = max(entry[3], latency)
+            elif kind == "error":
+                stats.errors += 1
+
+    receiver = asyncio.create_task(receive())
+    sequence = 0
+    try:
+        await ready.wait()
+        while not stop.is_set():
+            await asyncio.sleep(rng.expovariate(rate_per_second))
+            if stop.is_set():
+                break
+            sequence += 1
+            content = f"{MESSAGE_PREFIX}{user_id}:{sequence}"
+            if stats.measuring:
+                stats.pending[content] = [time.perf_counter(), room_sizes[room_id], 0, 0.0]
+                stats.sent += 1
+            await ws.send(json.dumps({"type": "send_message", "payload": {"content": content}}))
+    except websockets.ConnectionClosed:
+        stats.closed_early += 1
+    finally:
+        await asyncio.sleep(0)
+        receiver.cancel()
+        await asyncio.gather(receiver, return_exceptions=True)
+        await ws.close()
+
+
+def start_server(port: int, database_url: str, sqlite_production: bool) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        {
+            "DATABASE_URL": database_url,
+            "SQLITE_PRODUCTION_MODE": "true" if sqlite_production else "false",
+            "PYTHONPATH": os.pathsep.join([str(BACKEND_DIR / "src"), env.get("PYTHONPATH", "")]),
+        }
+    )
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "backend.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--ws", "websockets",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+async def wait_for_server(port: int, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """主要な値の比（current / baseline）"""
+    keys = [
+        ("delivery_latency", "p50_ms"),
+        ("delivery_latency", "p95_ms"),
+        ("delivery_latency", "p99_ms"),
+        ("last_recipient_latency", "p99_ms"),
+        ("throughput", "deliveries_per_sec"),
+        ("server", "cpu_percent_avg"),
+        ("server", "rss_mb_max"),
+    ]
+    rows = {}
+    for section, key in keys:
+        new = current["results"].get(section, {}).get(key)
+        old = baseline["results"].get(section, {}).get(key)
+        rows[f"{section}.{key}"] = {
+            "baseline": old,
+            "current": new,
+            "ratio": round(new / old, 2) if new and old else None,
+        }
+    return {"baseline": baseline.get("revision"), "metrics": rows}
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    started_at = datetime.now(timezone.utc).isoformat()
+    rng = random.Random(args.seed)
+    _raise_fd_limit(args.clients * 2 + 256)
+
+    workdir = tempfile.TemporaryDirectory(prefix="ws-load-")
+    database_url = args.database_url or f"sqlite+aiosqlite:///{workdir.name}/load.db"
+    assignment = assign_rooms(args.clients, args.rooms, args.zipf_exponent, rng)
+    clients = await prepare_database(database_url, assignment, args.rooms)
+    room_sizes: Dict[int, int] = {}
+    for _, room_id, _ in clients:
+        room_sizes[room_id] = room_sizes.get(room_id, 0) + 1
+
+    port = _free_port()
+    server = start_server(port, database_url, not args.no_sqlite_production)
+    stats = LoadStats()
+    try:
+        await wait_for_server(port, server)
+        sampler = ProcessSampler(server.pid)
+        ready, stop = asyncio.Event(), asyncio.Event()
+        connect_limit = asyncio.Semaphore(args.connect_concurrency)
+        rate = args.rate / 60
+
+        connect_started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(
+                run_client(
+                    f"ws://127.0.0.1:{port}/ws/chat?token={token}&room_id={room_id}",
+                    user_id, room_id, room_sizes, rate, stats, ready, stop, connect_limit,
+                    random.Random(rng.random()),
+                )
+            )
+            for user_id, room_id, token in clients
+        ]
+        while stats.connected + stats.connect_failures < len(clients):
+            await asyncio.sleep(0.05)
+        connect_seconds = time.perf_counter() - connect_started
+
+        ready.set()
+        await asyncio.sleep(args.warmup)
+
+        sampler.start()
+        client_cpu_started = resource.getrusage(resource.RUSAGE_SELF)
+        stats.measuring = True
+        measure_started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stats.measuring = False
+        measured_seconds = time.perf_counter() - measure_started
+        client_cpu = resource.getrusage(resource.RUSAGE_SELF)
+        server_usage = await sampler.stop()
+
+        # 計測期間の終わりに送ったメッセージの配信を待つ
+        await asyncio.sleep(args.drain)
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        workdir.cleanup()
+
+    complete = [entry[3] for entry in stats.pending.values() if entry[2] >= entry[1]]
+    expected = sum(entry[1] for entry in stats.pending.values())
+    client_cpu_seconds = (client_cpu.ru_utime + client_cpu.ru_stime) - (
+        client_cpu_started.ru_utime + client_cpu_started.ru_stime
+    )
+    sizes = sorted(room_sizes.values(), reverse=True)
+
+    return {
+        "benchmark": "ws_load",
+        "revision": _git_revision(),
+        "started_at": started_at,
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": {
+            "connections": {
+                "connected": stats.connected,
+                "failed": stats.connect_failures,
+                "closed_early": stats.closed_early,
+                "connect_seconds": round(connect_seconds, 2),
+                "largest_rooms": sizes[:5],
+            },
+            "throughput": {
+                "messages_sent": stats.sent,
+                "messages_per_sec": round(stats.sent / measured_seconds, 1),
+                "deliveries": len(stats.deliveries),
+                "deliveries_expected": expected,
+                "deliveries_per_sec": round(len(stats.deliveries) / measured_seconds, 1),
+                "server_errors": stats.errors,
+            },
+            "delivery_latency": _percentiles(stats.deliveries),
+            "last_recipient_latency": {
+                **_percentiles(complete),
+                "complete_messages": len(complete),
+            },
+            "server": server_usage,
+            "load_generator": {
+                "cpu_percent_avg": round(client_cpu_seconds / measured_seconds * 100, 1),
+            },
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000, help="WebSocketクライアント数（=ユーザー数）")
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--zipf-exponent", type=float, default=1.0, help="ルーム人数の偏り（0で均等）")
+    parser.add_argument("--rate", type=float, default=6.0, help="クライアントあたりの送信数（件/分）")
+    parser.add_argument("--duration", type=float, default=30.0, help="計測期間（秒）")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--drain", type=float, default=3.0, help="計測終了後に配信を待つ秒数")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--database-url", default=None, help="既定は一時ディレクトリのSQLite")
+    parser.add_argument("--no-sqlite-production", action="store_true", help="SQLiteの本番プロファイルを使わない")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="結果のJSON（既定は benchmarks/results/）")
+    parser.add_argument("--compare", type=Path, default=None, help="比較対象の結果JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args))
+    if args.compare:
+        result["comparison"] = compare(result, json.loads(args.compare.read_text()))
+
+    output = args.output
+    if output is None:
+        revision = result["revision"]["commit"] or "unknown"
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = BENCHMARK_DIR / "results" / f"ws_load-{revision}-{stamp}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"saved to {output}", file=sys.stderr)
@@ -6,7 +6,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.models.base import get_db
+from backend.models.base import get_read_db
 from backend.models.user import User
 from backend.auth.jwt_utils import JWTManager, TokenData
 from backend.auth.user_service import UserService
@@ -34,10 +34,10 @@ async def get_current_user_token(
 
 async def get_current_user(
     token_data: TokenData = Depends(get_current_user_token),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> User:
     """現在の認証されたユーザーを取得"""
-    user = await UserService.get_user_by_id(db, token_data.user_id)
+    user = await UserService.get_cached_user_by_id(db, token_data.user_id)
     
     if user is None:
         raise HTTPException(
@@ -56,7 +56,7 @@ async def get_current_user(
 
 async def get_optional_current_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Optional[User]:
     """オプションで現在のユーザーを取得（認証不要エンドポイント用）"""
     if not credentials:
@@ -66,16 +66,16 @@ async def get_optional_current_user(
     if token_data is None:
         return None
     
-    user = await UserService.get_user_by_id(db, token_data.user_id)
+    user = await UserService.get_cached_user_by_id(db, token_data.user_id)
     if user is None or not user.is_active:
         return None
     
     return user
 
 
-async def get_dev_user(db: AsyncSession = Depends(get_db)) -> User:
+async def get_dev_user(db: AsyncSession = Depends(get_read_db)) -> User:
     """開発モード用のデフォルトユーザーを取得"""
-    user = await UserService.get_user_by_id(db, settings.dev_default_user_id)
+    user = await UserService.get_cached_user_by_id(db, settings.dev_default_user_id)
     
     if user is None:
         raise HTTPException(
@@ -88,7 +88,7 @@ async def get_dev_user(db: AsyncSession = Depends(get_db)) -> User:
 
 async def get_current_user_or_dev(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> User:
     """開発モードでは認証をバイパス、本番では通常の認証を行う"""
     
@@ -112,7 +112,7 @@ async def get_current_user_or_dev(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = await UserService.get_user_by_id(db, token_data.user_id)
+    user = await UserService.get_cached_user_by_id(db, token_data.user_id)
     
     if user is None:
         raise HTTPException(
@@ -1,13 +1,18 @@
 """
 GitHub OAuth service
+
+httpxは読み込みに時間がかかり、OAuthのコールバックでしか使わないため、
+最初のクライアント作成まで読み込まない（ワーカーの起動を速くする）。
 """
-import httpx
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any
 from urllib.parse import urlencode
 import secrets
 
 from backend.config import settings
 
+if TYPE_CHECKING:
+    import httpx
+
 
 class GitHubUser:
     """GitHub ユーザー情報"""
@@ -20,13 +25,56 @@ class GitHubUser:
         self.bio: Optional[str] = data.get("bio")
 
 
+# 全リクエストで共有するHTTPクライアント（keep-aliveで接続を再利用する）
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def _build_client(transport: Optional["httpx.AsyncBaseTransport"] = None) -> "httpx.AsyncClient":
+    import httpx
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(
+            settings.github_http_timeout_seconds,
+            connect=settings.github_http_connect_timeout_seconds,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.github_http_max_connections,
+            max_keepalive_connections=settings.github_http_max_keepalive_connections,
+            keepalive_expiry=settings.github_http_keepalive_expiry_seconds,
+        ),
+        headers={"User-Agent": "Lunir-App"},
+        transport=transport,
+    )
+
+
 class GitHubOAuthService:
     """GitHub OAuth サービス"""
     
-    GITHUB_OAUTH_URL = "https://github.com/login/oauth/authorize"
-    GITHUB_TOKEN_URL = "https://github.com/login/oauth/access_token"
-    GITHUB_USER_URL = "https://api.github.com/user"
-    GITHUB_USER_EMAIL_URL = "https://api.github.com/user/emails"
+    GITHUB_OAUTH_URL = f"{settings.github_oauth_base_url}/login/oauth/authorize"
+    GITHUB_TOKEN_URL = f"{settings.github_oauth_base_url}/login/oauth/access_token"
+    GITHUB_USER_URL = f"{settings.github_api_base_url}/user"
+    GITHUB_USER_EMAIL_URL = f"{settings.github_api_base_url}/user/emails"
+    
+    @staticmethod
+    def open_client(transport: Optional["httpx.AsyncBaseTransport"] = None) -> "httpx.AsyncClient":
+        """共有クライアントを作成（未作成の場合のみ）"""
+        global _client
+        if _client is None or _client.is_closed:
+            _client = _build_client(transport)
+        return _client
+    
+    @staticmethod
+    async def close_client() -> None:
+        """共有クライアントを閉じる（アプリケーションの終了時に呼ぶ）"""
+        global _client
+        if _client is not None:
+            await _client.aclose()
+            _client = None
+    
+    @staticmethod
+    def get_client() -> "httpx.AsyncClient":
+        """共有クライアントを取得（未作成ならここで作成）"""
+        return GitHubOAuthService.open_client()
     
     @classmethod
     def generate_auth_url(cls, redirect_uri: str) -> tuple[str, str]:
@@ -44,8 +92,15 @@ class GitHubOAuthService:
         return auth_url, state
     
     @classmethod
-    async def exchange_code_for_token(cls, code: str, redirect_uri: str) -> Optional[str]:
+    async def exchange_code_for_token(
+        cls,
+        code: str,
+        redirect_uri: str,
+        client: Optional["httpx.AsyncClient"] = None
+    ) -> Optional[str]:
         """認証コードをアクセストークンに交換"""
+        import httpx
+
         data = {
             "client_id": settings.github_client_id,
             "client_secret": settings.github_client_secret,
@@ -55,58 +110,73 @@ class GitHubOAuthService:
         
         headers = {
             "Accept": "application/json",
-            "User-Agent": "Lunir-App",
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    cls.GITHUB_TOKEN_URL,
-                    data=data,
-                    headers=headers
-                )
-                response.raise_for_status()
-                
-                token_data = response.json()
-                return token_data.get("access_token")
-                
-            except httpx.HTTPError:
-                return None
+        client = client or cls.get_client()
+        try:
+            response = await client.post(
+                cls.GITHUB_TOKEN_URL,
+                data=data,
+                headers=headers
+            )
+            response.raise_for_status()
+            
+            token_data = response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+        
+        access_token = token_data.get("access_token") if isinstance(token_data, dict) else None
+        return access_token if isinstance(access_token, str) else None
     
     @classmethod
-    async def get_user_info(cls, access_token: str) -> Optional[GitHubUser]:
+    async def get_user_info(
+        cls,
+        access_token: str,
+        client: Optional["httpx.AsyncClient"] = None
+    ) -> Optional[GitHubUser]:
         """アクセストークンを使用してユーザー情報を取得"""
+        import httpx
+
         headers = {
             "Authorization": f"token {access_token}",
             "Accept": "application/json",
-            "User-Agent": "Lunir-App",
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                # ユーザー基本情報を取得
-                user_response = await client.get(
-                    cls.GITHUB_USER_URL,
-                    headers=headers
-                )
-                user_response.raise_for_status()
-                user_data = user_response.json()
-                
-                # メールアドレスが公開されていない場合は別途取得
-                if not user_data.get("email"):
-                    email_response = await client.get(
-                        cls.GITHUB_USER_EMAIL_URL,
-                        headers=headers
-                    )
-                    if email_response.status_code == 200:
-                        emails = email_response.json()
-                        primary_email = next(
-                            (email["email"] for email in emails if email["primary"]),
-                            None
-                        )
-                        user_data["email"] = primary_email
-                
-                return GitHubUser(user_data)
-                
-            except httpx.HTTPError:
-                return None
\ No newline at end of file
+        client = client or cls.get_client()
+        
+        try:
+            user_response = await client.get(cls.GITHUB_USER_URL, headers=headers)
+            user_response.raise_for_status()
+            user_data = user_response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+        if not isinstance(user_data, dict):
+            return None
+        
+        # メールアドレスが非公開の場合のみ /user/emails を呼ぶ（APIの呼び出し回数を増やさない）
+        if not user_data.get("email"):
+            user_data["email"] = await cls._get_primary_email(client, headers)
+        
+        return GitHubUser(user_data)
+    
+    @classmethod
+    async def _get_primary_email(
+        cls, client: "httpx.AsyncClient", headers: Dict[str, str]
+    ) -> Optional[str]:
+        """プライマリのメールアドレス（取得できない・形式が不正ならNone）"""
+        import httpx
+
+        try:
+            response = await client.get(cls.GITHUB_USER_EMAIL_URL, headers=headers)
+            if response.status_code != 200:
+                return None
+            emails = response.json()
+        except (httpx.HTTPError, ValueError):
+            return None
+        if not isinstance(emails, list):
+            return None
+        for email in emails:
+            if isinstance(email, dict) and email.get("primary"):
+                address = email.get("email")
+                return address if isinstance(address, str) else None
+        return None
@@ -1,22 +1,36 @@
 """
 JWT utilities for authentication
 """
+import hashlib
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from jose import JWTError, jwt
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
+from backend.cache import TTLCache
 from backend.config import settings
 
 
 class TokenData(BaseModel):
-    """JWTトークンデータ"""
+    """JWTトークンデータ（キャッシュで共有するため不変）"""
+    model_config = ConfigDict(frozen=True)
+    
     user_id: int
     github_id: int
     username: str
     email: Optional[str] = None
 
 
+# 検証済みトークン: sha256(token) -> (TokenData, iat)
+token_cache: "TTLCache[Tuple[TokenData, int]]" = TTLCache(
+    "tokens", settings.token_cache_size, settings.token_cache_ttl_seconds
+)
+
+# ユーザーごとの失効時刻: これより前に発行されたトークンは無効
+_revoked_before: Dict[int, int] = {}
+
+
 class JWTManager:
     """JWT トークン管理クラス"""
     
@@ -41,7 +55,19 @@ class JWTManager:
     
     @staticmethod
     def verify_token(token: str) -> Optional[TokenData]:
-        """トークンを検証して内容を返す"""
+        """トークンを検証して内容を返す
+
+        検証済みのトークンはexpを超えない範囲でキャッシュし、署名検証を省く。
+        """
+        key = hashlib.sha256(token.encode("utf-8")).digest()
+        cached = token_cache.get(key)
+        if cached is not None:
+            token_data, issued_at = cached
+            if JWTManager.is_revoked(token_data.user_id, issued_at):
+                token_cache.invalidate(key)
+                return None
+            return token_data
+        
         try:
             payload = jwt.decode(
                 token, 
@@ -57,7 +83,7 @@ class JWTManager:
             if user_id is None or github_id is None or username is None:
                 return None
             
-            return TokenData(
+            token_data = TokenData(
                 user_id=user_id,
                 github_id=github_id,
                 username=username,
@@ -66,6 +92,40 @@ class JWTManager:
             
         except JWTError:
             return None
+        
+        issued_at = int(payload.get("iat", 0))
+        if JWTManager.is_revoked(user_id, issued_at):
+            return None
+        
+        expires_at = payload.get("exp")
+        if expires_at is not None:
+            token_cache.set(key, (token_data, issued_at), min(
+                settings.token_cache_ttl_seconds, float(expires_at) - time.time()
+            ))
+        
+        return token_data
+    
+    @staticmethod
+    def is_revoked(user_id: int, issued_at: int) -> bool:
+        """トークンがユーザー単位の失効より前に発行されたか"""
+        revoked_before = _revoked_before.get(user_id)
+        return revoked_before is not None and issued_at < revoked_before
+    
+    @staticmethod
+    def revoke_user_tokens(user_id: int) -> None:
+        """ユーザーの発行済みトークンを全て失効させる（プロセス内）
+
+        iatは秒単位のため、失効した秒に発行されたトークンも無効になる。
+        有効期限（ACCESS_TOKEN_EXPIRE_MINUTES）より前の失効は、その前に発行された
+        トークンが既に期限切れのため取り除く（失効したユーザーの数だけ増え続けない）。
+        """
+        now = int(time.time())
+        expired = now - settings.access_token_expire_minutes * 60
+        for revoked_user_id in [
+            key for key, revoked_before in _revoked_before.items() if revoked_before < expired
+        ]:
+            del _revoked_before[revoked_user_id]
+        _revoked_before[user_id] = now + 1
     
     @staticmethod
     def decode_token_payload(token: str) -> Optional[Dict[str, Any]]:
@@ -1,12 +1,45 @@
 """
 User service for authentication and user management
 """
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import make_transient_to_detached
 
+from backend.cache import TTLCache
+from backend.config import settings
+from backend.chat.chat_service import ChatService
+from backend.models.chat_room import RoomMember
 from backend.models.user import User
 from backend.auth.github_oauth import GitHubUser
+from backend.auth.jwt_utils import JWTManager
+
+# 認証時に読み込むユーザーのカラム（リレーションは含まない）
+_CACHED_USER_COLUMNS = (
+    "id",
+    "github_id",
+    "username",
+    "display_name",
+    "email",
+    "avatar_url",
+    "bio",
+    "is_active",
+    "created_at",
+    "updated_at",
+)
+
+# 認証ごとのユーザー取得を省くキャッシュ（値はカラムのタプル）
+user_cache: "TTLCache[Tuple[Any, ...]]" = TTLCache(
+    "users", settings.user_cache_size, settings.user_cache_ttl_seconds
+)
+
+
+def _detached_user(values: Tuple[Any, ...]) -> User:
+    """キャッシュの値からリクエストごとに独立したdetached状態のUserを作成"""
+    user = User(**dict(zip(_CACHED_USER_COLUMNS, values)))
+    make_transient_to_detached(user)
+    return user
 
 
 class UserService:
@@ -28,6 +61,35 @@ class UserService:
         )
         return result.scalar_one_or_none()
     
+    @staticmethod
+    async def get_cached_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+        """ユーザーIDでユーザーを取得（認証用、キャッシュ経由）
+
+        返すUserはセッションに属さないため、リレーションの遅延読み込みはできない。
+        """
+        async def load() -> Optional[Tuple[Any, ...]]:
+            columns = [User.__table__.c[name] for name in _CACHED_USER_COLUMNS]
+            result = await db.execute(select(*columns).where(User.id == user_id))
+            row = result.one_or_none()
+            return tuple(row) if row else None
+        
+        values = await user_cache.get_or_load(user_id, load)
+        return _detached_user(values) if values else None
+    
+    @staticmethod
+    async def deactivate_user(db: AsyncSession, user_id: int) -> bool:
+        """ユーザーを無効化"""
+        result = await db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(is_active=False, deactivated_at=func.coalesce(User.deactivated_at, func.now()))
+        )
+        await db.commit()
+        user_cache.invalidate(user_id)
+        JWTManager.revoke_user_tokens(user_id)
+        
+        return result.rowcount > 0
+    
     @staticmethod
     async def create_user_from_github(db: AsyncSession, github_user: GitHubUser) -> User:
         """GitHubユーザー情報から新規ユーザーを作成"""
@@ -60,11 +122,85 @@ class UserService:
         user.avatar_url = github_user.avatar_url
         user.bio = github_user.bio
         
+        # ルーム詳細・履歴に含まれるプロフィールが変わるため、参加ルームのETagを更新
+        await UserService._bump_member_rooms(db, user.id)
         await db.commit()
         await db.refresh(user)
+        user_cache.invalidate(user.id)
+        
+        return user
+    
+    @staticmethod
+    def _profile_values(github_user: GitHubUser) -> Dict[str, Any]:
+        """GitHubから同期するプロフィール項目"""
+        return {
+            "username": github_user.login,
+            "display_name": github_user.name,
+            "email": github_user.email,
+            "avatar_url": github_user.avatar_url,
+            "bio": github_user.bio,
+        }
+    
+    @staticmethod
+    async def upsert_user_from_github(
+        db: AsyncSession, github_user: GitHubUser, new_user: bool = False
+    ) -> User:
+        """GitHubユーザー情報でユーザーを作成または更新（単一のINSERT ... ON CONFLICT）
+
+        既存行はプロフィール項目が実際に異なる場合のみ更新する。同じGitHub IDの
+        同時ログインでも一意制約違反にならない。new_user は呼び出し側で行が
+        無いことを確認済みの場合（同時ログインで相手が先に作成していても
+        参加ルームは無いため、ルームの更新カウンタは進めない）。
+        """
+        values = UserService._profile_values(github_user)
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return await UserService._get_or_create_fallback(db, github_user)
+        
+        stmt = insert(User).values(github_id=github_user.id, is_active=True, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.github_id],
+            set_={**{name: stmt.excluded[name] for name in values}, "updated_at": func.now()},
+            where=or_(*(
+                getattr(User, name).is_distinct_from(stmt.excluded[name]) for name in values
+            )),
+        ).returning(User)
+        
+        result = await db.execute(stmt, execution_options={"populate_existing": True})
+        user = result.scalar_one_or_none()
+        if user is not None and not new_user:
+            await UserService._bump_member_rooms(db, user.id)
+        await db.commit()
+        
+        if user is None:
+            # 他のリクエストが同じ内容で先に書き込んだため更新されなかった
+            user = await UserService.get_user_by_github_id(db, github_user.id)
+        else:
+            user_cache.invalidate(user.id)
         
         return user
     
+    @staticmethod
+    async def _bump_member_rooms(db: AsyncSession, user_id: int) -> None:
+        """ユーザーが参加しているルームの更新カウンタを進める"""
+        await ChatService.bump_room_versions(
+            db, select(RoomMember.room_id).where(RoomMember.user_id == user_id)
+        )
+    
+    @staticmethod
+    async def _get_or_create_fallback(db: AsyncSession, github_user: GitHubUser) -> User:
+        """ON CONFLICTが使えないデータベース向け"""
+        try:
+            return await UserService.create_user_from_github(db, github_user)
+        except IntegrityError:
+            await db.rollback()
+            user = await UserService.get_user_by_github_id(db, github_user.id)
+            return await UserService.update_user_from_github(db, user, github_user)
+    
     @staticmethod
     async def get_or_create_user_from_github(
         db: AsyncSession, 
@@ -72,10 +208,16 @@ class UserService:
     ) -> User:
         """GitHubユーザー情報からユーザーを取得または作成"""
         existing_user = await UserService.get_user_by_github_id(db, github_user.id)
+        profile = UserService._profile_values(github_user)
         
-        if existing_user:
-            # 既存ユーザーの情報を更新
-            return await UserService.update_user_from_github(db, existing_user, github_user)
-        else:
-            # 新規ユーザーを作成
-            return await UserService.create_user_from_github(db, github_user)
\ No newline at end of file
+        if existing_user and all(
+            getattr(existing_user, name) == value for name, value in profile.items()
+        ):
+            # 変更が無ければ書き込まない（ログイン集中時にライターロックを取らない）
+            await db.commit()
+            return existing_user
+        
+        # 新規作成・変更ありの場合は単一文のupsertで書き込む
+        return await UserService.upsert_user_from_github(
+            db, github_user, new_user=existing_user is None
+        )
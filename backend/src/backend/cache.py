@@ -0,0 +1,166 @@
+"""
+Process-local TTL/LRU cache
+
+プロセス内で共有する小さなキャッシュ。件数上限（LRUで追い出し）と有効期限を持ち、
+ヒット率などの統計を返す。書き込み側は更新をコミットした後に invalidate() で
+明示的に無効化する。
+
+asyncioの単一スレッド上で使う前提で、get_or_load() は同じキーへの同時読み込みを
+1回にまとめる。読み込み中に invalidate() された場合、その結果はキャッシュしない
+（無効化より前に読んだ古い値が残らないようにする）。
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+_MISSING: Any = object()
+
+
+class _PendingLoad:
+    """実行中の読み込み"""
+
+    __slots__ = ("future", "valid")
+
+    def __init__(self, future: "asyncio.Future[Any]"):
+        self.future = future
+        self.valid = True
+
+
+class TTLCache(Generic[V]):
+    """件数上限と有効期限付きのLRUキャッシュ"""
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._pending: Dict[Hashable, _PendingLoad] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """有効な値を返す（無ければdefault）"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: V, ttl_seconds: Optional[float] = None) -> None:
+        """値を登録（ttl_secondsで既定の有効期限を上書き）"""
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """キーを無効化（実行中の読み込みの結果も破棄する）"""
+        self.invalidations += 1
+        self._entries.pop(key, None)
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            pending.valid = False
+
+    def clear(self) -> None:
+        """全てのキーを無効化"""
+        self.invalidations += 1
+        self._entries.clear()
+        for pending in self._pending.values():
+            pending.valid = False
+        self._pending.clear()
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[V]],
+        cache_none: bool = False,
+    ) -> V:
+        """キャッシュから取得し、無ければloaderで読み込んで登録
+
+        同じキーの読み込みが実行中であればその結果を待つ。
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending.future)
+
+        pending = _PendingLoad(asyncio.get_running_loop().create_future())
+        self._pending[key] = pending
+        try:
+            value = await loader()
+        except BaseException as exc:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+            if not pending.future.done():
+                pending.future.set_exception(exc)
+                # 待っているコルーチンが無い場合の未取得例外の警告を抑止
+                pending.future.exception()
+            raise
+
+        if self._pending.get(key) is pending:
+            del self._pending[key]
+        if pending.valid and (value is not None or cache_none):
+            self.set(key, value)
+        pending.future.set_result(value)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """キャッシュ統計を取得"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_registry: Dict[str, "TTLCache[Any]"] = {}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """登録済みキャッシュの統計"""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_all_caches() -> None:
+    """登録済みキャッシュを全て無効化（テストやデータの一括投入後に使用）"""
+    for cache in _registry.values():
+        cache.clear()
@@ -0,0 +1,3 @@
+"""
+Call (WebRTC signaling) package for Lunir
+"""
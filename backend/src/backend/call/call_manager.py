@@ -0,0 +1,190 @@
+"""
+In-memory call rosters and batched participant persistence
+
+ルームごとの通話（参加者の一覧）をメモリ上に持ち、シグナリングの中継時の
+参加確認をデータベース無しで行う。参加者の入退出はイベントとして溜め、
+バックグラウンドジョブ（run_call_flush）でまとめて書き込む。
+
+ロスターはこのプロセスに接続しているクライアントのものだけを持つ
+（WebSocketの接続管理と同じく単一プロセスを前提とする）。
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.call.call_service import CallService
+from backend.metrics import GaugeFunc
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ActiveCall:
+    """進行中の通話"""
+
+    session_id: int
+    room_id: int
+    started_at: datetime
+    # user_id -> 参加者のプロフィール（id, username, display_name, avatar_url）
+    participants: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+    def roster(self) -> Dict[str, Any]:
+        """クライアントに返す通話の状態"""
+        return {
+            "session_id": self.session_id,
+            "room_id": self.room_id,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "participants": list(self.participants.values()),
+        }
+
+
+class CallManager:
+    """通話のロスターと、未保存の入退出イベントを管理するクラス"""
+
+    def __init__(self) -> None:
+        # ルームごとの通話: {room_id: ActiveCall}
+        self.calls: Dict[int, ActiveCall] = {}
+        # ユーザーが参加中の通話のルーム: {user_id: room_id}（同時に参加できる通話は1つ）
+        self.user_calls: Dict[int, int] = {}
+        # 未保存の参加中の行: {(session_id, user_id): row}
+        self._pending_joins: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        # 未保存のまま退出した参加者の行（left_at 付き）
+        self._completed_joins: List[Dict[str, Any]] = []
+        # 保存済みの参加行に対する退出と、終了した通話
+        self._pending_leaves: List[Dict[str, Any]] = []
+        self._pending_ends: List[Dict[str, Any]] = []
+        self._start_lock = asyncio.Lock()
+
+    def get_call(self, room_id: int) -> Optional[ActiveCall]:
+        """ルームの進行中の通話"""
+        return self.calls.get(room_id)
+
+    def call_of(self, user_id: int) -> Optional[ActiveCall]:
+        """ユーザーが参加中の通話"""
+        room_id = self.user_calls.get(user_id)
+        return self.calls.get(room_id) if room_id is not None else None
+
+    async def join(self, db: AsyncSession, room_id: int, user: Dict[str, Any]) -> ActiveCall:
+        """通話に参加する（ルームに通話が無ければセッションを開始する）"""
+        user_id = user["id"]
+        current = self.call_of(user_id)
+        if current is not None and current.room_id == room_id:
+            return current
+        if current is not None:
+            self.leave(user_id)
+
+        call = self.calls.get(room_id)
+        if call is None:
+            # 同じルームで同時に開始されても通話が1つになるようにする
+            async with self._start_lock:
+                call = self.calls.get(room_id)
+                if call is None:
+                    session = await CallService.start_session(db, room_id, user_id)
+                    call = ActiveCall(session.id, room_id, session.started_at)
+                    self.calls[room_id] = call
+
+        now = datetime.now(timezone.utc)
+        call.participants[user_id] = user
+        self.user_calls[user_id] = room_id
+        self._pending_joins[(call.session_id, user_id)] = {
+            "session_id": call.session_id,
+            "user_id": user_id,
+            "joined_at": now,
+            "left_at": None,
+        }
+        return call
+
+    def leave(self, user_id: int) -> Optional[ActiveCall]:
+        """参加中の通話から退出し、その通話を返す（最後の1人なら通話を終了する）"""
+        room_id = self.user_calls.pop(user_id, None)
+        if room_id is None:
+            return None
+        call = self.calls[room_id]
+        call.participants.pop(user_id, None)
+
+        now = datetime.now(timezone.utc)
+        pending = self._pending_joins.pop((call.session_id, user_id), None)
+        if pending is not None:
+            # 参加がまだ保存されていなければ退出日時付きの行として保存する
+            pending["left_at"] = now
+            self._completed_joins.append(pending)
+        else:
+            self._pending_leaves.append(
+                {"session_id": call.session_id, "user_id": user_id, "left_at": now}
+            )
+
+        if not call.participants:
+            del self.calls[room_id]
+            self._pending_ends.append({"session_id": call.session_id, "ended_at": now})
+        return call
+
+    def end_all(self) -> None:
+        """全参加者を退出させ全通話を終了する（終了時）"""
+        for user_id in list(self.user_calls):
+            self.leave(user_id)
+
+    def pending_count(self) -> int:
+        """未保存のイベント数"""
+        return (
+            len(self._pending_joins)
+            + len(self._completed_joins)
+            + len(self._pending_leaves)
+            + len(self._pending_ends)
+        )
+
+    async def flush(self, db: AsyncSession) -> int:
+        """未保存の入退出と通話の終了を書き込み、件数を返す
+
+        書き込みに失敗した場合はイベントを戻し、次回に再試行する。
+        """
+        open_joins, completed = self._pending_joins, self._completed_joins
+        leaves, ends = self._pending_leaves, self._pending_ends
+        joins = completed + list(open_joins.values())
+        if not (joins or leaves or ends):
+            return 0
+        self._pending_joins, self._completed_joins = {}, []
+        self._pending_leaves, self._pending_ends = [], []
+
+        try:
+            await CallService.write_events(db, joins, leaves, ends)
+        except Exception:
+            await db.rollback()
+            # 書き込み中の退出は保存済みの行への更新として記録されている。
+            # 参加行は更新より先に書き込むため、戻して再試行すれば正しく反映される
+            open_joins.update(self._pending_joins)
+            self._pending_joins = open_joins
+            self._completed_joins = completed + self._completed_joins
+            self._pending_leaves = leaves + self._pending_leaves
+            self._pending_ends = ends + self._pending_ends
+            raise
+        return len(joins) + len(leaves) + len(ends)
+
+
+# グローバルな通話マネージャーインスタンス
+call_manager = CallManager()
+
+GaugeFunc(
+    "lunir_call_active_sessions",
+    "Calls with at least one participant",
+    lambda: {(): len(call_manager.calls)},
+)
+GaugeFunc(
+    "lunir_call_participants",
+    "Users currently in a call",
+    lambda: {(): len(call_manager.user_calls)},
+)
+
+
+async def run_call_flush() -> None:
+    """バックグラウンドジョブ: 通話の入退出をまとめて保存"""
+    from backend.models.base import AsyncSessionLocal
+
+    if not call_manager.pending_count():
+        return
+    async with AsyncSessionLocal() as db:
+        written = await call_manager.flush(db)
+    logger.debug(f"Persisted {written} call participant events")
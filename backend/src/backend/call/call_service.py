@@ -0,0 +1,128 @@
+"""
+Call session persistence
+
+通話中の参加者一覧（ロスター）はシグナリングの中継を速くするためメモリ上に
+持ち（call_manager）、データベースには通話の開始・終了と参加者の入退出の
+記録だけを書く。入退出は1件ずつではなくまとめて書き込む。
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, bindparam, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.call import CallParticipant, CallSession, CallStatus
+
+logger = logging.getLogger(__name__)
+
+_participants = CallParticipant.__table__
+_sessions = CallSession.__table__
+
+
+class CallService:
+    """通話セッションと参加者の記録"""
+
+    @staticmethod
+    async def start_session(db: AsyncSession, room_id: int, user_id: int) -> CallSession:
+        """通話セッションを開始"""
+        session = CallSession(room_id=room_id, initiated_by=user_id, status=CallStatus.ACTIVE)
+        db.add(session)
+        await db.commit()
+        await db.refresh(session)
+        return session
+
+    @staticmethod
+    async def write_events(
+        db: AsyncSession,
+        joins: Sequence[Dict[str, Any]],
+        leaves: Sequence[Dict[str, Any]],
+        ends: Sequence[Dict[str, Any]],
+    ) -> None:
+        """入退出と通話の終了を1トランザクションで書き込む
+
+        - joins: call_participants の行（同じバッチ内で退出済みなら left_at 付き）
+        - leaves: 以前のバッチで書き込んだ参加者の退出 {session_id, user_id, left_at}
+        - ends: 終了した通話 {session_id, ended_at}
+        """
+        if joins:
+            await db.execute(insert(_participants), list(joins))
+        if leaves:
+            await db.execute(
+                update(_participants)
+                .where(
+                    and_(
+                        _participants.c.session_id == bindparam("b_session_id"),
+                        _participants.c.user_id == bindparam("b_user_id"),
+                        _participants.c.left_at.is_(None),
+                    )
+                )
+                .values(left_at=bindparam("b_left_at")),
+                [
+                    {
+                        "b_session_id": leave["session_id"],
+                        "b_user_id": leave["user_id"],
+                        "b_left_at": leave["left_at"],
+                    }
+                    for leave in leaves
+                ],
+            )
+        if ends:
+            await db.execute(
+                update(_sessions)
+                .where(_sessions.c.id == bindparam("b_session_id"))
+                .values(status=CallStatus.ENDED, ended_at=bindparam("b_ended_at")),
+                [{"b_session_id": end["session_id"], "b_ended_at": end["ended_at"]} for end in ends],
+            )
+        await db.commit()
+
+    @staticmethod
+    async def end_orphaned_sessions(db: AsyncSession, now: Optional[datetime] = None) -> int:
+        """アクティブのまま残った通話を終了する（起動時）
+
+        ロスターはプロセスのメモリにしか無いため、起動時点でアクティブな通話は
+        前回のプロセスが終了処理をせずに止まった残りである。参加中のままの
+        参加者も退出扱いにする。終了した通話数を返す。
+        """
+        now = now or datetime.now(timezone.utc)
+        orphaned: List[int] = list(
+            (
+                await db.execute(
+                    select(CallSession.id).where(CallSession.status == CallStatus.ACTIVE)
+                )
+            ).scalars()
+        )
+        if not orphaned:
+            return 0
+
+        await db.execute(
+            update(_participants)
+            .where(
+                and_(
+                    _participants.c.session_id.in_(orphaned),
+                    _participants.c.left_at.is_(None),
+                )
+            )
+            .values(left_at=now)
+        )
+        await db.execute(
+            update(_sessions)
+            .where(_sessions.c.id.in_(orphaned))
+            .values(status=CallStatus.ENDED, ended_at=now)
+        )
+        await db.commit()
+        return len(orphaned)
+
+
+async def run_call_reconciliation() -> None:
+    """起動時: 前回のプロセスから残った通話を終了する"""
+    from backend.models.base import AsyncSessionLocal
+
+    try:
+        async with AsyncSessionLocal() as db:
+            ended = await CallService.end_orphaned_sessions(db)
+    except Exception:
+        logger.exception("Failed to reconcile orphaned call sessions")
+        return
+    if ended:
+        logger.info(f"Ended {ended} orphaned call sessions")
@@ -0,0 +1,33 @@
+"""
+REST API router for calls
+"""
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.auth.dependencies import get_current_user
+from backend.call.call_manager import call_manager
+from backend.chat.chat_service import ChatService
+from backend.models.base import get_read_db
+from backend.models.user import User
+
+router = APIRouter(prefix="/api/v1", tags=["call"])
+
+
+@router.get("/rooms/{room_id}/call")
+async def get_room_call(
+    room_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+) -> Dict[str, Any]:
+    """ルームの進行中の通話と参加者（通話が無ければ active: false）"""
+    if not await ChatService.is_user_in_room(db, current_user.id, room_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
+        )
+
+    call = call_manager.get_call(room_id)
+    if call is None:
+        return {"active": False, "room_id": room_id}
+    return {"active": True, **call.roster()}
@@ -0,0 +1,171 @@
+"""
+WebRTC signaling over the chat WebSocket
+
+チャット用WebSocketで通話の参加・退出と、WebRTCのシグナリング
+（offer / answer / ICE candidate）の中継を行う。中継は同じ通話に参加して
+いるかをメモリ上のロスターで確認するだけで、データベースには触れない。
+
+- call_join: 通話に参加（無ければ開始）。参加者には call_participant_joined を送る。
+  新しく参加した側が既存の各参加者に offer を送る
+- call_leave: 通話から退出。残りの参加者に call_participant_left を送る
+- call_offer / call_answer / call_ice_candidate: target_user_id に中継する
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.call.call_manager import ActiveCall, call_manager
+from backend.chat.chat_service import ChatService
+from backend.chat.websocket_manager import connection_manager
+from backend.metrics import Counter
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 中継するシグナリングメッセージと、中継するペイロードの項目
+RELAYED_SIGNALS = {
+    "call_offer": "sdp",
+    "call_answer": "sdp",
+    "call_ice_candidate": "candidate",
+}
+CALL_MESSAGE_TYPES = frozenset({"call_join", "call_leave", *RELAYED_SIGNALS})
+
+# SDP・ICE candidateの上限（シリアライズ後の文字数）
+MAX_SIGNAL_LENGTH = 64 * 1024
+
+call_signals = Counter(
+    "lunir_call_signals",
+    "Call signaling messages by type and result (relayed, undelivered, rejected)",
+    ["type", "result"],
+)
+
+
+def _user_fields(user: User) -> Dict[str, Any]:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "display_name": user.display_name,
+        "avatar_url": user.avatar_url,
+    }
+
+
+async def _send_error(user_id: int, message: str) -> None:
+    await connection_manager.send_personal_message(
+        user_id,
+        {
+            "type": "error",
+            "payload": {"message": message},
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+    )
+
+
+async def _notify_participants(
+    call: ActiveCall, message: Dict[str, Any], exclude_user: Optional[int] = None
+) -> None:
+    """通話の参加者に送信（ドレイン中は全員が切断されるため送らない）"""
+    if connection_manager.draining:
+        return
+    for user_id in list(call.participants):
+        if user_id != exclude_user:
+            await connection_manager.send_personal_message(user_id, message)
+
+
+async def handle_call_message(
+    db: AsyncSession,
+    user: User,
+    room_id: int,
+    message_type: str,
+    payload: Dict[str, Any],
+) -> None:
+    """通話関連のWebSocketメッセージを処理"""
+    if message_type == "call_join":
+        await handle_call_join(db, user, payload.get("room_id") or room_id)
+    elif message_type == "call_leave":
+        await leave_call(user.id)
+    else:
+        await relay_signal(user, message_type, payload)
+
+
+async def handle_call_join(db: AsyncSession, user: User, room_id: int) -> None:
+    """通話に参加"""
+    if not await ChatService.is_user_in_room(db, user.id, room_id):
+        await _send_error(user.id, "Not a member of this room")
+        return
+
+    previous = call_manager.call_of(user.id)
+    if previous is not None and previous.room_id != room_id:
+        await leave_call(user.id)
+
+    call = await call_manager.join(db, room_id, _user_fields(user))
+    timestamp = datetime.utcnow().isoformat()
+    await connection_manager.send_personal_message(
+        user.id, {"type": "call_joined", "payload": call.roster(), "timestamp": timestamp}
+    )
+    await _notify_participants(
+        call,
+        {
+            "type": "call_participant_joined",
+            "payload": {
+                "session_id": call.session_id,
+                "room_id": call.room_id,
+                "user": call.participants[user.id],
+            },
+            "timestamp": timestamp,
+        },
+        exclude_user=user.id,
+    )
+
+
+async def leave_call(user_id: int) -> None:
+    """通話から退出し、残りの参加者に通知する（参加していなければ何もしない。切断時にも呼ぶ）"""
+    call = call_manager.leave(user_id)
+    if call is None:
+        return
+    await _notify_participants(
+        call,
+        {
+            "type": "call_participant_left",
+            "payload": {"session_id": call.session_id, "room_id": call.room_id, "user_id": user_id},
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+    )
+
+
+async def relay_signal(user: User, message_type: str, payload: Dict[str, Any]) -> None:
+    """offer / answer / ICE candidate を同じ通話の参加者に中継"""
+    field = RELAYED_SIGNALS[message_type]
+    call = call_manager.call_of(user.id)
+    target_user_id = payload.get("target_user_id")
+
+    error = None
+    if call is None:
+        error = "Not in a call"
+    elif target_user_id == user.id or target_user_id not in call.participants:
+        error = "Target user is not in this call"
+    elif field not in payload:
+        error = f"Missing {field}"
+    elif len(json.dumps(payload[field])) > MAX_SIGNAL_LENGTH:
+        error = f"{field} too large"
+
+    if error is not None:
+        call_signals.inc(type=message_type, result="rejected")
+        await _send_error(user.id, error)
+        return
+
+    delivered = await connection_manager.send_personal_message(
+        target_user_id,
+        {
+            "type": message_type,
+            "payload": {
+                "session_id": call.session_id,
+                "from_user_id": user.id,
+                field: payload[field],
+            },
+            "timestamp": datetime.utcnow().isoformat(),
+        },
+    )
+    call_signals.inc(type=message_type, result="relayed" if delivered else "undelivered")
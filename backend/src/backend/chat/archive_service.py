@@ -0,0 +1,281 @@
+"""
+Message archive service (hot/cold tiering)
+
+一定期間より古いメッセージを messages テーブルから取り除き、ルーム・月ごとの
+圧縮セグメント（message_archive_segments）へ移す。履歴取得は
+ChatService.get_room_message_rows からカーソルが古い範囲に入った時だけ読み出す。
+"""
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import Any, Dict, List, Optional, cast
+
+from sqlalchemy import CursorResult, delete, desc, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from backend.cache import TTLCache
+from backend.config import settings
+from backend.models.message import Message, MessageType
+from backend.models.message_archive import MessageArchiveSegment
+
+logger = logging.getLogger(__name__)
+
+CODEC = "zlib-json"
+
+# セグメントに保存するカラム
+ARCHIVED_COLUMNS = [
+    "id",
+    "content",
+    "message_type",
+    "user_id",
+    "room_id",
+    "parent_id",
+    "has_latex",
+    "has_code",
+    "segments",
+    "reply_count",
+    "last_reply_at",
+    "created_at",
+    "updated_at",
+]
+
+_DATETIME_COLUMNS = ("last_reply_at", "created_at", "updated_at")
+
+# ルームでアーカイブ済みの最大メッセージID（アーカイブ・セグメント削除のコミット後に無効化する）
+cold_watermark_cache: "TTLCache[Optional[int]]" = TTLCache(
+    "cold_watermarks", settings.room_cache_size, settings.room_cache_ttl_seconds
+)
+
+
+def encode_rows(rows: List[Dict[str, Any]]) -> bytes:
+    """行データ（decode_segmentの形式）をJSONにしてzlib圧縮"""
+    encoded = []
+    for row in rows:
+        row = {column: row[column] for column in ARCHIVED_COLUMNS}
+        row["message_type"] = row["message_type"].value
+        for column in _DATETIME_COLUMNS:
+            if row[column] is not None:
+                row[column] = row[column].isoformat()
+        encoded.append(row)
+    return zlib.compress(json.dumps(encoded, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def encode_messages(messages: List[Message]) -> bytes:
+    """メッセージ列をJSONにしてzlib圧縮"""
+    return encode_rows(
+        [{column: getattr(message, column) for column in ARCHIVED_COLUMNS} for message in messages]
+    )
+
+
+def decode_segment(segment: MessageArchiveSegment) -> List[Dict[str, Any]]:
+    """セグメントを展開してメッセージの行データを返す"""
+    if segment.codec != CODEC:
+        raise ValueError(f"Unsupported archive codec: {segment.codec}")
+
+    rows = json.loads(zlib.decompress(segment.payload))
+    for row in rows:
+        row["message_type"] = MessageType(row["message_type"])
+        for column in _DATETIME_COLUMNS:
+            if row[column] is not None:
+                row[column] = datetime.fromisoformat(row[column])
+    return rows
+
+
+def _period(message: Message) -> str:
+    return message.created_at.strftime("%Y-%m")
+
+
+class ArchiveService:
+    """メッセージのアーカイブとコールドデータの読み出し"""
+
+    @staticmethod
+    def default_cutoff() -> datetime:
+        """設定に基づくアーカイブ境界日時"""
+        return datetime.now(timezone.utc) - timedelta(days=settings.archive_after_days)
+
+    @staticmethod
+    async def archive_room(
+        db: AsyncSession,
+        room_id: int,
+        cutoff: datetime,
+        batch_size: int = 1000,
+    ) -> int:
+        """ルームのcutoffより古いメッセージをアーカイブし、移動件数を返す"""
+        # ホットに残るメッセージの祖先（返信元）は、parent_idの参照を保つためホットに残す
+        reply = aliased(Message)
+        pinned = (
+            select(Message.parent_id.label("id"))
+            .where(
+                Message.room_id == room_id,
+                Message.created_at >= cutoff,
+                Message.parent_id.is_not(None),
+            )
+            .cte("pinned", recursive=True)
+        )
+        pinned = pinned.union(
+            select(reply.parent_id)
+            .join(pinned, reply.id == pinned.c.id)
+            .where(reply.parent_id.is_not(None))
+        )
+
+        archived = 0
+        upper_id: Optional[int] = None
+        while True:
+            # 返信（子）が親より先に消えるよう、新しい方から順に処理する
+            query = (
+                select(Message)
+                .where(
+                    Message.room_id == room_id,
+                    Message.created_at < cutoff,
+                    Message.id.not_in(select(pinned.c.id)),
+                )
+                .order_by(desc(Message.id))
+                .limit(batch_size)
+            )
+            if upper_id is not None:
+                query = query.where(Message.id < upper_id)
+
+            messages = list((await db.execute(query)).scalars().all())
+            if not messages:
+                break
+
+            ordered = sorted(messages, key=lambda m: m.id)
+            for period, group in groupby(ordered, key=_period):
+                rows = list(group)
+                db.add(
+                    MessageArchiveSegment(
+                        room_id=room_id,
+                        period=period,
+                        min_message_id=rows[0].id,
+                        max_message_id=rows[-1].id,
+                        message_count=len(rows),
+                        min_created_at=min(m.created_at for m in rows),
+                        max_created_at=max(m.created_at for m in rows),
+                        codec=CODEC,
+                        payload=encode_messages(rows),
+                    )
+                )
+
+            ids = [m.id for m in messages]
+            result = cast(
+                CursorResult[Any],
+                await db.execute(
+                    delete(Message)
+                    .where(Message.id.in_(ids))
+                    .execution_options(synchronize_session=False)
+                ),
+            )
+            if result.rowcount != len(ids):
+                # 他のワーカーが同じバッチを先にアーカイブした（セグメントを二重に作らない）
+                await db.rollback()
+                logger.info(
+                    f"Room {room_id} is being archived concurrently; "
+                    f"skipped a batch of {len(ids)} messages"
+                )
+                break
+            await db.commit()
+            cold_watermark_cache.invalidate(room_id)
+            for message in messages:
+                db.expunge(message)
+
+            archived += len(ids)
+            upper_id = ordered[0].id
+            logger.info(f"Archived {len(ids)} messages from room {room_id} (total {archived})")
+
+        return archived
+
+    @staticmethod
+    async def archive_older_than(
+        db: AsyncSession,
+        cutoff: Optional[datetime] = None,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """全ルームのcutoffより古いメッセージをアーカイブ"""
+        cutoff = cutoff or ArchiveService.default_cutoff()
+        batch_size = batch_size or settings.archive_batch_size
+
+        room_ids = (
+            await db.execute(
+                select(Message.room_id).where(Message.created_at < cutoff).distinct()
+            )
+        ).scalars().all()
+        await db.commit()
+
+        total = 0
+        for room_id in room_ids:
+            total += await ArchiveService.archive_room(db, room_id, cutoff, batch_size)
+        return total
+
+    @staticmethod
+    async def replace_segment_rows(
+        db: AsyncSession, segment: MessageArchiveSegment, rows: List[Dict[str, Any]]
+    ) -> None:
+        """セグメントの内容を行データで置き換える（空になればセグメントを削除。コミットは呼び出し側）"""
+        if not rows:
+            await db.delete(segment)
+            return
+        rows = sorted(rows, key=lambda row: row["id"])
+        segment.min_message_id = rows[0]["id"]
+        segment.max_message_id = rows[-1]["id"]
+        segment.message_count = len(rows)
+        segment.min_created_at = min(row["created_at"] for row in rows)
+        segment.max_created_at = max(row["created_at"] for row in rows)
+        segment.codec = CODEC
+        segment.payload = encode_rows(rows)
+
+    @staticmethod
+    async def get_cold_watermark(db: AsyncSession, room_id: int) -> Optional[int]:
+        """ルームでアーカイブ済みの最大メッセージID（キャッシュ経由）"""
+        async def load() -> Optional[int]:
+            result = await db.execute(
+                select(func.max(MessageArchiveSegment.max_message_id)).where(
+                    MessageArchiveSegment.room_id == room_id
+                )
+            )
+            return result.scalar()
+
+        return await cold_watermark_cache.get_or_load(room_id, load, cache_none=True)
+
+    @staticmethod
+    async def get_cold_messages(
+        db: AsyncSession,
+        room_id: int,
+        limit: int,
+        before_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """アーカイブからbefore_idより古いメッセージを新しい順に最大limit件取得"""
+        query = (
+            select(MessageArchiveSegment)
+            .where(MessageArchiveSegment.room_id == room_id)
+            .order_by(desc(MessageArchiveSegment.max_message_id))
+        )
+        if before_id:
+            query = query.where(MessageArchiveSegment.min_message_id < before_id)
+
+        rows: List[Dict[str, Any]] = []
+        result = await db.stream_scalars(query)
+        async for segment in result:
+            # 集めた行のうち、このセグメントより確実に新しいものが十分あれば終了
+            newer = [row for row in rows if row["id"] > segment.max_message_id]
+            if len(newer) >= limit:
+                break
+            rows.extend(
+                row for row in decode_segment(segment) if not before_id or row["id"] < before_id
+            )
+        await result.close()
+
+        rows.sort(key=lambda row: row["id"], reverse=True)
+        return rows[:limit]
+
+
+async def run_archiver() -> None:
+    """バックグラウンドジョブ: 古いメッセージをアーカイブ"""
+    from backend.models.base import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        archived = await ArchiveService.archive_older_than(db)
+    if archived:
+        logger.info(f"Message archiver moved {archived} messages to cold storage")
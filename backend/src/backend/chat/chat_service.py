@@ -1,53 +1,157 @@
 """
 Chat service for handling chat operations
 """
-from typing import List, Optional, Dict, Any
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Any, FrozenSet, Iterable, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc
-from sqlalchemy.orm import selectinload
+from sqlalchemy import Select, select, and_, desc, update, func, literal
 
+from backend.cache import TTLCache
+from backend.chat.archive_service import ArchiveService
+from backend.chat.content_parser import has_code, has_math, parse_content
+from backend.chat.read_models import (
+    MESSAGE_ROW_COLUMNS,
+    ROOM_DETAIL_COLUMNS,
+    ROOM_MEMBER_COLUMNS,
+    ROOM_SUMMARY_COLUMNS,
+    USER_PROFILE_COLUMNS,
+    MessageRow,
+    RoomDetailRow,
+    RoomMemberRow,
+    RoomSummaryRow,
+    message_row_from_archive,
+)
+from backend.chat.search_service import strip_highlight_markers
 from backend.models.user import User
 from backend.models.chat_room import ChatRoom, RoomMember, RoleType
+from backend.config import settings
 from backend.models.message import Message, MessageType
 
 
+class RoomInfo(NamedTuple):
+    """キャッシュ用のルーム情報（セッションに依存しない値）"""
+    id: int
+    name: str
+    description: Optional[str]
+    is_private: bool
+    created_by: int
+    retention_days: Optional[int]
+    created_at: datetime
+
+
+# ルーム情報とメンバーIDの集合（更新時にChatServiceが明示的に無効化する）
+room_cache: "TTLCache[RoomInfo]" = TTLCache(
+    "rooms", settings.room_cache_size, settings.room_cache_ttl_seconds
+)
+room_members_cache: "TTLCache[FrozenSet[int]]" = TTLCache(
+    "room_members", settings.room_cache_size, settings.room_cache_ttl_seconds
+)
+
+
 class ChatService:
     """チャット機能のビジネスロジック"""
     
     @staticmethod
-    async def get_user_rooms(db: AsyncSession, user_id: int) -> List[Dict[str, Any]]:
-        """ユーザーが参加しているルーム一覧を取得"""
+    async def get_user_rooms(db: AsyncSession, user_id: int) -> List[RoomSummaryRow]:
+        """ユーザーが参加しているルーム一覧を取得（メンバー数付き）"""
         result = await db.execute(
-            select(ChatRoom)
+            select(*ROOM_SUMMARY_COLUMNS)
             .join(RoomMember)
             .where(RoomMember.user_id == user_id)
-            .options(selectinload(ChatRoom.members).selectinload(RoomMember.user))
+            .order_by(ChatRoom.id)
         )
-        rooms = result.scalars().all()
+        return [RoomSummaryRow(*row) for row in result.all()]
+    
+    @staticmethod
+    async def get_room_detail(db: AsyncSession, room_id: int) -> Optional[RoomDetailRow]:
+        """ルーム詳細の項目を取得（キャッシュを経由しない）"""
+        result = await db.execute(select(*ROOM_DETAIL_COLUMNS).where(ChatRoom.id == room_id))
+        row = result.one_or_none()
+        return RoomDetailRow(*row) if row else None
+    
+    @staticmethod
+    async def get_room_members(db: AsyncSession, room_id: int) -> List[RoomMemberRow]:
+        """ルームのメンバーをプロフィールとロール付きで取得（参加順）"""
+        result = await db.execute(
+            select(*ROOM_MEMBER_COLUMNS)
+            .join(RoomMember, RoomMember.user_id == User.id)
+            .where(RoomMember.room_id == room_id)
+            .order_by(RoomMember.id)
+        )
+        return [RoomMemberRow(*row) for row in result.all()]
+    
+    @staticmethod
+    async def get_room_info(db: AsyncSession, room_id: int) -> Optional[RoomInfo]:
+        """ルーム情報を取得（キャッシュ経由、メンバーは含まない）"""
+        async def load() -> Optional[RoomInfo]:
+            result = await db.execute(
+                select(
+                    ChatRoom.id,
+                    ChatRoom.name,
+                    ChatRoom.description,
+                    ChatRoom.is_private,
+                    ChatRoom.created_by,
+                    ChatRoom.retention_days,
+                    ChatRoom.created_at,
+                ).where(ChatRoom.id == room_id)
+            )
+            row = result.one_or_none()
+            return RoomInfo(*row) if row else None
         
-        room_list = []
-        for room in rooms:
-            room_dict = {
-                "id": room.id,
-                "name": room.name,
-                "description": room.description,
-                "is_private": room.is_private,
-                "created_at": room.created_at.isoformat(),
-                "member_count": len(room.members)
-            }
-            room_list.append(room_dict)
+        return await room_cache.get_or_load(room_id, load)
+    
+    @staticmethod
+    async def get_member_ids(db: AsyncSession, room_id: int) -> FrozenSet[int]:
+        """ルームのメンバーIDの集合を取得（キャッシュ経由）"""
+        async def load() -> FrozenSet[int]:
+            result = await db.execute(
+                select(RoomMember.user_id).where(RoomMember.room_id == room_id)
+            )
+            return frozenset(result.scalars().all())
         
-        return room_list
+        return await room_members_cache.get_or_load(room_id, load)
+    
+    @staticmethod
+    async def get_room_version(db: AsyncSession, room_id: int) -> Optional[int]:
+        """ルームの更新カウンタを取得（存在しなければNone）"""
+        result = await db.execute(select(ChatRoom.version).where(ChatRoom.id == room_id))
+        return result.scalar_one_or_none()
     
     @staticmethod
-    async def get_room_by_id(db: AsyncSession, room_id: int) -> Optional[ChatRoom]:
-        """ルームIDでルームを取得"""
+    async def get_user_room_versions(db: AsyncSession, user_id: int) -> List[Tuple[int, int]]:
+        """ユーザーが参加しているルームのIDと更新カウンタの一覧（ID順）"""
         result = await db.execute(
-            select(ChatRoom)
-            .where(ChatRoom.id == room_id)
-            .options(selectinload(ChatRoom.members).selectinload(RoomMember.user))
+            select(ChatRoom.id, ChatRoom.version)
+            .join(RoomMember)
+            .where(RoomMember.user_id == user_id)
+            .order_by(ChatRoom.id)
         )
-        return result.scalar_one_or_none()
+        return [(room_id, version) for room_id, version in result.all()]
+    
+    @staticmethod
+    async def bump_room_versions(
+        db: AsyncSession, room_ids: Union[Iterable[int], Select]
+    ) -> None:
+        """ルームの更新カウンタを進める（コミットは呼び出し側のトランザクションで行う）
+
+        room_ids にはIDの列のほか、ルームIDを返すSELECTも渡せる。
+        """
+        if not isinstance(room_ids, Select):
+            room_ids = list(room_ids)
+            if not room_ids:
+                return
+        await db.execute(
+            update(ChatRoom)
+            .where(ChatRoom.id.in_(room_ids))
+            .values(version=ChatRoom.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    
+    @staticmethod
+    def invalidate_room(room_id: int) -> None:
+        """ルーム情報とメンバーのキャッシュを無効化"""
+        room_cache.invalidate(room_id)
+        room_members_cache.invalidate(room_id)
     
     @staticmethod
     async def create_room(
@@ -78,6 +182,7 @@ class ChatService:
         db.add(member)
         await db.commit()
         await db.refresh(room)
+        ChatService.invalidate_room(room.id)
         
         return room
     
@@ -105,7 +210,9 @@ class ChatService:
         )
         
         db.add(member)
+        await ChatService.bump_room_versions(db, [room_id])
         await db.commit()
+        room_members_cache.invalidate(room_id)
         
         return True
     
@@ -126,15 +233,17 @@ class ChatService:
             return False  # メンバーではない
         
         await db.delete(member)
+        await ChatService.bump_room_versions(db, [room_id])
         await db.commit()
+        room_members_cache.invalidate(room_id)
         
         return True
     
     @staticmethod
-    async def is_user_in_room(db: AsyncSession, user_id: int, room_id: int) -> bool:
-        """ユーザーがルームのメンバーかチェック"""
+    async def get_member_role(db: AsyncSession, user_id: int, room_id: int) -> Optional[RoleType]:
+        """ルームでのユーザーのロールを取得（メンバーでなければNone）"""
         result = await db.execute(
-            select(RoomMember).where(
+            select(RoomMember.role).where(
                 and_(
                     RoomMember.user_id == user_id,
                     RoomMember.room_id == room_id
@@ -142,7 +251,27 @@ class ChatService:
             )
         )
         
-        return result.scalar_one_or_none() is not None
+        return result.scalar_one_or_none()
+    
+    @staticmethod
+    async def set_room_retention(
+        db: AsyncSession, room_id: int, retention_days: Optional[int]
+    ) -> bool:
+        """ルームのメッセージ保持日数を設定（Noneで既定値に戻す）"""
+        result = await db.execute(
+            update(ChatRoom)
+            .where(ChatRoom.id == room_id)
+            .values(retention_days=retention_days, version=ChatRoom.version + 1)
+        )
+        await db.commit()
+        room_cache.invalidate(room_id)
+        
+        return result.rowcount > 0
+    
+    @staticmethod
+    async def is_user_in_room(db: AsyncSession, user_id: int, room_id: int) -> bool:
+        """ユーザーがルームのメンバーかチェック"""
+        return user_id in await ChatService.get_member_ids(db, room_id)
     
     @staticmethod
     async def save_message(
@@ -154,9 +283,10 @@ class ChatService:
         parent_id: Optional[int] = None
     ) -> Message:
         """メッセージを保存"""
-        # LaTeXとコードの自動検出
-        has_latex = "$$" in content or "$" in content
-        has_code = "```" in content or "`" in content
+        # 検索スニペットのハイライトの目印と紛れないよう、目印の文字は保存しない
+        content = strip_highlight_markers(content)
+        # 本文を一度だけ解析し、LaTeX・コードの有無もセグメントから判定
+        segments = parse_content(content)
         
         message = Message(
             content=content,
@@ -164,29 +294,47 @@ class ChatService:
             user_id=user_id,
             room_id=room_id,
             parent_id=parent_id,
-            has_latex=has_latex,
-            has_code=has_code
+            has_latex=has_math(segments),
+            has_code=has_code(segments),
+            segments=segments
         )
         
         db.add(message)
+        
+        # 返信の場合は親メッセージの返信数と最終返信日時を同一トランザクションで更新
+        if parent_id is not None:
+            result = await db.execute(
+                update(Message)
+                .where(and_(Message.id == parent_id, Message.room_id == room_id))
+                .values(reply_count=Message.reply_count + 1, last_reply_at=func.now())
+                .execution_options(synchronize_session="fetch")
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                raise ValueError(f"Parent message {parent_id} not found in room {room_id}")
+        
+        await ChatService.bump_room_versions(db, [room_id])
         await db.commit()
         await db.refresh(message)
         
         return message
     
     @staticmethod
-    async def get_room_messages(
-        db: AsyncSession, 
-        room_id: int, 
-        limit: int = 50, 
+    async def get_room_message_rows(
+        db: AsyncSession,
+        room_id: int,
+        limit: int = 50,
         before_id: Optional[int] = None
-    ) -> List[Message]:
-        """ルームのメッセージ履歴を取得"""
+    ) -> List[MessageRow]:
+        """ルームのメッセージ履歴を応答用の行として取得（古い順）
+
+        カーソルがアーカイブ済みの範囲に入った場合はコールドセグメントから補完する。
+        """
         query = (
-            select(Message)
+            select(*MESSAGE_ROW_COLUMNS)
+            .join(User, User.id == Message.user_id)
             .where(Message.room_id == room_id)
-            .options(selectinload(Message.user))
-            .order_by(desc(Message.created_at))
+            .order_by(desc(Message.id))
             .limit(limit)
         )
         
@@ -194,18 +342,78 @@ class ChatService:
             query = query.where(Message.id < before_id)
         
         result = await db.execute(query)
-        messages = result.scalars().all()
+        rows = [MessageRow(*row) for row in result.all()]
         
-        # 時系列順に並び替え
-        return list(reversed(messages))
+        # ページがアーカイブ済みの範囲に届く場合のみコールドデータを読む
+        # （埋まらなかったページはウォーターマークを見ずにコールドを読む）
+        if len(rows) < limit or await ChatService._reaches_cold(db, room_id, rows[-1].id):
+            cold_rows = await ArchiveService.get_cold_messages(db, room_id, limit, before_id)
+            user_ids = {row["user_id"] for row in cold_rows}
+            users = {}
+            if user_ids:
+                result = await db.execute(
+                    select(*USER_PROFILE_COLUMNS).where(User.id.in_(user_ids))
+                )
+                users = {user[0]: tuple(user) for user in result.all()}
+            rows.extend(
+                message_row_from_archive(row, users.get(row["user_id"])) for row in cold_rows
+            )
+            rows.sort(key=lambda row: row.id, reverse=True)
+            rows = rows[:limit]
+        
+        rows.reverse()
+        return rows
+    
+    @staticmethod
+    async def _reaches_cold(db: AsyncSession, room_id: int, oldest_id: int) -> bool:
+        """埋まったホットのページにアーカイブ済みのメッセージが入り得るか（ウォーターマークはキャッシュ経由）"""
+        watermark = await ArchiveService.get_cold_watermark(db, room_id)
+        return watermark is not None and oldest_id < watermark
     
     @staticmethod
-    async def get_message_with_user(db: AsyncSession, message_id: int) -> Optional[Message]:
-        """メッセージをユーザー情報と共に取得"""
+    async def get_message_row(db: AsyncSession, message_id: int) -> Optional[MessageRow]:
+        """メッセージを投稿者のプロフィールと共に取得"""
         result = await db.execute(
-            select(Message)
+            select(*MESSAGE_ROW_COLUMNS)
+            .join(User, User.id == Message.user_id)
             .where(Message.id == message_id)
-            .options(selectinload(Message.user))
         )
+        row = result.one_or_none()
+        return MessageRow(*row) if row else None
+    
+    @staticmethod
+    async def get_thread_replies(
+        db: AsyncSession,
+        root_id: int,
+        limit: int = 50,
+        after_id: Optional[int] = None
+    ) -> Tuple[List[Tuple[MessageRow, int]], bool]:
+        """スレッド内の全返信を深さ付きで取得（再帰CTEによる単一クエリ）"""
+        thread = (
+            select(Message.id, literal(0).label("depth"))
+            .where(Message.id == root_id)
+            .cte("thread", recursive=True)
+        )
+        thread = thread.union_all(
+            select(Message.id, (thread.c.depth + 1).label("depth"))
+            .join(thread, Message.parent_id == thread.c.id)
+        )
+        
+        # 返信のIDは親より常に大きいため、IDによるキーセットページネーション
+        query = (
+            select(*MESSAGE_ROW_COLUMNS, thread.c.depth)
+            .join(thread, Message.id == thread.c.id)
+            .join(User, User.id == Message.user_id)
+            .where(thread.c.depth > 0)
+            .order_by(Message.id)
+            .limit(limit + 1)
+        )
+        
+        if after_id:
+            query = query.where(Message.id > after_id)
+        
+        result = await db.execute(query)
+        rows = [(MessageRow(*row[:-1]), row[-1]) for row in result.all()]
         
-        return result.scalar_one_or_none()
\ No newline at end of file
+        has_more = len(rows) > limit
+        return rows[:limit], has_more
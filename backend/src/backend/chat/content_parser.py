@@ -0,0 +1,217 @@
+"""
+Message content parser for LaTeX and code segments
+
+メッセージ本文を書き込み時に一度だけ解析し、クライアントがそのまま描画できる
+コンパクトなセグメント列に変換する。
+
+セグメント形式（JSON配列）:
+    ["text", "本文"]
+    ["math", "x^2"]                # インライン数式 $...$ / \\(...\\)
+    ["display_math", "\\sum x"]    # ディスプレイ数式 $$...$$ / \\[...\\]
+    ["inline_code", "print()"]     # `...`
+    ["code", "print()", "python"]  # フェンスコードブロック（言語なしはNone）
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from backend.config import settings
+
+TEXT = "text"
+MATH = "math"
+DISPLAY_MATH = "display_math"
+INLINE_CODE = "inline_code"
+CODE = "code"
+
+Segment = Tuple[Optional[str], ...]
+Segments = Tuple[Segment, ...]
+
+MATH_SEGMENT_TYPES = frozenset({MATH, DISPLAY_MATH})
+CODE_SEGMENT_TYPES = frozenset({INLINE_CODE, CODE})
+
+
+def _at_line_start(content: str, index: int) -> bool:
+    """indexが行頭（先頭の空白3つまでを許容）かどうか"""
+    line_start = content.rfind("\n", 0, index) + 1
+    prefix = content[line_start:index]
+    return len(prefix) <= 3 and prefix.strip(" ") == ""
+
+
+def _find_closing_fence(content: str, start: int) -> Tuple[int, int]:
+    """閉じフェンスの開始位置と、その行の次の位置を返す（無ければ末尾）"""
+    position = start
+    while True:
+        index = content.find("```", position)
+        if index < 0:
+            return len(content), len(content)
+        if _at_line_start(content, index):
+            line_end = content.find("\n", index)
+            return index, len(content) if line_end < 0 else line_end + 1
+        position = index + 3
+
+
+def _find_inline_math_end(content: str, start: int) -> int:
+    """インライン数式 $...$ の閉じ位置を返す（無ければ-1）
+
+    金額表記（"$5 and $10"）を数式と誤認しないよう、開始直後と終了直前に
+    空白を許さず、終了直後に数字が続く場合も閉じとみなさない。
+    """
+    if start >= len(content) or content[start].isspace():
+        return -1
+
+    position = start
+    while True:
+        index = content.find("$", position)
+        if index < 0:
+            return -1
+        if content[index - 1] == "\\":
+            position = index + 1
+            continue
+        if content[index - 1].isspace() or (
+            index + 1 < len(content) and content[index + 1].isdigit()
+        ):
+            position = index + 1
+            continue
+        return index
+
+
+def _parse(content: str) -> Segments:
+    """本文をセグメント列に変換"""
+    segments = []
+    text_buffer = []
+
+    def flush_text() -> None:
+        if text_buffer:
+            segments.append((TEXT, "".join(text_buffer)))
+            text_buffer.clear()
+
+    length = len(content)
+    i = 0
+    while i < length:
+        char = content[i]
+
+        if char == "`":
+            if content.startswith("```", i) and _at_line_start(content, i):
+                # フェンスコードブロック
+                info_end = content.find("\n", i)
+                if info_end < 0:
+                    info_end = length
+                language = content[i + 3:info_end].strip().split(" ")[0] or None
+                body_start = min(info_end + 1, length)
+                close_start, close_end = _find_closing_fence(content, body_start)
+                flush_text()
+                segments.append((CODE, content[body_start:close_start].rstrip("\n"), language))
+                i = close_end
+                continue
+
+            # インラインコード（同じ長さのバッククォート列で閉じる）
+            run_end = i
+            while run_end < length and content[run_end] == "`":
+                run_end += 1
+            fence = content[i:run_end]
+            close = content.find(fence, run_end)
+            while close >= 0 and close + len(fence) < length and content[close + len(fence)] == "`":
+                close = content.find(fence, close + len(fence) + 1)
+            if close < 0:
+                text_buffer.append(fence)
+                i = run_end
+                continue
+            flush_text()
+            segments.append((INLINE_CODE, content[run_end:close]))
+            i = close + len(fence)
+            continue
+
+        if char == "\\" and i + 1 < length:
+            following = content[i + 1]
+            if following == "$":
+                text_buffer.append("$")
+                i += 2
+                continue
+            if following in "([":
+                closing = "\\)" if following == "(" else "\\]"
+                close = content.find(closing, i + 2)
+                if close >= 0:
+                    flush_text()
+                    segment_type = MATH if following == "(" else DISPLAY_MATH
+                    segments.append((segment_type, content[i + 2:close].strip()))
+                    i = close + 2
+                    continue
+
+        if char == "$":
+            if content.startswith("$$", i):
+                close = content.find("$$", i + 2)
+                if close >= 0 and content[i + 2:close].strip():
+                    flush_text()
+                    segments.append((DISPLAY_MATH, content[i + 2:close].strip()))
+                    i = close + 2
+                    continue
+                text_buffer.append("$$")
+                i += 2
+                continue
+
+            close = _find_inline_math_end(content, i + 1)
+            if close >= 0:
+                flush_text()
+                segments.append((MATH, content[i + 1:close]))
+                i = close + 1
+                continue
+
+        text_buffer.append(char)
+        i += 1
+
+    flush_text()
+    return tuple(segments)
+
+
+class SegmentCache:
+    """本文のハッシュをキーとするLRUキャッシュ"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Segments]" = OrderedDict()
+
+    def get_or_parse(self, content: str) -> Segments:
+        """キャッシュ済みのセグメントを返し、無ければ解析して登録"""
+        key = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+        segments = self._entries.get(key)
+        if segments is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return segments
+
+        self.misses += 1
+        segments = _parse(content)
+        self._entries[key] = segments
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return segments
+
+    def stats(self) -> Dict[str, int]:
+        """キャッシュ統計を取得"""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+segment_cache = SegmentCache(maxsize=settings.content_parse_cache_size)
+
+
+def parse_content(content: str) -> Segments:
+    """本文をセグメント列に変換（キャッシュ経由）"""
+    return segment_cache.get_or_parse(content)
+
+
+def has_math(segments: Segments) -> bool:
+    """数式セグメントを含むか"""
+    return any(segment[0] in MATH_SEGMENT_TYPES for segment in segments)
+
+
+def has_code(segments: Segments) -> bool:
+    """コードセグメントを含むか"""
+    return any(segment[0] in CODE_SEGMENT_TYPES for segment in segments)
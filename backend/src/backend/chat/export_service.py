@@ -0,0 +1,251 @@
+"""
+Room history export (NDJSON)
+
+ルームの全履歴（または期間指定）を1行1メッセージのJSONとしてストリーミング出力する。
+ホットデータはサーバーサイドカーソル（yield_per）で、アーカイブ済みデータは
+セグメント単位で読み出すため、ルームの規模に関わらずメモリ使用量は一定。
+"""
+import heapq
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.chat.archive_service import decode_segment
+from backend.config import settings
+from backend.models.message import Message
+from backend.models.message_archive import MessageArchiveSegment
+from backend.models.user import User
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# gzipヘッダ付きで圧縮する（zlib.compressobjのwbits=16+15）
+_GZIP_WBITS = 31
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    """期間指定をUTCに揃える（タイムゾーンなしはUTCとみなす）"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """比較用にタイムゾーンなしのUTCへ揃える（SQLiteはnaiveな値を返す）"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _in_range(value: datetime, since: Optional[datetime], until: Optional[datetime]) -> bool:
+    value = _naive_utc(value)
+    if since is not None and value < _naive_utc(since):
+        return False
+    if until is not None and value >= _naive_utc(until):
+        return False
+    return True
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _encode_line(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _record(row: Dict[str, Any], user: Dict[str, Any]) -> Dict[str, Any]:
+    """エクスポート1行分のレコードを作成"""
+    return {
+        "id": row["id"],
+        "room_id": row["room_id"],
+        "parent_id": row["parent_id"],
+        "message_type": row["message_type"].value,
+        "content": row["content"],
+        "user": user,
+        "has_latex": row["has_latex"],
+        "has_code": row["has_code"],
+        "reply_count": row["reply_count"] or 0,
+        "created_at": _isoformat(row["created_at"]),
+        "updated_at": _isoformat(row["updated_at"]),
+    }
+
+
+_HOT_COLUMNS = (
+    Message.id,
+    Message.room_id,
+    Message.parent_id,
+    Message.message_type,
+    Message.content,
+    Message.has_latex,
+    Message.has_code,
+    Message.reply_count,
+    Message.created_at,
+    Message.updated_at,
+    Message.user_id,
+    User.username,
+    User.display_name,
+)
+
+
+class ExportService:
+    """ルーム履歴のエクスポート"""
+
+    @staticmethod
+    async def iter_room_ndjson(
+        session_factory: async_sessionmaker,
+        room_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        batch_size: Optional[int] = None,
+    ) -> AsyncIterator[bytes]:
+        """ルームのメッセージをID順（古い順）にNDJSONの行として返す
+
+        ホットに残る返信元（アーカイブされない祖先）とアーカイブ済みのメッセージは
+        IDが入り組むため、両方をID順に読みながら合わせる。
+        レスポンスの送信中も読み続けるため、リクエストのセッションではなく
+        専用のセッションを開く。
+        """
+        batch_size = batch_size or settings.export_batch_size
+        since, until = _utc(since), _utc(until)
+
+        async with session_factory() as db:
+            cold = ExportService._iter_cold(db, room_id, since, until)
+            hot = ExportService._iter_hot(db, room_id, since, until, batch_size)
+            lines: List[bytes] = []
+            try:
+                async for _, line in _merge_by_id(cold, hot):
+                    lines.append(line)
+                    if len(lines) >= batch_size:
+                        yield b"".join(lines)
+                        lines = []
+                if lines:
+                    yield b"".join(lines)
+            finally:
+                # 途中で切断された場合もサーバーサイドカーソルを閉じる
+                await hot.aclose()
+                await cold.aclose()
+
+    @staticmethod
+    async def _iter_hot(
+        db: AsyncSession,
+        room_id: int,
+        since: Optional[datetime],
+        until: Optional[datetime],
+        batch_size: int,
+    ) -> AsyncGenerator[Tuple[int, bytes], None]:
+        """ホットのメッセージをサーバーサイドカーソルでID順に読み出す"""
+        query = (
+            select(*_HOT_COLUMNS)
+            .join(User, User.id == Message.user_id)
+            .where(Message.room_id == room_id)
+            .order_by(Message.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if since is not None:
+            query = query.where(Message.created_at >= since)
+        if until is not None:
+            query = query.where(Message.created_at < until)
+
+        result = await db.stream(query)
+        try:
+            async for partition in result.mappings().partitions():
+                for row in partition:
+                    user = {
+                        "id": row["user_id"],
+                        "username": row["username"],
+                        "display_name": row["display_name"],
+                    }
+                    yield row["id"], _encode_line(_record(dict(row), user))
+        finally:
+            await result.close()
+
+    @staticmethod
+    async def _iter_cold(
+        db: AsyncSession,
+        room_id: int,
+        since: Optional[datetime],
+        until: Optional[datetime],
+    ) -> AsyncGenerator[Tuple[int, bytes], None]:
+        """アーカイブ済みメッセージをセグメント単位で読み出し、ID順に返す
+
+        セグメントのIDの範囲は重なり得る（アーカイブの実行ごとに作られる）ため、
+        次のセグメントの最小IDより小さい行だけを先に出す。
+        """
+        query = (
+            select(MessageArchiveSegment.id, MessageArchiveSegment.min_message_id)
+            .where(MessageArchiveSegment.room_id == room_id)
+            .order_by(MessageArchiveSegment.min_message_id)
+        )
+        if since is not None:
+            query = query.where(MessageArchiveSegment.max_created_at >= since)
+        if until is not None:
+            query = query.where(MessageArchiveSegment.min_created_at < until)
+
+        segments = (await db.execute(query)).all()
+        users: Dict[int, Dict[str, Any]] = {}
+        pending: List[Tuple[int, bytes]] = []
+
+        # ペイロードは1セグメントずつ読み込み、展開後すぐに手放す
+        for segment_id, min_message_id in segments:
+            while pending and pending[0][0] < min_message_id:
+                yield heapq.heappop(pending)
+
+            segment = await db.get(MessageArchiveSegment, segment_id)
+            rows = [row for row in decode_segment(segment) if _in_range(row["created_at"], since, until)]
+            db.expunge(segment)
+
+            missing = {row["user_id"] for row in rows} - users.keys()
+            if missing:
+                result = await db.execute(
+                    select(User.id, User.username, User.display_name).where(User.id.in_(missing))
+                )
+                for user_id, username, display_name in result.all():
+                    users[user_id] = {
+                        "id": user_id,
+                        "username": username,
+                        "display_name": display_name,
+                    }
+
+            for row in rows:
+                line = _encode_line(_record(row, users.get(row["user_id"], {"id": row["user_id"]})))
+                heapq.heappush(pending, (row["id"], line))
+
+        while pending:
+            yield heapq.heappop(pending)
+
+
+async def _merge_by_id(
+    first: AsyncIterator[Tuple[int, bytes]], second: AsyncIterator[Tuple[int, bytes]]
+) -> AsyncGenerator[Tuple[int, bytes], None]:
+    """ID順の2つのストリームをID順に合わせる"""
+    left = await anext(first, None)
+    right = await anext(second, None)
+    while left is not None and right is not None:
+        if left[0] < right[0]:
+            yield left
+            left = await anext(first, None)
+        else:
+            yield right
+            right = await anext(second, None)
+    while left is not None:
+        yield left
+        left = await anext(first, None)
+    while right is not None:
+        yield right
+        right = await anext(second, None)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """バイト列のストリームをgzip形式で逐次圧縮"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, _GZIP_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,226 @@
+"""
+Read models for hot REST responses
+
+ポーリングされる一覧系のエンドポイントでは、ORMオブジェクトの構築と
+pydanticモデルでの検証・再シリアライズが応答時間の大半を占める。ここでは
+必要な列だけをSELECTした行（NamedTuple）から、公開スキーマと同じ形のJSONを
+一度の json.dumps で直接バイト列にする。
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import func, select
+
+from backend.chat.content_parser import parse_content
+from backend.models.chat_room import ChatRoom, RoleType, RoomMember
+from backend.models.message import Message, MessageType
+from backend.models.user import User
+
+
+class MessageRow(NamedTuple):
+    """メッセージ履歴の1行（MessageResponseと同じ項目）"""
+    id: int
+    content: str
+    message_type: MessageType
+    room_id: int
+    parent_id: Optional[int]
+    has_latex: bool
+    has_code: bool
+    segments: Optional[List[Any]]
+    reply_count: int
+    last_reply_at: Optional[datetime]
+    created_at: datetime
+    user_id: int
+    username: Optional[str]
+    display_name: Optional[str]
+    avatar_url: Optional[str]
+
+
+# MessageRowの順に並べたSELECT対象の列（UserとのJOINが必要）
+MESSAGE_ROW_COLUMNS = (
+    Message.id,
+    Message.content,
+    Message.message_type,
+    Message.room_id,
+    Message.parent_id,
+    Message.has_latex,
+    Message.has_code,
+    Message.segments,
+    Message.reply_count,
+    Message.last_reply_at,
+    Message.created_at,
+    Message.user_id,
+    User.username,
+    User.display_name,
+    User.avatar_url,
+)
+
+# 投稿者のプロフィール列（アーカイブ済みの行に付けるため）
+USER_PROFILE_COLUMNS = (User.id, User.username, User.display_name, User.avatar_url)
+
+
+def message_row_from_archive(row: Dict[str, Any], user: Optional[tuple]) -> MessageRow:
+    """アーカイブの行データと投稿者の (id, username, display_name, avatar_url) から作成"""
+    username, display_name, avatar_url = user[1:] if user else (None, None, None)
+    return MessageRow(
+        id=row["id"],
+        content=row["content"],
+        message_type=row["message_type"],
+        room_id=row["room_id"],
+        parent_id=row["parent_id"],
+        has_latex=row["has_latex"],
+        has_code=row["has_code"],
+        segments=row["segments"],
+        reply_count=row["reply_count"],
+        last_reply_at=row["last_reply_at"],
+        created_at=row["created_at"],
+        user_id=row["user_id"],
+        username=username,
+        display_name=display_name,
+        avatar_url=avatar_url,
+    )
+
+
+def message_row_fields(row: MessageRow) -> Dict[str, Any]:
+    """MessageResponseのスキーマ通りのdict（キーの順序も同じ）"""
+    return {
+        "id": row.id,
+        "content": row.content,
+        "message_type": row.message_type.value,
+        "user": {
+            "id": row.user_id,
+            "username": row.username,
+            "display_name": row.display_name,
+            "avatar_url": row.avatar_url,
+        },
+        "room_id": row.room_id,
+        "parent_id": row.parent_id,
+        "has_latex": row.has_latex,
+        "has_code": row.has_code,
+        # 旧メッセージは解析済みセグメントを持たないため読み出し時に解析（キャッシュ経由）
+        "segments": row.segments or parse_content(row.content),
+        "reply_count": row.reply_count,
+        "last_reply_at": row.last_reply_at.isoformat() if row.last_reply_at else None,
+        "created_at": row.created_at.isoformat(),
+    }
+
+
+def thread_reply_fields(row: MessageRow, depth: int) -> Dict[str, Any]:
+    """ThreadReplyResponseのスキーマ通りのdict"""
+    fields = message_row_fields(row)
+    fields["depth"] = depth
+    return fields
+
+
+class RoomSummaryRow(NamedTuple):
+    """ルーム一覧の1行（RoomResponseと同じ項目）"""
+    id: int
+    name: str
+    description: Optional[str]
+    is_private: bool
+    created_at: datetime
+    member_count: int
+
+
+# メンバー数は相関サブクエリで数え、メンバー行自体は読み込まない
+ROOM_SUMMARY_COLUMNS = (
+    ChatRoom.id,
+    ChatRoom.name,
+    ChatRoom.description,
+    ChatRoom.is_private,
+    ChatRoom.created_at,
+    select(func.count(RoomMember.id))
+    .where(RoomMember.room_id == ChatRoom.id)
+    .correlate(ChatRoom)
+    .scalar_subquery()
+    .label("member_count"),
+)
+
+
+def room_summary_fields(row: RoomSummaryRow) -> Dict[str, Any]:
+    """RoomResponseのスキーマ通りのdict"""
+    return {
+        "id": row.id,
+        "name": row.name,
+        "description": row.description,
+        "is_private": row.is_private,
+        "created_at": row.created_at.isoformat(),
+        "member_count": row.member_count,
+    }
+
+
+class RoomDetailRow(NamedTuple):
+    """ルーム詳細（メンバー一覧を除く）"""
+    id: int
+    name: str
+    description: Optional[str]
+    is_private: bool
+    retention_days: Optional[int]
+    created_at: datetime
+
+
+ROOM_DETAIL_COLUMNS = (
+    ChatRoom.id,
+    ChatRoom.name,
+    ChatRoom.description,
+    ChatRoom.is_private,
+    ChatRoom.retention_days,
+    ChatRoom.created_at,
+)
+
+
+class RoomMemberRow(NamedTuple):
+    """ルームメンバー1人分（プロフィールとロール）"""
+    user_id: int
+    username: str
+    display_name: Optional[str]
+    avatar_url: Optional[str]
+    role: RoleType
+    joined_at: datetime
+
+
+# RoomMemberとUserのJOINが必要
+ROOM_MEMBER_COLUMNS = (
+    User.id,
+    User.username,
+    User.display_name,
+    User.avatar_url,
+    RoomMember.role,
+    RoomMember.joined_at,
+)
+
+
+def room_detail_fields(room: RoomDetailRow, members: Iterable[RoomMemberRow]) -> Dict[str, Any]:
+    """ルーム詳細レスポンスのdict"""
+    return {
+        "id": room.id,
+        "name": room.name,
+        "description": room.description,
+        "is_private": room.is_private,
+        "retention_days": room.retention_days,
+        "created_at": room.created_at.isoformat(),
+        "members": [
+            {
+                "id": member.user_id,
+                "username": member.username,
+                "display_name": member.display_name,
+                "avatar_url": member.avatar_url,
+                "role": member.role.value,
+                "joined_at": member.joined_at.isoformat(),
+            }
+            for member in members
+        ],
+    }
+
+
+def encode_json(content: Any) -> bytes:
+    """FastAPIのJSONResponseと同じ形式でエンコード"""
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_message_rows(rows: Iterable[MessageRow]) -> bytes:
+    """メッセージ行のリストをJSON配列のバイト列にする"""
+    return encode_json([message_row_fields(row) for row in rows])
@@ -2,17 +2,31 @@
 REST API router for chat functionality
 """
 
+import hashlib
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.auth.dependencies import get_current_user
+from backend.cache import cache_stats
 from backend.chat.chat_service import ChatService
+from backend.chat.export_service import NDJSON_MEDIA_TYPE, ExportService, gzip_stream
+from backend.chat.read_models import (
+    encode_json,
+    encode_message_rows,
+    message_row_fields,
+    room_detail_fields,
+    room_summary_fields,
+    thread_reply_fields,
+)
+from backend.chat.search_service import SearchService
 from backend.chat.websocket_manager import connection_manager
-from backend.models.base import get_db
-from backend.models.message import MessageType
+from backend.models.base import AsyncReadSessionLocal, get_db, get_read_db
+from backend.models.chat_room import RoleType
 from backend.models.user import User
 
 router = APIRouter(prefix="/api/v1", tags=["chat"])
@@ -32,6 +46,12 @@ class JoinRoomRequest(BaseModel):
     room_id: int
 
 
+class RetentionRequest(BaseModel):
+    """メッセージ保持期間の設定リクエスト"""
+
+    retention_days: Optional[int] = Field(None, ge=1)
+
+
 class RoomResponse(BaseModel):
     """ルームレスポンス"""
 
@@ -54,16 +74,82 @@ class MessageResponse(BaseModel):
     parent_id: Optional[int]
     has_latex: bool
     has_code: bool
+    segments: List[List[Optional[str]]]
+    reply_count: int = 0
+    last_reply_at: Optional[str] = None
+    created_at: str
+
+
+class ThreadReplyResponse(MessageResponse):
+    """スレッド内の返信レスポンス"""
+
+    depth: int
+
+
+class ThreadResponse(BaseModel):
+    """スレッドレスポンス"""
+
+    root: MessageResponse
+    replies: List[ThreadReplyResponse]
+    has_more: bool
+
+
+class SearchResultResponse(BaseModel):
+    """検索結果レスポンス"""
+
+    id: int
+    room_id: int
+    user: dict
+    snippet: str
+    message_type: str
     created_at: str
 
 
+# ETagはユーザーごとの応答に付けるため共有キャッシュには保存させず、毎回検証させる
+_CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match がETagに一致するか（弱い比較）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _conditional(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """ETagを応答に設定し、クライアントの版と一致すれば304を返す"""
+    headers = {"ETag": etag, "Cache-Control": _CONDITIONAL_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @router.get("/rooms", response_model=List[RoomResponse])
 async def get_user_rooms(
-    current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """ユーザーが参加しているルーム一覧を取得"""
+    # 参加ルームの集合とそれぞれの更新カウンタが同じなら一覧も同じ
+    versions = await ChatService.get_user_room_versions(db, current_user.id)
+    digest = hashlib.sha1(repr(versions).encode()).hexdigest()[:20]
+    not_modified = _conditional(request, response, f'W/"rooms-{digest}"')
+    if not_modified:
+        return not_modified
+
     rooms = await ChatService.get_user_rooms(db, current_user.id)
-    return [RoomResponse(**room) for room in rooms]
+    return Response(
+        content=encode_json([room_summary_fields(room) for room in rooms]),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
 
 
 @router.post("/rooms", response_model=RoomResponse)
@@ -125,40 +211,39 @@ async def create_room(
 @router.get("/rooms/{room_id}")
 async def get_room(
     room_id: int,
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """ルーム詳細を取得"""
-    # ルームメンバーシップチェック
+    # ルームメンバーシップチェック（304を返す場合も先に行う）
     if not await ChatService.is_user_in_room(db, current_user.id, room_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
         )
 
-    room = await ChatService.get_room_by_id(db, room_id)
+    version = await ChatService.get_room_version(db, room_id)
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Room not found"
+        )
+    not_modified = _conditional(request, response, f'W/"room-{room_id}-v{version}"')
+    if not_modified:
+        return not_modified
+
+    room = await ChatService.get_room_detail(db, room_id)
     if not room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Room not found"
         )
+    members = await ChatService.get_room_members(db, room_id)
 
-    return {
-        "id": room.id,
-        "name": room.name,
-        "description": room.description,
-        "is_private": room.is_private,
-        "created_at": room.created_at.isoformat(),
-        "members": [
-            {
-                "id": member.user.id,
-                "username": member.user.username,
-                "display_name": member.user.display_name,
-                "avatar_url": member.user.avatar_url,
-                "role": member.role.value,
-                "joined_at": member.joined_at.isoformat(),
-            }
-            for member in room.members
-        ],
-    }
+    return Response(
+        content=encode_json(room_detail_fields(room, members)),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
 
 
 @router.post("/rooms/{room_id}/join")
@@ -169,7 +254,7 @@ async def join_room(
 ):
     """ルームに参加"""
     # ルームの存在確認
-    room = await ChatService.get_room_by_id(db, room_id)
+    room = await ChatService.get_room_info(db, room_id)
     if not room:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Room not found"
@@ -209,13 +294,38 @@ async def leave_room(
     return {"message": "Successfully left room"}
 
 
+@router.put("/rooms/{room_id}/retention")
+async def set_room_retention(
+    room_id: int,
+    request: RetentionRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """ルームのメッセージ保持期間を設定（管理者のみ）"""
+    role = await ChatService.get_member_role(db, current_user.id, room_id)
+    if role is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
+        )
+    if role != RoleType.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Only room admins can change retention"
+        )
+
+    await ChatService.set_room_retention(db, room_id, request.retention_days)
+
+    return {"room_id": room_id, "retention_days": request.retention_days}
+
+
 @router.get("/rooms/{room_id}/messages", response_model=List[MessageResponse])
 async def get_room_messages(
     room_id: int,
+    request: Request,
+    response: Response,
     limit: int = Query(50, ge=1, le=100),
     before_id: Optional[int] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """ルームのメッセージ履歴を取得"""
     # ルームメンバーシップチェック
@@ -224,27 +334,110 @@ async def get_room_messages(
             status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
         )
 
-    messages = await ChatService.get_room_messages(db, room_id, limit, before_id)
-
-    return [
-        MessageResponse(
-            id=message.id,
-            content=message.content,
-            message_type=message.message_type.value,
-            user={
-                "id": message.user.id,
-                "username": message.user.username,
-                "display_name": message.user.display_name,
-                "avatar_url": message.user.avatar_url,
-            },
-            room_id=message.room_id,
-            parent_id=message.parent_id,
-            has_latex=message.has_latex,
-            has_code=message.has_code,
-            created_at=message.created_at.isoformat(),
+    # 最新ページ（ポーリング対象）のみ条件付きGETに対応する
+    if before_id is None:
+        version = await ChatService.get_room_version(db, room_id)
+        etag = f'W/"messages-{room_id}-v{version}-l{limit}"'
+        not_modified = _conditional(request, response, etag)
+        if not_modified:
+            return not_modified
+
+    rows = await ChatService.get_room_message_rows(db, room_id, limit, before_id)
+
+    # 列の射影から直接JSONにする（response_modelによる再検証を通さない。スキーマは同じ）
+    return Response(
+        content=encode_message_rows(rows),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
+
+
+@router.get("/rooms/{room_id}/export")
+async def export_room_messages(
+    room_id: int,
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    gzip: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """ルームのメッセージ履歴をNDJSONでストリーミング出力"""
+    # ルームメンバーシップチェック
+    if not await ChatService.is_user_in_room(db, current_user.id, room_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
+        )
+
+    body = ExportService.iter_room_ndjson(AsyncReadSessionLocal, room_id, since, until)
+    filename = f"room-{room_id}.ndjson"
+    media_type = NDJSON_MEDIA_TYPE
+    if gzip:
+        body = gzip_stream(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/messages/{message_id}/thread", response_model=ThreadResponse)
+async def get_message_thread(
+    message_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    after_id: Optional[int] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """メッセージを起点とするスレッド（返信ツリー）を取得"""
+    root = await ChatService.get_message_row(db, message_id)
+    if not root:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Message not found"
+        )
+
+    # ルームメンバーシップチェック
+    if not await ChatService.is_user_in_room(db, current_user.id, root.room_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
+        )
+
+    replies, has_more = await ChatService.get_thread_replies(db, message_id, limit, after_id)
+
+    return Response(
+        content=encode_json(
+            {
+                "root": message_row_fields(root),
+                "replies": [thread_reply_fields(reply, depth) for reply, depth in replies],
+                "has_more": has_more,
+            }
+        ),
+        media_type="application/json",
+    )
+
+
+@router.get("/search/messages", response_model=List[SearchResultResponse])
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    room_id: Optional[int] = Query(None),
+    limit: int = Query(20, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """参加しているルームのメッセージを全文検索"""
+    if room_id is not None and not await ChatService.is_user_in_room(
+        db, current_user.id, room_id
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this room"
         )
-        for message in messages
-    ]
+
+    results = await SearchService.search_messages(
+        db, current_user.id, q, room_id=room_id, limit=limit
+    )
+    return [SearchResultResponse(**result) for result in results]
 
 
 @router.get("/stats")
@@ -256,4 +449,5 @@ async def get_chat_stats(current_user: User = Depends(get_current_user)):
         "active_connections": connection_manager.get_connection_count(),
         "active_rooms": connection_manager.get_room_count(),
         "user_id": current_user.id,
+        "caches": cache_stats(),
     }
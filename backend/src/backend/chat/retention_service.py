@@ -0,0 +1,512 @@
+"""
+Message retention and purge jobs
+
+保持期間を過ぎたメッセージや無効化されたユーザーのデータを削除する。
+SQLiteのライターロックを長時間握らないよう、IDのキーセット順に小さなバッチで
+削除してバッチごとにコミットし、バッチ間で待機して他の書き込みを通す。
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import ColumnElement, and_, case, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from backend.chat.archive_service import ArchiveService, cold_watermark_cache, decode_segment
+from backend.chat.chat_service import ChatService, room_members_cache
+from backend.config import settings
+from backend.models.chat_room import ChatRoom, RoomMember
+from backend.models.message import Message
+from backend.models.message_archive import MessageArchiveSegment
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# IN句に並べるIDの上限
+_ID_CHUNK_SIZE = 500
+
+
+@dataclass
+class PurgeReport:
+    """削除処理の結果"""
+
+    deleted: int = 0
+    batches: int = 0
+    archive_segments: int = 0
+    total_lock_seconds: float = 0.0
+    max_lock_seconds: float = 0.0
+
+    def add_batch(self, deleted: int, lock_seconds: float) -> None:
+        self.deleted += deleted
+        self.batches += 1
+        self.total_lock_seconds += lock_seconds
+        self.max_lock_seconds = max(self.max_lock_seconds, lock_seconds)
+
+    def merge(self, other: "PurgeReport") -> None:
+        self.deleted += other.deleted
+        self.batches += other.batches
+        self.archive_segments += other.archive_segments
+        self.total_lock_seconds += other.total_lock_seconds
+        self.max_lock_seconds = max(self.max_lock_seconds, other.max_lock_seconds)
+
+
+def _expired(row: Dict[str, Any], cutoff: datetime) -> bool:
+    """アーカイブの行がcutoffより古いか（タイムゾーンなしはUTCとみなす）"""
+    created_at = row["created_at"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    if cutoff.tzinfo is None:
+        cutoff = cutoff.replace(tzinfo=timezone.utc)
+    return bool(created_at < cutoff)
+
+
+class RetentionService:
+    """保持期間に基づくメッセージ削除と無効ユーザーのデータ削除"""
+
+    @staticmethod
+    async def delete_messages_batch(db: AsyncSession, ids: Sequence[int]) -> float:
+        """メッセージをまとめて削除し、書き込みトランザクションの所要秒数を返す
+
+        - 削除対象への返信で残るものは parent_id を NULL にしてスレッドから切り離す
+        - 残る親メッセージの返信数・最終返信日時を数え直す
+        """
+        started = time.perf_counter()
+
+        parent_ids = (
+            await db.execute(
+                select(Message.parent_id)
+                .where(
+                    Message.id.in_(ids),
+                    Message.parent_id.is_not(None),
+                    Message.parent_id.not_in(ids),
+                )
+                .distinct()
+            )
+        ).scalars().all()
+
+        await ChatService.bump_room_versions(
+            db, select(Message.room_id).where(Message.id.in_(ids)).distinct()
+        )
+        await db.execute(
+            update(Message)
+            .where(Message.parent_id.in_(ids), Message.id.not_in(ids))
+            .values(parent_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(
+            delete(Message).where(Message.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+
+        if parent_ids:
+            reply = aliased(Message)
+            await db.execute(
+                update(Message)
+                .where(Message.id.in_(parent_ids))
+                .values(
+                    reply_count=select(func.count(reply.id))
+                    .where(reply.parent_id == Message.id)
+                    .scalar_subquery(),
+                    last_reply_at=select(func.max(reply.created_at))
+                    .where(reply.parent_id == Message.id)
+                    .scalar_subquery(),
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+        await db.commit()
+        return time.perf_counter() - started
+
+    @staticmethod
+    async def _purge_where(
+        db: AsyncSession,
+        condition: ColumnElement[bool],
+        label: str,
+        batch_size: int,
+        pause_seconds: float,
+    ) -> PurgeReport:
+        """条件に合うメッセージをIDの昇順にバッチ削除"""
+        report = PurgeReport()
+        last_id = 0
+        while True:
+            ids = (
+                await db.execute(
+                    select(Message.id)
+                    .where(condition, Message.id > last_id)
+                    .order_by(Message.id)
+                    .limit(batch_size)
+                )
+            ).scalars().all()
+            # 読み取りのトランザクションもここで閉じる
+            await db.commit()
+            if not ids:
+                break
+
+            lock_seconds = await RetentionService.delete_messages_batch(db, ids)
+            report.add_batch(len(ids), lock_seconds)
+            last_id = ids[-1]
+            logger.info(
+                f"Purged {report.deleted} messages ({label}), "
+                f"batch lock {lock_seconds * 1000:.1f}ms"
+            )
+
+            if len(ids) < batch_size:
+                break
+            if pause_seconds > 0:
+                await asyncio.sleep(pause_seconds)
+
+        return report
+
+    @staticmethod
+    async def purge_room(
+        db: AsyncSession,
+        room_id: int,
+        cutoff: datetime,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+    ) -> PurgeReport:
+        """ルームのcutoffより古いメッセージ（アーカイブ済みを含む）を削除"""
+        batch_size = batch_size or settings.retention_batch_size
+        if pause_seconds is None:
+            pause_seconds = settings.retention_batch_pause_seconds
+
+        report = await RetentionService._purge_where(
+            db,
+            and_(Message.room_id == room_id, Message.created_at < cutoff),
+            f"room {room_id}",
+            batch_size,
+            pause_seconds,
+        )
+
+        report.merge(
+            await RetentionService._purge_room_archive(db, room_id, cutoff, pause_seconds)
+        )
+        return report
+
+    @staticmethod
+    async def _purge_room_archive(
+        db: AsyncSession, room_id: int, cutoff: datetime, pause_seconds: float
+    ) -> PurgeReport:
+        """ルームのアーカイブからcutoffより古いメッセージを取り除く
+
+        cutoffより古いメッセージを含むセグメントを1つずつ書き換えてコミットする
+        （全体が期限切れのセグメントは削除）。削除したメッセージ（ホットで削除した
+        返信元を含む）を参照する残りの返信は parent_id を NULL にする。
+        返信は返信元より新しいため、残る返信元の reply_count は変わらない。
+        """
+        segment_ids = list(
+            (
+                await db.execute(
+                    select(MessageArchiveSegment.id)
+                    .where(
+                        MessageArchiveSegment.room_id == room_id,
+                        MessageArchiveSegment.min_created_at < cutoff,
+                    )
+                    .order_by(MessageArchiveSegment.id)
+                )
+            ).scalars()
+        )
+        await db.commit()
+
+        report = PurgeReport()
+        removed: Set[int] = set()
+        for segment_id in segment_ids:
+            segment = await db.get(MessageArchiveSegment, segment_id)
+            if segment is None:
+                continue
+            started = time.perf_counter()
+            rows = decode_segment(segment)
+            kept = [row for row in rows if not _expired(row, cutoff)]
+            removed.update(row["id"] for row in rows if _expired(row, cutoff))
+            await ArchiveService.replace_segment_rows(db, segment, kept)
+            await ChatService.bump_room_versions(db, [room_id])
+            await db.commit()
+            cold_watermark_cache.invalidate(room_id)
+            report.add_batch(len(rows) - len(kept), time.perf_counter() - started)
+            report.archive_segments += 1
+            if pause_seconds > 0:
+                await asyncio.sleep(pause_seconds)
+
+        if removed:
+            await RetentionService._detach_replies(db, room_id, removed, pause_seconds)
+        return report
+
+    @staticmethod
+    async def _detach_replies(
+        db: AsyncSession, room_id: int, removed: Set[int], pause_seconds: float
+    ) -> None:
+        """削除したアーカイブ済みメッセージ（とホットで削除済みの返信元）への返信を切り離す"""
+        removed_ids = sorted(removed)
+        for start in range(0, len(removed_ids), _ID_CHUNK_SIZE):
+            await db.execute(
+                update(Message)
+                .where(
+                    Message.room_id == room_id,
+                    Message.parent_id.in_(removed_ids[start:start + _ID_CHUNK_SIZE]),
+                )
+                .values(parent_id=None)
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+
+        segments = list(
+            (
+                await db.execute(
+                    select(MessageArchiveSegment.id).where(MessageArchiveSegment.room_id == room_id)
+                )
+            ).scalars()
+        )
+        await db.commit()
+
+        # 返信元が残っているか（アーカイブ・ホットのどちらか）を確かめてから書き換える
+        archived: Set[int] = set()
+        parents: Set[int] = set()
+        for segment_id in segments:
+            segment = await db.get(MessageArchiveSegment, segment_id)
+            if segment is None:
+                continue
+            for row in decode_segment(segment):
+                archived.add(row["id"])
+                if row["parent_id"] is not None:
+                    parents.add(row["parent_id"])
+            db.expunge(segment)
+        missing = sorted(parents - archived)
+        for start in range(0, len(missing), _ID_CHUNK_SIZE):
+            chunk = missing[start:start + _ID_CHUNK_SIZE]
+            hot = (await db.execute(select(Message.id).where(Message.id.in_(chunk)))).scalars()
+            removed.update(set(chunk) - set(hot))
+        await db.commit()
+
+        for segment_id in segments:
+            segment = await db.get(MessageArchiveSegment, segment_id)
+            if segment is None:
+                continue
+            rows = decode_segment(segment)
+            orphans = [row for row in rows if row["parent_id"] in removed]
+            if not orphans:
+                db.expunge(segment)
+                continue
+            for row in orphans:
+                row["parent_id"] = None
+            await ArchiveService.replace_segment_rows(db, segment, rows)
+            await db.commit()
+            if pause_seconds > 0:
+                await asyncio.sleep(pause_seconds)
+
+    @staticmethod
+    async def get_room_policies(db: AsyncSession) -> List[Tuple[int, int]]:
+        """保持期間が設定されたルームと日数の一覧（既定値を含む）"""
+        default_days = settings.retention_default_days
+        condition = ChatRoom.retention_days.is_not(None)
+        if default_days:
+            condition = or_(condition, ChatRoom.retention_days.is_(None))
+
+        rows = (await db.execute(select(ChatRoom.id, ChatRoom.retention_days).where(condition))).all()
+        await db.commit()
+        return [(room_id, days or default_days) for room_id, days in rows]
+
+    @staticmethod
+    async def apply_retention(
+        db: AsyncSession,
+        now: Optional[datetime] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+    ) -> PurgeReport:
+        """全ルームに保持期間を適用"""
+        now = now or datetime.now(timezone.utc)
+        report = PurgeReport()
+        for room_id, days in await RetentionService.get_room_policies(db):
+            cutoff = now - timedelta(days=days)
+            report.merge(
+                await RetentionService.purge_room(db, room_id, cutoff, batch_size, pause_seconds)
+            )
+        return report
+
+    @staticmethod
+    async def purge_deactivated_users(
+        db: AsyncSession,
+        older_than: Optional[datetime] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+    ) -> PurgeReport:
+        """無効化されたユーザーのメッセージ（アーカイブ済みを含む）とルームメンバーシップを削除
+
+        ユーザー行はルーム作成者などの参照があるため残し、削除し終えた日時を
+        purged_at に記録する（次回以降は対象にしない）。
+        """
+        batch_size = batch_size or settings.retention_batch_size
+        if pause_seconds is None:
+            pause_seconds = settings.retention_batch_pause_seconds
+        older_than = older_than or datetime.now(timezone.utc) - timedelta(
+            days=settings.purge_deactivated_after_days
+        )
+
+        user_ids = (
+            await db.execute(
+                select(User.id).where(
+                    User.is_active.is_(False),
+                    User.deactivated_at < older_than,
+                    User.purged_at.is_(None),
+                )
+            )
+        ).scalars().all()
+        await db.commit()
+
+        report = PurgeReport()
+        if not user_ids:
+            return report
+
+        # アーカイブ側を先に処理する（ホットの返信元を参照するアーカイブ済みの返信を切り離すため）
+        report.merge(
+            await RetentionService.purge_archived_messages(db, set(user_ids), pause_seconds)
+        )
+        for user_id in user_ids:
+            report.merge(
+                await RetentionService._purge_where(
+                    db, Message.user_id == user_id, f"user {user_id}", batch_size, pause_seconds
+                )
+            )
+            await ChatService.bump_room_versions(
+                db, select(RoomMember.room_id).where(RoomMember.user_id == user_id)
+            )
+            await db.execute(delete(RoomMember).where(RoomMember.user_id == user_id))
+            await db.execute(update(User).where(User.id == user_id).values(purged_at=func.now()))
+            await db.commit()
+            room_members_cache.clear()
+        return report
+
+    @staticmethod
+    async def purge_archived_messages(
+        db: AsyncSession, user_ids: Set[int], pause_seconds: float = 0.0
+    ) -> PurgeReport:
+        """アーカイブ済みのユーザーのメッセージをセグメントから取り除く
+
+        セグメントにはユーザーの索引が無いため全セグメントを2回読む（1回目で削除する
+        メッセージを集め、2回目で該当するセグメントを1つずつ書き換えてコミットする）。
+        削除されるメッセージへの返信は parent_id を NULL にし、残る返信元の
+        reply_count を減らす（ホットのメッセージも同様）。
+        """
+        segment_ids = list(
+            (
+                await db.execute(
+                    select(MessageArchiveSegment.id).order_by(MessageArchiveSegment.id)
+                )
+            ).scalars()
+        )
+        await db.commit()
+
+        removed: Set[int] = set()
+        removed_replies: Dict[int, int] = {}  # 返信元のID -> 削除される返信の数
+        referenced: Set[int] = set()  # 残るアーカイブ済みの返信の返信元
+        for segment_id in segment_ids:
+            segment = await db.get(MessageArchiveSegment, segment_id)
+            for row in decode_segment(segment):
+                parent_id = row["parent_id"]
+                if row["user_id"] in user_ids:
+                    removed.add(row["id"])
+                    if parent_id is not None:
+                        removed_replies[parent_id] = removed_replies.get(parent_id, 0) + 1
+                elif parent_id is not None:
+                    referenced.add(parent_id)
+            db.expunge(segment)
+        await db.commit()
+
+        # ホットに残る返信元のうち、削除されるユーザーのもの（この後ホット側で削除される）
+        hot_parents = sorted(referenced - removed)
+        for start in range(0, len(hot_parents), _ID_CHUNK_SIZE):
+            result = await db.execute(
+                select(Message.id).where(
+                    Message.id.in_(hot_parents[start:start + _ID_CHUNK_SIZE]),
+                    Message.user_id.in_(user_ids),
+                )
+            )
+            removed.update(result.scalars())
+        await db.commit()
+
+        report = PurgeReport()
+        if not removed:
+            return report
+
+        for segment_id in segment_ids:
+            segment = await db.get(MessageArchiveSegment, segment_id)
+            if segment is None:
+                continue
+            rows = decode_segment(segment)
+            kept = []
+            changed = False
+            for row in rows:
+                if row["id"] in removed:
+                    changed = True
+                    continue
+                if row["parent_id"] in removed:
+                    row["parent_id"] = None
+                    changed = True
+                replies = removed_replies.pop(row["id"], 0)
+                if replies:
+                    row["reply_count"] = max((row["reply_count"] or 0) - replies, 0)
+                    changed = True
+                kept.append(row)
+            if not changed:
+                db.expunge(segment)
+                continue
+
+            started = time.perf_counter()
+            room_id = segment.room_id
+            await ArchiveService.replace_segment_rows(db, segment, kept)
+            await ChatService.bump_room_versions(db, [room_id])
+            await db.commit()
+            cold_watermark_cache.invalidate(room_id)
+            report.add_batch(len(rows) - len(kept), time.perf_counter() - started)
+            report.archive_segments += 1
+            if pause_seconds > 0:
+                await asyncio.sleep(pause_seconds)
+
+        # ホットのメッセージ: 削除したアーカイブ済みの返信元を切り離し、返信数を減らす
+        removed_ids = sorted(removed)
+        for start in range(0, len(removed_ids), _ID_CHUNK_SIZE):
+            chunk = removed_ids[start:start + _ID_CHUNK_SIZE]
+            await ChatService.bump_room_versions(
+                db, select(Message.room_id).where(Message.parent_id.in_(chunk)).distinct()
+            )
+            await db.execute(
+                update(Message)
+                .where(Message.parent_id.in_(chunk))
+                .values(parent_id=None)
+                .execution_options(synchronize_session=False)
+            )
+        for parent_id, replies in removed_replies.items():
+            await db.execute(
+                update(Message)
+                .where(Message.id == parent_id)
+                .values(
+                    reply_count=case(
+                        (Message.reply_count > replies, Message.reply_count - replies), else_=0
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+
+        logger.info(
+            f"Purged {report.deleted} archived messages of {len(user_ids)} users "
+            f"from {report.archive_segments} segments"
+        )
+        return report
+
+
+async def run_retention() -> None:
+    """バックグラウンドジョブ: 保持期間の適用と無効ユーザーのデータ削除"""
+    from backend.models.base import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        report = await RetentionService.apply_retention(db)
+        report.merge(await RetentionService.purge_deactivated_users(db))
+    if report.deleted or report.archive_segments:
+        logger.info(
+            f"Retention purged {report.deleted} messages in {report.batches} batches "
+            f"and {report.archive_segments} archive segments "
+            f"(max lock {report.max_lock_seconds * 1000:.1f}ms)"
+        )
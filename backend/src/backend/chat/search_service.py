@@ -0,0 +1,324 @@
+"""
+Full-text message search service
+"""
+import html
+import logging
+from typing import Any, Callable, Dict, List, Optional, cast
+
+from sqlalchemy import CursorResult, and_, desc, func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models.chat_room import RoomMember
+from backend.models.message import Message
+from backend.models.search import (
+    CREATE_FTS_REINDEX_TABLE,
+    CREATE_FTS_REINDEX_TRIGGERS,
+    CREATE_FTS_TABLE,
+    CREATE_FTS_TRIGGERS,
+    CREATE_TRGM_EXTENSION,
+    CREATE_TRGM_INDEX,
+    DROP_FTS_REINDEX_TABLE,
+    DROP_FTS_TRIGGERS,
+    MESSAGES_FTS_REINDEX_TABLE,
+    MESSAGES_FTS_TABLE,
+    MESSAGES_TRGM_INDEX,
+    messages_fts,
+)
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# trigramトークナイザは3文字未満の語をインデックスで引けない
+MIN_INDEXED_TERM_LENGTH = 3
+
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 32
+
+# ハイライト位置の目印（本文をHTMLエスケープした後で<mark>タグに置き換える）
+# 私用領域の文字を使い、保存時に本文から取り除く（strip_highlight_markers）
+_MARK_OPEN = "\ue000"
+_MARK_CLOSE = "\ue001"
+
+
+def _escape_like(term: str) -> str:
+    """LIKE用のワイルドカードをエスケープ"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_match_query(terms: List[str]) -> str:
+    """検索語をFTS5のMATCH式に変換（各語をフレーズとして扱いAND結合）"""
+    return " AND ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def strip_highlight_markers(content: str) -> str:
+    """本文からハイライトの目印に使う文字を取り除く"""
+    if _MARK_OPEN in content or _MARK_CLOSE in content:
+        return content.replace(_MARK_OPEN, "").replace(_MARK_CLOSE, "")
+    return content
+
+
+def render_snippet(marked: str) -> str:
+    """目印付きのスニペットをHTMLエスケープし、目印を<mark>タグに置き換える"""
+    return (
+        html.escape(marked)
+        .replace(_MARK_OPEN, HIGHLIGHT_OPEN)
+        .replace(_MARK_CLOSE, HIGHLIGHT_CLOSE)
+    )
+
+
+def make_snippet(content: str, terms: List[str], width: int = 64) -> str:
+    """インデックスを使わない検索結果用のハイライト付きスニペット（HTMLエスケープ済み）を作成"""
+    content = strip_highlight_markers(content)
+    lowered = content.lower()
+    position = min(
+        (lowered.find(term.lower()) for term in terms if term.lower() in lowered),
+        default=0,
+    )
+    start = max(position - width // 2, 0)
+    end = min(start + width, len(content))
+    fragment = content[start:end]
+
+    for term in terms:
+        lowered_fragment = fragment.lower()
+        index = lowered_fragment.find(term.lower())
+        if index >= 0:
+            fragment = (
+                fragment[:index]
+                + _MARK_OPEN
+                + fragment[index:index + len(term)]
+                + _MARK_CLOSE
+                + fragment[index + len(term):]
+            )
+
+    prefix = SNIPPET_ELLIPSIS if start > 0 else ""
+    suffix = SNIPPET_ELLIPSIS if end < len(content) else ""
+    return prefix + render_snippet(fragment) + suffix
+
+
+# 検索結果に必要な列のみを読む（ORMのエンティティは作らない）
+_RESULT_COLUMNS = (
+    Message.id,
+    Message.room_id,
+    Message.content,
+    Message.message_type,
+    Message.created_at,
+    Message.user_id,
+    User.username,
+    User.display_name,
+    User.avatar_url,
+)
+
+
+class SearchService:
+    """メッセージ全文検索のビジネスロジック"""
+
+    @staticmethod
+    async def search_messages(
+        db: AsyncSession,
+        user_id: int,
+        query: str,
+        room_id: Optional[int] = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        """ユーザーが参加しているルームのメッセージを検索"""
+        terms = query.split()
+        if not terms:
+            return []
+
+        dialect = db.get_bind().dialect.name
+        indexed_terms = [t for t in terms if len(t) >= MIN_INDEXED_TERM_LENGTH]
+        use_fts = bool(indexed_terms) and dialect == "sqlite"
+        # FTS5で引けない語は部分一致で絞り込む（PostgreSQLはpg_trgmインデックスが効く）
+        like_terms = [t for t in terms if len(t) < MIN_INDEXED_TERM_LENGTH] if use_fts else terms
+
+        if use_fts:
+            fts_ref = literal_column(MESSAGES_FTS_TABLE)
+            rank = func.bm25(fts_ref).label("rank")
+            snippet = func.snippet(
+                fts_ref, 0, _MARK_OPEN, _MARK_CLOSE, SNIPPET_ELLIPSIS, SNIPPET_TOKENS
+            ).label("snippet")
+            stmt = (
+                select(*_RESULT_COLUMNS, snippet, rank)
+                .select_from(messages_fts)
+                .join(Message, Message.id == messages_fts.c.rowid)
+                .where(fts_ref.op("MATCH")(build_match_query(indexed_terms)))
+                .order_by(rank)
+            )
+        elif dialect == "postgresql":
+            stmt = select(*_RESULT_COLUMNS).order_by(
+                desc(func.word_similarity(query, Message.content)), desc(Message.id)
+            )
+        else:
+            # 短い語のみの場合はルームで絞り込んだ上で部分一致検索
+            stmt = select(*_RESULT_COLUMNS).order_by(desc(Message.id))
+
+        stmt = (
+            stmt.join(User, User.id == Message.user_id)
+            .join(
+                RoomMember,
+                and_(
+                    RoomMember.room_id == Message.room_id,
+                    RoomMember.user_id == user_id,
+                ),
+            )
+            .limit(limit)
+        )
+
+        for term in like_terms:
+            stmt = stmt.where(Message.content.ilike(f"%{_escape_like(term)}%", escape="\\"))
+
+        if room_id is not None:
+            stmt = stmt.where(Message.room_id == room_id)
+
+        result = await db.execute(stmt)
+
+        results = []
+        for row in result:
+            results.append(
+                {
+                    "id": row.id,
+                    "room_id": row.room_id,
+                    "user": {
+                        "id": row.user_id,
+                        "username": row.username,
+                        "display_name": row.display_name,
+                        "avatar_url": row.avatar_url,
+                    },
+                    "snippet": (
+                        render_snippet(row.snippet) if use_fts else make_snippet(row.content, terms)
+                    ),
+                    "message_type": row.message_type.value,
+                    "created_at": row.created_at.isoformat(),
+                }
+            )
+
+        return results
+
+    @staticmethod
+    async def ensure_index(db: AsyncSession) -> None:
+        """検索インデックス（SQLiteはFTSテーブルと同期トリガー）が無ければ作成"""
+        if db.get_bind().dialect.name == "postgresql":
+            await db.execute(text(CREATE_TRGM_EXTENSION))
+            await db.execute(text(CREATE_TRGM_INDEX))
+            await db.commit()
+            return
+
+        await db.execute(text(CREATE_FTS_TABLE))
+        for statement in CREATE_FTS_TRIGGERS:
+            await db.execute(text(statement))
+        await db.commit()
+
+    @staticmethod
+    async def drop_triggers(db: AsyncSession) -> None:
+        """同期トリガーを削除（大量投入時に使用し、後でreindexする）"""
+        for statement in DROP_FTS_TRIGGERS:
+            await db.execute(text(statement))
+        await db.commit()
+
+    @staticmethod
+    async def reindex(
+        db: AsyncSession,
+        batch_size: int = 5000,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """インデックスをバッチ単位で再構築し、登録件数を返す
+
+        SQLiteは 'delete-all' の後、IDのキーセットでバッチごとに登録してコミットする
+        （書き込みロックはバッチ1つ分しか持たない）。再構築中の同期トリガーは
+        登録済みの範囲の行だけを反映し、それより後に書き込まれた行は続くバッチで
+        拾うため、どの行も二重に登録されない。最後のバッチと同じトランザクションで
+        通常のトリガーに戻す。
+        """
+        await SearchService.ensure_index(db)
+
+        if db.get_bind().dialect.name == "postgresql":
+            # GINインデックスは書き込み時に自動更新されるため、断片化の解消のみ行う
+            await db.execute(text(f"REINDEX INDEX {MESSAGES_TRGM_INDEX}"))
+            await db.commit()
+            total = (await db.execute(select(func.count(Message.id)))).scalar() or 0
+            if on_progress:
+                on_progress(total, 0)
+            return total
+
+        for statement in DROP_FTS_TRIGGERS:
+            await db.execute(text(statement))
+        await db.execute(text(DROP_FTS_REINDEX_TABLE))
+        await db.execute(text(CREATE_FTS_REINDEX_TABLE))
+        await db.execute(text(f"INSERT INTO {MESSAGES_FTS_REINDEX_TABLE} VALUES (0)"))
+        for statement in CREATE_FTS_REINDEX_TRIGGERS:
+            await db.execute(text(statement))
+        await db.execute(
+            text(f"INSERT INTO {MESSAGES_FTS_TABLE}({MESSAGES_FTS_TABLE}) VALUES ('delete-all')")
+        )
+        await db.commit()
+
+        last_id = 0
+        indexed = 0
+        while True:
+            # 次のバッチの上限IDをキーセットで求める
+            batch_ids = (
+                select(Message.id)
+                .where(Message.id > last_id)
+                .order_by(Message.id)
+                .limit(batch_size)
+                .subquery()
+            )
+            upper_id = (await db.execute(select(func.max(batch_ids.c.id)))).scalar()
+            if upper_id is None:
+                break
+
+            indexed += await SearchService._index_range(db, last_id, upper_id)
+            await db.execute(
+                text(f"UPDATE {MESSAGES_FTS_REINDEX_TABLE} SET indexed_up_to = :upper_id"),
+                {"upper_id": upper_id},
+            )
+            await db.commit()
+
+            last_id = upper_id
+            logger.info(f"Search index rebuilt up to message {last_id} ({indexed} rows)")
+            if on_progress:
+                on_progress(indexed, last_id)
+
+        # 最後のバッチ以降に書き込まれた行を登録し、同じトランザクションでトリガーを戻す
+        indexed += await SearchService._index_range(db, last_id, None)
+        for statement in DROP_FTS_TRIGGERS:
+            await db.execute(text(statement))
+        for statement in CREATE_FTS_TRIGGERS:
+            await db.execute(text(statement))
+        await db.execute(text(DROP_FTS_REINDEX_TABLE))
+        await db.commit()
+
+        await SearchService._merge_segments(db)
+        logger.info(f"Search index rebuilt ({indexed} messages)")
+        return indexed
+
+    @staticmethod
+    async def _index_range(db: AsyncSession, last_id: int, upper_id: Optional[int]) -> int:
+        """IDが last_id より大きく upper_id 以下（Noneは上限なし）の行を登録する"""
+        statement = (
+            f"INSERT INTO {MESSAGES_FTS_TABLE}(rowid, content) "
+            "SELECT id, content FROM messages WHERE id > :last_id"
+        )
+        params: Dict[str, Any] = {"last_id": last_id}
+        if upper_id is not None:
+            statement += " AND id <= :upper_id"
+            params["upper_id"] = upper_id
+        result = cast(CursorResult[Any], await db.execute(text(statement), params))
+        return result.rowcount or 0
+
+    @staticmethod
+    async def _merge_segments(db: AsyncSession, pages: int = 500) -> None:
+        """バッチ登録で増えたセグメントを少しずつ併合する（1回の書き込みを短く保つ）"""
+        merge = text(
+            f"INSERT INTO {MESSAGES_FTS_TABLE}({MESSAGES_FTS_TABLE}, rank) VALUES ('merge', :pages)"
+        )
+        while True:
+            before = (await db.execute(text("SELECT total_changes()"))).scalar_one()
+            await db.execute(merge, {"pages": pages})
+            after = (await db.execute(text("SELECT total_changes()"))).scalar_one()
+            await db.commit()
+            # 併合する対象が無ければ変更数は2未満になる
+            if after - before < 2:
+                return
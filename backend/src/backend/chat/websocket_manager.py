@@ -2,13 +2,18 @@
 WebSocket connection manager for chat functionality
 """
 
+import asyncio
 import json
 import logging
+import random
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, Iterator, List, Optional, Set
 
 from fastapi import WebSocket, WebSocketDisconnect
 
+from backend.metrics import GaugeFunc, broadcast_duration, broadcast_fanout, ws_connects, ws_errors
 from backend.models.user import User
 
 logger = logging.getLogger(__name__)
@@ -24,10 +29,16 @@ class ConnectionManager:
         self.room_connections: Dict[int, Set[int]] = {}
         # ユーザー情報: {user_id: user_info}
         self.connected_users: Dict[int, Dict[str, Any]] = {}
+        # 終了処理中（新しい接続を受け付けない）
+        self.draining = False
+        # 処理中のメッセージ数と、ドレイン中にそれが0になったことの通知
+        self._in_flight = 0
+        self._idle: Optional[asyncio.Event] = None
 
     async def connect(self, websocket: WebSocket, user: User, room_id: int):
         """WebSocket接続を受け入れる"""
         await websocket.accept()
+        ws_connects.inc()
 
         # 既存の接続があれば切断
         if user.id in self.active_connections:
@@ -104,16 +115,17 @@ class ConnectionManager:
                 if not users:
                     del self.room_connections[room_id]
 
-        # 各ルームに退出通知
-        for room_id in rooms_to_notify:
-            await self.broadcast_to_room(
-                room_id,
-                {
-                    "type": "user_left",
-                    "payload": {"user": user_info, "room_id": room_id},
-                    "timestamp": datetime.utcnow().isoformat(),
-                },
-            )
+        # 各ルームに退出通知（ドレイン中は全員が切断されるため送らない）
+        if not self.draining:
+            for room_id in rooms_to_notify:
+                await self.broadcast_to_room(
+                    room_id,
+                    {
+                        "type": "user_left",
+                        "payload": {"user": user_info, "room_id": room_id},
+                        "timestamp": datetime.utcnow().isoformat(),
+                    },
+                )
 
         # 接続情報を削除
         if user_id in self.active_connections:
@@ -160,6 +172,7 @@ class ConnectionManager:
             await self.disconnect_async(user_id)
             return False
         except Exception as e:
+            ws_errors.inc(stage="send")
             logger.error(f"Error sending message to user {user_id}: {e}")
             await self.disconnect_async(user_id)
             return False
@@ -171,15 +184,18 @@ class ConnectionManager:
         if room_id not in self.room_connections:
             return
 
+        started = time.perf_counter()
         # ユーザーリストのコピーを作成（反復中の変更を避けるため）
         user_ids = list(self.room_connections[room_id])
         disconnected_users = []
+        recipients = 0
 
         for user_id in user_ids:
             if exclude_user and user_id == exclude_user:
                 continue
 
             if user_id in self.active_connections:
+                recipients += 1
                 try:
                     await self.active_connections[user_id].send_text(
                         json.dumps(message)
@@ -187,9 +203,14 @@ class ConnectionManager:
                 except WebSocketDisconnect:
                     disconnected_users.append(user_id)
                 except Exception as e:
+                    ws_errors.inc(stage="send")
                     logger.error(f"Error broadcasting to user {user_id}: {e}")
                     disconnected_users.append(user_id)
 
+        event = message.get("type", "unknown")
+        broadcast_fanout.observe(recipients, event=event)
+        broadcast_duration.observe(time.perf_counter() - started, event=event)
+
         # 切断されたユーザーをクリーンアップ
         for user_id in disconnected_users:
             await self.disconnect_async(user_id)
@@ -210,6 +231,7 @@ class ConnectionManager:
             except WebSocketDisconnect:
                 disconnected_users.append(user_id)
             except Exception as e:
+                ws_errors.inc(stage="send")
                 logger.error(f"Error broadcasting room creation to user {user_id}: {e}")
                 disconnected_users.append(user_id)
 
@@ -229,6 +251,88 @@ class ConnectionManager:
 
         return users
 
+    @contextmanager
+    def track_in_flight(self) -> Iterator[None]:
+        """メッセージの処理中であることを記録する（ドレイン時に完了を待つため）"""
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0 and self._idle is not None:
+                self._idle.set()
+
+    async def _wait_idle(self) -> None:
+        while self._in_flight:
+            self._idle = asyncio.Event()
+            await self._idle.wait()
+
+    async def drain(
+        self,
+        timeout_seconds: float,
+        reconnect_min_seconds: float,
+        reconnect_max_seconds: float,
+    ) -> Dict[str, Any]:
+        """終了前に全接続をドレインする
+
+        1. 新しい接続の受け付けを止める
+        2. 各クライアントにランダムな再接続の遅延（server_restart）を通知する
+           （全員が同時に再接続して認証・履歴取得が集中するのを避けるため）
+        3. 処理中のメッセージ（書き込み）の完了を待つ
+        4. 全接続をコード1012（Service Restart）で閉じる
+
+        全体をtimeout_seconds以内に収める。切断に最後の1割の時間を残し、
+        通知と書き込みの完了待ちがそれまでに終わらなければ待たずに閉じる。
+        """
+        self.draining = True
+        close_by = time.monotonic() + timeout_seconds
+        deadline = close_by - timeout_seconds * 0.1
+        connections = list(self.active_connections.items())
+
+        async def notify(user_id: int, websocket: WebSocket) -> None:
+            delay = random.uniform(reconnect_min_seconds, reconnect_max_seconds)
+            message = {
+                "type": "server_restart",
+                "payload": {"reconnect_after_ms": int(delay * 1000)},
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+            try:
+                await websocket.send_text(json.dumps(message))
+            except Exception as e:
+                logger.debug(f"Could not send restart notice to user {user_id}: {e}")
+
+        notified = await self._within(
+            deadline, asyncio.gather(*(notify(*connection) for connection in connections))
+        )
+        flushed = await self._within(deadline, self._wait_idle())
+
+        async def close(user_id: int, websocket: WebSocket) -> None:
+            try:
+                await websocket.close(code=1012, reason="Server restarting")
+            except Exception as e:
+                logger.debug(f"Error closing connection for user {user_id}: {e}")
+
+        await self._within(
+            close_by, asyncio.gather(*(close(*connection) for connection in connections))
+        )
+        summary = {
+            "connections": len(connections),
+            "notified": notified,
+            "flushed": flushed,
+            "in_flight": self._in_flight,
+        }
+        logger.info(f"Drained WebSocket connections: {summary}")
+        return summary
+
+    @staticmethod
+    async def _within(deadline: float, awaitable: Any) -> bool:
+        """期限までに完了すればTrue（超えた場合はキャンセルしてFalse）"""
+        try:
+            await asyncio.wait_for(awaitable, timeout=max(0.0, deadline - time.monotonic()))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
     def get_connection_count(self) -> int:
         """アクティブな接続数を取得"""
         return len(self.active_connections)
@@ -240,3 +344,14 @@ class ConnectionManager:
 
 # グローバルな接続マネージャーインスタンス
 connection_manager = ConnectionManager()
+
+GaugeFunc(
+    "lunir_websocket_active_connections",
+    "Open chat WebSocket connections",
+    lambda: {(): connection_manager.get_connection_count()},
+)
+GaugeFunc(
+    "lunir_websocket_active_rooms",
+    "Rooms with at least one connected user",
+    lambda: {(): connection_manager.get_room_count()},
+)
@@ -4,25 +4,37 @@ WebSocket router for chat functionality
 
 import json
 import logging
+import time
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, ContextManager, Dict, Optional
 
 from fastapi import APIRouter, Depends, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.auth.jwt_utils import JWTManager
 from backend.auth.user_service import UserService
+from backend.call.signaling import CALL_MESSAGE_TYPES, handle_call_message, leave_call
 from backend.chat.chat_service import ChatService
 from backend.chat.websocket_manager import connection_manager
 from backend.config import settings
-from backend.models.base import get_db
+from backend.metrics import message_latency, ws_disconnects, ws_errors
+from backend.models.base import get_db, get_read_db
 from backend.models.message import MessageType
 from backend.models.user import User
+from backend.profiling import profile_queries
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
+def _profile_message(message_data: Dict[str, Any]) -> ContextManager[Any]:
+    """クエリプロファイラが有効ならメッセージ単位でSQLを集計する"""
+    if not settings.query_profiling_enabled:
+        return nullcontext()
+    return profile_queries(f"WS {message_data.get('type')}")
+
+
 async def get_websocket_user(
     websocket: WebSocket, token: str, db: AsyncSession
 ) -> Optional[User]:
@@ -32,7 +44,7 @@ async def get_websocket_user(
         if not token_data:
             return None
 
-        user = await UserService.get_user_by_id(db, token_data.user_id)
+        user = await UserService.get_cached_user_by_id(db, token_data.user_id)
         if not user or not user.is_active:
             return None
 
@@ -49,17 +61,29 @@ async def websocket_chat_endpoint(
     token: str = Query(...),
     room_id: int = Query(...),
     db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
 ):
     """チャット用WebSocketエンドポイント"""
-    user = await get_websocket_user(websocket, token, db)
+    if connection_manager.draining:
+        # 終了処理中は認証の前に断る（クライアントは再接続を試みる）
+        await websocket.close(code=1012, reason="Server restarting")
+        ws_disconnects.inc(code=1012)
+        return
+
+    user = await get_websocket_user(websocket, token, read_db)
 
     if not user:
         await websocket.close(code=4001, reason="Authentication failed")
+        ws_disconnects.inc(code=4001)
         return
 
     # ルームメンバーシップチェック
-    if not await ChatService.is_user_in_room(db, user.id, room_id):
+    is_member = await ChatService.is_user_in_room(read_db, user.id, room_id)
+    # 接続中ずっと読み取り接続を保持しないよう解放する
+    await read_db.close()
+    if not is_member:
         await websocket.close(code=4003, reason="Not a member of this room")
+        ws_disconnects.inc(code=4003)
         return
 
     # 接続を確立
@@ -71,37 +95,55 @@ async def websocket_chat_endpoint(
         # メッセージループ
         while True:
             data = await websocket.receive_text()
+            received_at = time.perf_counter()
 
             try:
                 message_data = json.loads(data)
-                await handle_websocket_message(db, user, room_id, message_data)
+                with connection_manager.track_in_flight(), _profile_message(message_data):
+                    await handle_websocket_message(db, user, room_id, message_data, received_at)
 
             except json.JSONDecodeError:
+                ws_errors.inc(stage="invalid_json")
                 logger.warning(f"Invalid JSON from user {user.id}: {data}")
             except Exception as e:
+                ws_errors.inc(stage="handler")
                 logger.error(f"Error handling message from user {user.id}: {e}")
+            finally:
+                # 書き込み接続を次のメッセージまで保持しないよう解放する
+                await db.close()
 
-    except WebSocketDisconnect:
+    except WebSocketDisconnect as e:
+        ws_disconnects.inc(code=e.code)
         logger.info(f"User {user.username} disconnected from room {room_id}")
     except Exception as e:
+        # クローズフレーム無しで切れた扱い（1006）
+        ws_disconnects.inc(code=1006)
+        ws_errors.inc(stage="receive")
         logger.error(f"WebSocket error for user {user.id}: {e}")
     finally:
+        await leave_call(user.id)
         await connection_manager.disconnect_async(user.id)
 
 
 async def handle_websocket_message(
-    db: AsyncSession, user: User, room_id: int, message_data: Dict[str, Any]
+    db: AsyncSession,
+    user: User,
+    room_id: int,
+    message_data: Dict[str, Any],
+    received_at: Optional[float] = None,
 ):
     """WebSocketメッセージを処理"""
     message_type = message_data.get("type")
     payload = message_data.get("payload", {})
 
     if message_type == "send_message":
-        await handle_send_message(db, user, room_id, payload)
+        await handle_send_message(db, user, room_id, payload, received_at)
     elif message_type == "join_room":
         await handle_join_room(db, user, payload)
     elif message_type == "leave_room":
         await handle_leave_room(db, user, payload)
+    elif message_type in CALL_MESSAGE_TYPES:
+        await handle_call_message(db, user, room_id, message_type, payload)
     else:
         await connection_manager.send_personal_message(
             user.id,
@@ -114,9 +156,15 @@ async def handle_websocket_message(
 
 
 async def handle_send_message(
-    db: AsyncSession, user: User, room_id: int, payload: Dict[str, Any]
+    db: AsyncSession,
+    user: User,
+    room_id: int,
+    payload: Dict[str, Any],
+    received_at: Optional[float] = None,
 ):
     """メッセージ送信を処理"""
+    if received_at is None:
+        received_at = time.perf_counter()
     # ルームメンバーシップの再確認
     if not await ChatService.is_user_in_room(db, user.id, room_id):
         await connection_manager.send_personal_message(
@@ -166,6 +214,7 @@ async def handle_send_message(
         message = await ChatService.save_message(
             db, content, user.id, room_id, message_type, parent_id
         )
+        message_latency.observe(time.perf_counter() - received_at, stage="persisted")
 
         # ルーム内の全ユーザーにブロードキャスト
         broadcast_message = {
@@ -184,13 +233,27 @@ async def handle_send_message(
                 "parent_id": message.parent_id,
                 "has_latex": message.has_latex,
                 "has_code": message.has_code,
+                "segments": message.segments,
+                "reply_count": message.reply_count,
+                "last_reply_at": None,
                 "created_at": message.created_at.isoformat(),
             },
             "timestamp": datetime.utcnow().isoformat(),
         }
 
         await connection_manager.broadcast_to_room(room_id, broadcast_message)
+        message_latency.observe(time.perf_counter() - received_at, stage="delivered")
 
+    except ValueError:
+        # 返信先が存在しない、または別ルームのメッセージ
+        await connection_manager.send_personal_message(
+            user.id,
+            {
+                "type": "error",
+                "payload": {"message": "Parent message not found in this room"},
+                "timestamp": datetime.utcnow().isoformat(),
+            },
+        )
     except Exception as e:
         logger.error(f"Error saving message from user {user.id}: {e}")
         await connection_manager.send_personal_message(
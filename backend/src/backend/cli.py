@@ -0,0 +1,212 @@
+"""
+Command line tools for Lunir backend
+
+Usage:
+    python -m backend.cli search-reindex [--batch-size N]
+    python -m backend.cli archive [--older-than-days N] [--batch-size N]
+    python -m backend.cli export-room ROOM_ID [--since ISO] [--until ISO] [--gzip] [--output PATH]
+    python -m backend.cli purge [--room-id N --older-than-days N] [--deactivated-users] [--batch-size N]
+    python -m backend.cli seed [--users N] [--rooms N] [--messages N] [--seed N] [--create-schema]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, List, Optional
+
+from backend.config import settings
+from backend.models.base import AsyncReadSessionLocal, AsyncSessionLocal
+
+if TYPE_CHECKING:
+    from backend.seed import SeedConfig
+
+
+async def _search_reindex(batch_size: int) -> None:
+    """全文検索インデックスを再構築"""
+    from backend.chat.search_service import SearchService
+
+    async with AsyncSessionLocal() as db:
+        total = await SearchService.reindex(db, batch_size=batch_size)
+    print(f"Indexed {total} messages")
+
+
+async def _archive(older_than_days: int, batch_size: int) -> None:
+    """古いメッセージをアーカイブ"""
+    from backend.chat.archive_service import ArchiveService
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    async with AsyncSessionLocal() as db:
+        total = await ArchiveService.archive_older_than(db, cutoff, batch_size)
+    print(f"Archived {total} messages older than {cutoff.isoformat()}")
+
+
+async def _purge(
+    room_id: Optional[int],
+    older_than_days: Optional[int],
+    deactivated_users: bool,
+    batch_size: int,
+    pause_seconds: float,
+) -> None:
+    """保持期間の適用（ルーム指定時はそのルームのみ）と無効ユーザーのデータ削除"""
+    from backend.chat.retention_service import PurgeReport, RetentionService
+
+    report = PurgeReport()
+    async with AsyncSessionLocal() as db:
+        if room_id is not None:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+            report.merge(
+                await RetentionService.purge_room(db, room_id, cutoff, batch_size, pause_seconds)
+            )
+        else:
+            report.merge(
+                await RetentionService.apply_retention(
+                    db, batch_size=batch_size, pause_seconds=pause_seconds
+                )
+            )
+        if deactivated_users:
+            report.merge(
+                await RetentionService.purge_deactivated_users(
+                    db, batch_size=batch_size, pause_seconds=pause_seconds
+                )
+            )
+    print(
+        f"Deleted {report.deleted} messages in {report.batches} batches, "
+        f"{report.archive_segments} archive segments "
+        f"(lock total {report.total_lock_seconds:.3f}s, max {report.max_lock_seconds * 1000:.1f}ms)"
+    )
+
+
+async def _export_room(
+    room_id: int,
+    since: Optional[datetime],
+    until: Optional[datetime],
+    compress: bool,
+    output: Optional[str],
+) -> None:
+    """ルーム履歴をNDJSONでファイル（既定は標準出力）へ書き出す"""
+    from backend.chat.export_service import ExportService, gzip_stream
+
+    chunks = ExportService.iter_room_ndjson(AsyncReadSessionLocal, room_id, since, until)
+    if compress:
+        chunks = gzip_stream(chunks)
+
+    stream = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        async for chunk in chunks:
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+        else:
+            stream.flush()
+
+
+async def _seed(config: "SeedConfig", batch_size: int, create_schema: bool) -> None:
+    """合成データセットを生成して一括投入"""
+    from backend.models import Base
+    from backend.models.base import get_engines
+    from backend.seed import seed_database
+
+    writer, _ = get_engines()
+    if create_schema:
+        async with writer.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    report = await seed_database(writer, config, batch_size)
+    print(json.dumps(report, indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """コマンドライン引数パーサーを作成"""
+    parser = argparse.ArgumentParser(prog="lunir", description="Lunir backend tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reindex = subparsers.add_parser(
+        "search-reindex", help="メッセージ全文検索インデックスをバッチ単位で再構築"
+    )
+    reindex.add_argument("--batch-size", type=int, default=5000)
+
+    archive = subparsers.add_parser(
+        "archive", help="古いメッセージをルーム・月単位の圧縮セグメントへ移動"
+    )
+    archive.add_argument("--older-than-days", type=int, default=settings.archive_after_days)
+    archive.add_argument("--batch-size", type=int, default=settings.archive_batch_size)
+
+    purge = subparsers.add_parser(
+        "purge", help="保持期間を過ぎたメッセージを小さなバッチで削除"
+    )
+    purge.add_argument("--room-id", type=int, default=None, help="指定ルームのみ対象（--older-than-days必須）")
+    purge.add_argument("--older-than-days", type=int, default=None)
+    purge.add_argument("--deactivated-users", action="store_true", help="無効化ユーザーのデータも削除")
+    purge.add_argument("--batch-size", type=int, default=settings.retention_batch_size)
+    purge.add_argument("--pause", type=float, default=settings.retention_batch_pause_seconds)
+
+    export = subparsers.add_parser(
+        "export-room", help="ルームのメッセージ履歴をNDJSONで書き出す"
+    )
+    export.add_argument("room_id", type=int)
+    export.add_argument("--since", type=datetime.fromisoformat, default=None)
+    export.add_argument("--until", type=datetime.fromisoformat, default=None)
+    export.add_argument("--gzip", action="store_true", help="gzip圧縮して出力")
+    export.add_argument("--output", "-o", default=None, help="出力先ファイル（既定は標準出力）")
+
+    seed = subparsers.add_parser(
+        "seed", help="性能測定用の合成データセット（ユーザー・ルーム・メッセージ）を一括投入"
+    )
+    seed.add_argument("--users", type=int, default=1000)
+    seed.add_argument("--rooms", type=int, default=100)
+    seed.add_argument("--messages", type=int, default=100_000)
+    seed.add_argument("--days", type=int, default=365, help="メッセージの作成日時を分布させる日数")
+    seed.add_argument("--zipf-exponent", type=float, default=1.1, help="ルーム規模の偏り")
+    seed.add_argument("--reply-ratio", type=float, default=0.15)
+    seed.add_argument("--seed", type=int, default=0, help="乱数シード（同じ値なら同じデータ）")
+    seed.add_argument("--batch-size", type=int, default=10_000)
+    seed.add_argument("--create-schema", action="store_true", help="投入前にテーブルを作成")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """CLIエントリポイント"""
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args(argv)
+
+    if args.command == "search-reindex":
+        asyncio.run(_search_reindex(args.batch_size))
+    elif args.command == "archive":
+        asyncio.run(_archive(args.older_than_days, args.batch_size))
+    elif args.command == "purge":
+        if args.room_id is not None and args.older_than_days is None:
+            build_parser().error("--room-id requires --older-than-days")
+        asyncio.run(
+            _purge(
+                args.room_id,
+                args.older_than_days,
+                args.deactivated_users,
+                args.batch_size,
+                args.pause,
+            )
+        )
+    elif args.command == "export-room":
+        asyncio.run(
+            _export_room(args.room_id, args.since, args.until, args.gzip, args.output)
+        )
+    elif args.command == "seed":
+        from backend.seed import SeedConfig
+
+        config = SeedConfig(
+            users=args.users,
+            rooms=args.rooms,
+            messages=args.messages,
+            days=args.days,
+            zipf_exponent=args.zipf_exponent,
+            reply_ratio=args.reply_ratio,
+            seed=args.seed,
+        )
+        asyncio.run(_seed(config, args.batch_size, args.create_schema))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 Configuration settings for Lunir Backend
 """
 
-from typing import List
+from typing import List, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -17,14 +17,41 @@ class Settings(BaseSettings):
     # Database settings
     database_url: str = "sqlite+aiosqlite:///./lunir.db"
 
+    # SQLite production profile (WAL + pragma調整 + 読み書きエンジン分離)
+    sqlite_production_mode: bool = False
+    sqlite_mmap_size: int = 256 * 1024 * 1024  # bytes
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kib: int = 64 * 1024
+    sqlite_reader_pool_size: int = 8
+
+    # Connection pool settings (PostgreSQL / asyncpg)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_recycle_seconds: int = 1800
+    db_pool_timeout_seconds: int = 30
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100  # asyncpgのprepared statementキャッシュ（pgbouncer経由なら0）
+
     # Security settings
     secret_key: str = "your-secret-key-here"  # 本番環境では環境変数から
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    token_cache_size: int = 10000  # 検証済みトークンのキャッシュ件数
+    token_cache_ttl_seconds: float = 300.0  # キャッシュ期間の上限（トークンのexpは超えない）
 
     # GitHub OAuth settings
     github_client_id: str = ""
     github_client_secret: str = ""
+    # オフラインの負荷試験ではスタブサーバー（benchmarks/github_stub.py）を指す
+    github_oauth_base_url: str = "https://github.com"
+    github_api_base_url: str = "https://api.github.com"
+
+    # GitHub HTTP client settings
+    github_http_timeout_seconds: float = 10.0
+    github_http_connect_timeout_seconds: float = 5.0
+    github_http_max_connections: int = 100
+    github_http_max_keepalive_connections: int = 20
+    github_http_keepalive_expiry_seconds: float = 30.0
 
     # CORS settings
     allowed_origins: List[str] = ["http://localhost:3000", "http://localhost:3001"]
@@ -32,6 +59,56 @@ class Settings(BaseSettings):
     # WebSocket settings
     max_connections: int = 1000
 
+    # Graceful shutdown settings (終了時にWebSocket接続をドレインする)
+    shutdown_drain_enabled: bool = True
+    shutdown_drain_timeout_seconds: float = 10.0  # 通知から切断までの上限
+    reconnect_delay_min_seconds: float = 1.0  # クライアントに通知する再接続の遅延（この範囲で一様に分散）
+    reconnect_delay_max_seconds: float = 15.0
+
+    # Call signaling settings (通話のロスターはメモリ上に持ち、参加者の入退出はまとめて保存する)
+    call_flush_interval_seconds: float = 1.0
+
+    # Timeline feed settings (投稿は閲覧者ごとのフィードに書き込み、閲覧者・投稿の多い投稿者は読み出し時に集める)
+    timeline_fanout_max_audience: int = 1000  # これを超える閲覧者を持つ投稿者の投稿は書き込まない
+    timeline_fanout_max_daily_posts: int = 50  # 直近24時間の投稿がこれ以上の投稿者も同様
+    timeline_pull_author_cache_ttl_seconds: float = 30.0
+
+    # Message content settings
+    content_parse_cache_size: int = 4096  # 本文解析結果のLRUキャッシュ件数
+
+    # Room cache settings (ルーム情報・メンバーIDのプロセス内キャッシュ)
+    room_cache_size: int = 2048
+    room_cache_ttl_seconds: float = 60.0
+
+    # User cache settings (認証時のユーザー取得を省くキャッシュ)
+    user_cache_size: int = 10000
+    user_cache_ttl_seconds: float = 30.0
+
+    # Message archive settings (古いメッセージを圧縮セグメントへ移動)
+    archive_enabled: bool = False
+    archive_after_days: int = 90
+    archive_interval_seconds: int = 3600
+    archive_batch_size: int = 1000
+
+    # Retention settings (保持期間を過ぎたメッセージの削除)
+    retention_enabled: bool = False
+    retention_default_days: Optional[int] = None  # ルームに設定が無い場合の保持日数（Noneは無期限）
+    retention_interval_seconds: int = 3600
+    retention_batch_size: int = 500
+    retention_batch_pause_seconds: float = 0.05  # バッチ間で他の書き込みを通すための待機
+    purge_deactivated_after_days: int = 30
+
+    # History export settings
+    export_batch_size: int = 1000  # サーバーサイドカーソルで一度に取得する行数
+
+    # Metrics settings (Prometheus形式の /metrics とDB・WebSocketの計測)
+    metrics_enabled: bool = True
+
+    # Query profiler settings (リクエスト・WebSocketメッセージごとのSQL集計、開発・調査用)
+    query_profiling_enabled: bool = False
+    query_profiling_slow_ms: float = 100.0  # これ以上かかったクエリをログに出す
+    query_profiling_n_plus_one_threshold: int = 5  # 同じ形のSELECTがこの回数以上でN+1の疑い
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
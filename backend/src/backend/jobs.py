@@ -0,0 +1,51 @@
+"""
+Periodic background jobs run inside the application lifespan
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """一定間隔でコルーチンを実行するバックグラウンドジョブ"""
+
+    def __init__(
+        self,
+        name: str,
+        interval_seconds: float,
+        func: Callable[[], Awaitable[Any]],
+    ):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        """ジョブを開始"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+            logger.info(f"Started background job {self.name} (every {self.interval_seconds}s)")
+
+    async def stop(self) -> None:
+        """ジョブを停止（実行中の処理はキャンセルされる）"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info(f"Stopped background job {self.name}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Background job {self.name} failed")
+            await asyncio.sleep(self.interval_seconds)
@@ -1,19 +1,83 @@
 """
 Lunir FastAPI Backend Application
 """
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, List
 
+from backend.auth.github_oauth import GitHubOAuthService
 from backend.auth.router import router as auth_router
+from backend.call.call_manager import call_manager, run_call_flush
+from backend.call.call_service import run_call_reconciliation
+from backend.call.router import router as call_router
+from backend.chat.archive_service import run_archiver
 from backend.chat.rest_router import router as chat_rest_router
 from backend.chat.websocket_router import router as chat_ws_router
+from backend.config import settings
+from backend.jobs import PeriodicJob
+from backend.metrics import CONTENT_TYPE, render_metrics
+from backend.models.base import dispose_engines, get_engines
+from backend.shutdown import drain_connections, install_drain_on_signal, reset_drain
+from backend.timeline.router import router as timeline_router
+
+logger = logging.getLogger(__name__)
+
+
+def build_background_jobs() -> List[PeriodicJob]:
+    """バックグラウンドジョブを作成（通話の入退出の保存と、設定で有効化されたジョブ）"""
+    jobs = [PeriodicJob("call-participants", settings.call_flush_interval_seconds, run_call_flush)]
+    if settings.archive_enabled:
+        jobs.append(PeriodicJob("message-archiver", settings.archive_interval_seconds, run_archiver))
+    if settings.retention_enabled:
+        from backend.chat.retention_service import run_retention
+
+        jobs.append(
+            PeriodicJob("message-retention", settings.retention_interval_seconds, run_retention)
+        )
+    return jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """アプリケーションの起動・終了処理"""
+    # データベースエンジンはインポート時ではなくここで作成する（ワーカーの起動を速くする）
+    get_engines()
+    # 前回のプロセスが終了処理をせずに止まった場合の通話を終了する
+    await run_call_reconciliation()
+    jobs = build_background_jobs()
+    for job in jobs:
+        job.start()
+    uninstall_drain = None
+    if settings.shutdown_drain_enabled:
+        reset_drain()
+        uninstall_drain = install_drain_on_signal(drain_connections)
+
+    yield
+
+    if uninstall_drain is not None:
+        uninstall_drain()
+        # シグナルを経由しない終了でもドレインする（ドレイン済みなら即座に返る）
+        await drain_connections()
+    for job in jobs:
+        await job.stop()
+    # 残っている通話を終了し、未保存の入退出を書き込む
+    call_manager.end_all()
+    try:
+        await run_call_flush()
+    except Exception:
+        logger.exception("Failed to persist call participants on shutdown")
+    await GitHubOAuthService.close_client()
+    await dispose_engines()
+
 
 app = FastAPI(
     title="Lunir API",
     description="ソフトウェアエンジニア向けチャット・通話アプリケーション",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # CORS設定
@@ -25,10 +89,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.query_profiling_enabled:
+    from backend.profiling import QueryProfilerMiddleware
+
+    app.add_middleware(QueryProfilerMiddleware)
+
 # ルーター追加
 app.include_router(auth_router)
 app.include_router(chat_rest_router)
 app.include_router(chat_ws_router)
+app.include_router(call_router)
+app.include_router(timeline_router)
 
 
 class HealthResponse(BaseModel):
@@ -51,6 +122,14 @@ async def health_check() -> HealthResponse:
     )
 
 
+if settings.metrics_enabled:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics() -> Response:
+        """Prometheus形式のメトリクス"""
+        return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 @app.get("/api/v1/status")
 async def api_status() -> Dict[str, Any]:
     """API状態確認エンドポイント"""
@@ -59,8 +138,8 @@ async def api_status() -> Dict[str, Any]:
         "status": "running",
         "features": {
             "chat": True,
-            "voice_call": False,
-            "timeline": False,
+            "voice_call": True,
+            "timeline": True,
             "latex_support": False,
             "code_highlight": False,
             "github_auth": True
@@ -0,0 +1,319 @@
+"""
+Process-local metrics in the Prometheus text exposition format
+
+本番で常時有効にしておけるよう、記録は定数時間の処理（dictの参照とバケットの
+二分探索）のみで行い、文字列の組み立ては /metrics の取得時にだけ行う。
+ラベルの値はステートメントの種類やクローズコードなど、取りうる値が限られる
+ものだけを使う（メトリクスの系列数が増え続けないようにする）。
+
+asyncioの単一スレッド上で使う前提のため、ロックは取らない。
+"""
+import re
+import time
+import weakref
+from bisect import bisect_left
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+from backend.profiling import install_query_profiler
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 秒単位の既定バケット（1ms〜10s）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# ブロードキャストの宛先数
+FANOUT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+# (サフィックス, ラベル名, ラベル値, 値)
+Sample = Tuple[str, Sequence[str], Sequence[str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """メトリクスの共通部分"""
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        register: bool = True,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # register=False は /metrics に出さない（テストなど）
+        if register:
+            _registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Sample]:
+        """(サフィックス, ラベル名, ラベル値, 値) の列"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ（サンプル名には _total が付く）"""
+
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        register: bool = True,
+    ):
+        super().__init__(name, documentation, labelnames, register)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in sorted(self._values.items()):
+            yield "_total", self.labelnames, key, value
+
+
+class Histogram(_Metric):
+    """累積バケット付きのヒストグラム"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        register: bool = True,
+    ):
+        super().__init__(name, documentation, labelnames, register)
+        self.buckets = tuple(sorted(buckets))
+        # ラベル値ごとに [バケットごとの件数..., +Infの件数], 合計, 件数
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        # 値がちょうど上限のバケットにも入る（le = less than or equal）
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def sum(self, **labels: Any) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def samples(self) -> Iterator[Sample]:
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, count
+
+
+class GaugeFunc(_Metric):
+    """取得時にコールバックで値を読むゲージ（ラベル値 -> 値のdictを返す）"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        read: Callable[[], Dict[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._read = read
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in sorted(self._read().items()):
+            yield "", self.labelnames, key, value
+
+
+_registry: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """登録済みの全メトリクスをテキスト形式で出力"""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- アプリケーションのメトリクス ---
+
+ws_connects = Counter("lunir_websocket_connects", "Accepted WebSocket connections")
+ws_disconnects = Counter(
+    "lunir_websocket_disconnects",
+    "Closed or rejected WebSocket connections by close code",
+    ["code"],
+)
+ws_errors = Counter(
+    "lunir_websocket_errors",
+    "WebSocket errors by stage (receive, send, handler, invalid_json)",
+    ["stage"],
+)
+message_latency = Histogram(
+    "lunir_message_latency_seconds",
+    "Time from receiving a chat message to it being persisted / sent to the last recipient",
+    ["stage"],
+)
+broadcast_fanout = Histogram(
+    "lunir_broadcast_recipients",
+    "Recipients per room broadcast",
+    ["event"],
+    buckets=FANOUT_BUCKETS,
+)
+broadcast_duration = Histogram(
+    "lunir_broadcast_duration_seconds", "Time to send one room broadcast", ["event"]
+)
+db_query_latency = Histogram(
+    "lunir_db_query_seconds",
+    "Database statement latency by engine, operation and table",
+    ["engine", "operation", "table"],
+)
+db_pool_wait = Histogram(
+    "lunir_db_pool_wait_seconds",
+    "Time to acquire a pooled connection (including opening a new one)",
+    ["engine"],
+)
+
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+_WRITE_PATTERN = re.compile(r"\b(INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+@lru_cache(maxsize=2048)
+def statement_labels(statement: str) -> Tuple[str, str]:
+    """SQL文から (操作, 対象テーブル) のラベルを作る
+
+    テーブルは括弧の外（サブクエリ以外）で最初に現れる FROM / INTO / UPDATE の対象。
+    コンパイル済みのSQL文字列は再利用されるため結果をキャッシュする。
+    """
+    head = statement.lstrip()
+    operation = head.split(None, 1)[0].upper() if head else "UNKNOWN"
+    if operation == "WITH":
+        match = _WRITE_PATTERN.search(statement)
+        operation = match.group(1).upper() if match else "SELECT"
+
+    table = "-"
+    for match in _TABLE_PATTERN.finditer(statement):
+        prefix = statement[:match.start()]
+        if prefix.count("(") == prefix.count(")"):
+            table = match.group(1).lower()
+            break
+    return operation, table
+
+
+_instrumented: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+def instrument_engine(engine: Any, name: str) -> None:
+    """エンジンにクエリ時間と接続取得待ちの計測を付ける（AsyncEngineも可）"""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine in _instrumented:
+        return
+    _instrumented.add(sync_engine)
+
+    def _observe(statement: str, seconds: float) -> None:
+        operation, table = statement_labels(statement)
+        db_query_latency.observe(seconds, engine=name, operation=operation, table=table)
+
+    # 文の実行時間はプロファイラと同じイベントで1回だけ測る
+    install_query_profiler(sync_engine, _observe)
+
+    @event.listens_for(sync_engine, "engine_disposed")
+    def _disposed(disposed_engine: "Engine") -> None:
+        # dispose() でプールが作り直されるため計測を付け直す
+        _instrument_pool(disposed_engine.pool, name)
+
+    _instrument_pool(sync_engine.pool, name)
+
+
+def _instrument_pool(pool: Any, name: str) -> None:
+    """Pool.connect() の所要時間を記録する"""
+    connect = pool.connect
+
+    def timed_connect(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return connect(*args, **kwargs)
+        finally:
+            db_pool_wait.observe(time.perf_counter() - started, engine=name)
+
+    pool.connect = timed_connect
+
+
+def instrument_engines(engines: Dict[str, Any]) -> None:
+    """名前付きのエンジン群を計測し、貸し出し中の接続数のゲージを登録する"""
+    for name, engine in engines.items():
+        instrument_engine(engine, name)
+
+    def checked_out() -> Dict[LabelValues, float]:
+        values: Dict[LabelValues, float] = {}
+        for name, engine in engines.items():
+            pool = getattr(engine, "sync_engine", engine).pool
+            if hasattr(pool, "checkedout"):
+                values[(name,)] = pool.checkedout()
+        return values
+
+    GaugeFunc(
+        "lunir_db_pool_checked_out",
+        "Connections currently checked out of the pool",
+        checked_out,
+        ["engine"],
+    )
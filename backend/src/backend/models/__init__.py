@@ -5,7 +5,9 @@ from .base import Base
 from .user import User
 from .chat_room import ChatRoom, RoomMember
 from .message import Message
-from .timeline import TimelinePost
+from .message_archive import MessageArchiveSegment
+from . import search as _search  # noqa: F401  FTSインデックスのDDL登録
+from .timeline import TimelinePost, TimelineFeedEntry, TimelinePullAuthor
 from .call import CallSession, CallParticipant
 
 __all__ = [
@@ -14,7 +16,10 @@ __all__ = [
     "ChatRoom",
     "RoomMember",
     "Message",
+    "MessageArchiveSegment",
     "TimelinePost",
+    "TimelineFeedEntry",
+    "TimelinePullAuthor",
     "CallSession",
     "CallParticipant",
 ]
\ No newline at end of file
@@ -1,40 +1,170 @@
 """
 Database base configuration
 """
-from sqlalchemy import create_engine, Column, Integer, DateTime
-from sqlalchemy.ext.declarative import declarative_base
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event, Column, Integer, DateTime
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base
 from sqlalchemy.sql import func
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 
 from backend.config import settings
 
-# Convert async database URL to sync for migrations
-sync_database_url = settings.database_url.replace("sqlite+aiosqlite://", "sqlite://")
 
-# Async SQLAlchemy setup
-async_engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    future=True
-)
+def is_sqlite_url(database_url: str) -> bool:
+    """SQLiteのURLかどうか"""
+    return make_url(database_url).get_backend_name() == "sqlite"
 
-# Sync SQLAlchemy setup for migrations
-sync_engine = create_engine(
-    sync_database_url,
-    echo=settings.debug,
-)
 
-AsyncSessionLocal = async_sessionmaker(
-    async_engine,
+def is_postgresql_url(database_url: str) -> bool:
+    """PostgreSQLのURLかどうか"""
+    return make_url(database_url).get_backend_name() == "postgresql"
+
+
+def pool_options(database_url: str) -> Dict[str, Any]:
+    """バックエンドに応じた接続プール設定"""
+    if not is_postgresql_url(database_url):
+        return {}
+
+    options: Dict[str, Any] = {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+    if make_url(database_url).get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+        }
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection: Any, read_only: bool) -> None:
+    """SQLite接続に本番用pragmaを適用"""
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        # WALはデータベースファイルに永続化されるため書き込み側で設定すれば良い
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    # 負の値はKiB単位の指定
+    cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def create_engines(database_url: str, sqlite_production: bool = False) -> Tuple[AsyncEngine, AsyncEngine]:
+    """書き込み用と読み取り用のエンジンを作成
+
+    SQLiteの本番モードでは、書き込みを1接続のエンジンに集約し（SQLiteの
+    ライターは常に1つ）、履歴やルーム一覧などの読み取りをWAL上の読み取り専用
+    プールに振り分ける。それ以外は同一のエンジンを返す。
+    """
+    if not (sqlite_production and is_sqlite_url(database_url)):
+        engine = create_async_engine(
+            database_url,
+            echo=settings.debug,
+            future=True,
+            **pool_options(database_url),
+        )
+        return engine, engine
+
+    writer = create_async_engine(
+        database_url,
+        echo=settings.debug,
+        future=True,
+        pool_size=1,
+        max_overflow=0,
+    )
+    reader = create_async_engine(
+        database_url,
+        echo=settings.debug,
+        future=True,
+        pool_size=settings.sqlite_reader_pool_size,
+        max_overflow=0,
+    )
+
+    @event.listens_for(writer.sync_engine, "connect")
+    def _on_writer_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        _apply_sqlite_pragmas(dbapi_connection, read_only=False)
+
+    @event.listens_for(reader.sync_engine, "connect")
+    def _on_reader_connect(dbapi_connection: Any, connection_record: Any) -> None:
+        _apply_sqlite_pragmas(dbapi_connection, read_only=True)
+
+    return writer, reader
+
+
+_engines: Optional[Tuple[AsyncEngine, AsyncEngine]] = None
+
+
+def get_engines() -> Tuple[AsyncEngine, AsyncEngine]:
+    """アプリケーションの書き込み用・読み取り用エンジン（初回の呼び出しで作成する）
+
+    インポート時には作成せず、起動処理（lifespan）か最初のセッション作成時に
+    作成する。ドライバの読み込みと計測の設定もその時に行う。
+    """
+    global _engines
+    if _engines is not None:
+        return _engines
+
+    writer, reader = create_engines(settings.database_url, settings.sqlite_production_mode)
+
+    if settings.metrics_enabled:
+        from backend.metrics import instrument_engines
+
+        if reader is writer:
+            instrument_engines({"primary": writer})
+        else:
+            instrument_engines({"writer": writer, "reader": reader})
+
+    if settings.query_profiling_enabled:
+        from backend.profiling import install_query_profiler
+
+        install_query_profiler(writer)
+        install_query_profiler(reader)
+
+    _engines = writer, reader
+    return _engines
+
+
+async def dispose_engines() -> None:
+    """作成済みのエンジンの接続プールを閉じる（終了時。エンジンはその後も使える）"""
+    if _engines is None:
+        return
+    writer, reader = _engines
+    await writer.dispose()
+    if reader is not writer:
+        await reader.dispose()
+
+
+class LazySessionmaker(async_sessionmaker):
+    """最初のセッション作成時にエンジンを作成してバインドするセッションファクトリ"""
+
+    def __init__(self, engine: Callable[[], AsyncEngine], **kw: Any):
+        super().__init__(**kw)
+        self._engine = engine
+
+    def __call__(self, **local_kw: Any) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            self.configure(bind=self._engine())
+        return super().__call__(**local_kw)
+
+
+AsyncSessionLocal = LazySessionmaker(
+    lambda: get_engines()[0],
     class_=AsyncSession,
     expire_on_commit=False
 )
 
-SyncSessionLocal = sessionmaker(
-    sync_engine,
-    autocommit=False,
-    autoflush=False,
+AsyncReadSessionLocal = LazySessionmaker(
+    lambda: get_engines()[1],
+    class_=AsyncSession,
+    expire_on_commit=False
 )
 
 Base = declarative_base()
@@ -65,4 +195,13 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """読み取り専用のデータベースセッションを取得"""
+    async with AsyncReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -1,7 +1,7 @@
 """
 Chat room and room membership models
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -26,6 +26,10 @@ class ChatRoom(Base, TimestampMixin):
     description = Column(Text, nullable=True)
     is_private = Column(Boolean, default=False, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # メッセージの保持日数（Noneは既定値RETENTION_DEFAULT_DAYSに従う）
+    retention_days = Column(Integer, nullable=True)
+    # メッセージ投稿・参加・退出などで増える更新カウンタ（ETagの検証子）
+    version = Column(Integer, default=0, server_default="0", nullable=False)
     
     # リレーション
     creator = relationship("User", back_populates="created_rooms")
@@ -41,6 +45,11 @@ class RoomMember(Base):
     """ルームメンバーシップモデル"""
     
     __tablename__ = "room_members"
+    __table_args__ = (
+        # ユーザーの参加ルームと、ルームのメンバーの両方向から引く（タイムラインの閲覧者の解決など）
+        Index("ix_room_members_user_id_room_id", "user_id", "room_id"),
+        Index("ix_room_members_room_id_user_id", "room_id", "user_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,7 +1,7 @@
 """
 Message model
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Enum, DateTime, JSON
 from sqlalchemy.orm import relationship
 import enum
 
@@ -26,9 +26,14 @@ class Message(Base, TimestampMixin):
     message_type = Column(Enum(MessageType), default=MessageType.TEXT, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     room_id = Column(Integer, ForeignKey("chat_rooms.id"), nullable=False)
-    parent_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    parent_id = Column(Integer, ForeignKey("messages.id"), nullable=True, index=True)
     has_latex = Column(Boolean, default=False, nullable=False)
     has_code = Column(Boolean, default=False, nullable=False)
+    # 書き込み時に解析した本文セグメント（backend.chat.content_parser参照）
+    segments = Column(JSON, nullable=True)
+    # 直接の返信数と最終返信日時（返信保存時に親メッセージ側で更新）
+    reply_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_reply_at = Column(DateTime(timezone=True), nullable=True)
     
     # リレーション
     user = relationship("User", back_populates="messages")
@@ -0,0 +1,39 @@
+"""
+Message archive segment model (cold storage)
+"""
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, LargeBinary, Index
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class MessageArchiveSegment(Base):
+    """アーカイブ済みメッセージの圧縮セグメント（ルーム・月単位）"""
+    
+    __tablename__ = "message_archive_segments"
+    __table_args__ = (
+        # 履歴の読み出し時にカーソルより古いセグメントを探すためのインデックス
+        Index("ix_message_archive_segments_room_max_id", "room_id", "max_message_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    room_id = Column(Integer, ForeignKey("chat_rooms.id"), nullable=False)
+    period = Column(String(7), nullable=False)  # YYYY-MM
+    min_message_id = Column(Integer, nullable=False)
+    max_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    min_created_at = Column(DateTime(timezone=True), nullable=False)
+    max_created_at = Column(DateTime(timezone=True), nullable=False)
+    codec = Column(String(16), nullable=False, default="zlib-json")
+    payload = Column(LargeBinary, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+    
+    def __repr__(self) -> str:
+        return (
+            f"<MessageArchiveSegment(room_id={self.room_id}, period='{self.period}', "
+            f"messages={self.min_message_id}-{self.max_message_id})>"
+        )
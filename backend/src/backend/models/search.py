@@ -0,0 +1,112 @@
+"""
+Full-text search index for messages
+
+SQLiteではFTS5仮想テーブル、PostgreSQLではpg_trgmのGINインデックスを使用する。
+"""
+from sqlalchemy import DDL, event
+from sqlalchemy.sql import column, table
+
+from .message import Message
+
+# messagesテーブルを外部コンテンツとするFTS5仮想テーブル
+# trigramトークナイザは空白で区切られない日本語やコード中の識別子にも部分一致する
+MESSAGES_FTS_TABLE = "messages_fts"
+
+messages_fts = table(MESSAGES_FTS_TABLE, column("rowid"), column("content"))
+
+CREATE_FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {MESSAGES_FTS_TABLE} USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='trigram')"
+)
+
+# messagesへの書き込みをインデックスへ反映するトリガー
+CREATE_FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO {MESSAGES_FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO {MESSAGES_FTS_TABLE}({MESSAGES_FTS_TABLE}, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO {MESSAGES_FTS_TABLE}({MESSAGES_FTS_TABLE}, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO {MESSAGES_FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+DROP_FTS_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS messages_fts_ai",
+    "DROP TRIGGER IF EXISTS messages_fts_ad",
+    "DROP TRIGGER IF EXISTS messages_fts_au",
+]
+
+DROP_FTS_TABLE = f"DROP TABLE IF EXISTS {MESSAGES_FTS_TABLE}"
+
+# 再構築の進捗（ここまでのIDはインデックスに登録済み）
+MESSAGES_FTS_REINDEX_TABLE = "messages_fts_reindex"
+
+CREATE_FTS_REINDEX_TABLE = (
+    f"CREATE TABLE IF NOT EXISTS {MESSAGES_FTS_REINDEX_TABLE} (indexed_up_to INTEGER NOT NULL)"
+)
+
+DROP_FTS_REINDEX_TABLE = f"DROP TABLE IF EXISTS {MESSAGES_FTS_REINDEX_TABLE}"
+
+# 再構築中の同期トリガー: 登録済みの範囲の行だけを反映し、それより後の行はバッチに任せる
+_REINDEXED = f"(SELECT indexed_up_to FROM {MESSAGES_FTS_REINDEX_TABLE})"
+
+CREATE_FTS_REINDEX_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages
+    WHEN new.id <= {_REINDEXED} BEGIN
+        INSERT INTO {MESSAGES_FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages
+    WHEN old.id <= {_REINDEXED} BEGIN
+        INSERT INTO {MESSAGES_FTS_TABLE}({MESSAGES_FTS_TABLE}, rowid, content)
+        VALUES ('delete', old.id, old.content);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages
+    WHEN old.id <= {_REINDEXED} BEGIN
+        INSERT INTO {MESSAGES_FTS_TABLE}({MESSAGES_FTS_TABLE}, rowid, content)
+        VALUES ('delete', old.id, old.content);
+        INSERT INTO {MESSAGES_FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+# PostgreSQL: ILIKEによる部分一致をトライグラムインデックスで引く
+MESSAGES_TRGM_INDEX = "ix_messages_content_trgm"
+
+CREATE_TRGM_EXTENSION = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+CREATE_TRGM_INDEX = (
+    f"CREATE INDEX IF NOT EXISTS {MESSAGES_TRGM_INDEX} "
+    "ON messages USING gin (content gin_trgm_ops)"
+)
+
+
+# create_all / drop_all でインデックスも作成・削除する
+for _statement in [CREATE_FTS_TABLE, *CREATE_FTS_TRIGGERS]:
+    event.listen(
+        Message.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+    )
+
+event.listen(
+    Message.__table__, "before_drop", DDL(DROP_FTS_TABLE).execute_if(dialect="sqlite")
+)
+
+for _statement in [CREATE_TRGM_EXTENSION, CREATE_TRGM_INDEX]:
+    event.listen(
+        Message.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql")
+    )
@@ -1,8 +1,9 @@
 """
 Timeline post model
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Enum, DateTime, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 import enum
 
 from .base import Base, TimestampMixin
@@ -27,6 +28,12 @@ class TimelinePost(Base, TimestampMixin):
     """タイムライン投稿モデル"""
     
     __tablename__ = "timeline_posts"
+    __table_args__ = (
+        # 投稿者ごとの fanned_out=False の投稿のキーセットページング（fan-out-on-read）と
+        # 直近の投稿数の集計用。fanned_out を id の前に置き、書き込み済みの投稿を読み飛ばさない
+        Index("ix_timeline_posts_user_id_fanned_out_id", "user_id", "fanned_out", "id"),
+        Index("ix_timeline_posts_user_id_created_at", "user_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=True)
@@ -36,6 +43,8 @@ class TimelinePost(Base, TimestampMixin):
     has_latex = Column(Boolean, default=False, nullable=False)
     has_code = Column(Boolean, default=False, nullable=False)
     visibility = Column(Enum(VisibilityType), default=VisibilityType.PUBLIC, nullable=False)
+    # 投稿時に閲覧者のフィードへ書き込んだか（Falseは読み出し時に投稿者から集める）
+    fanned_out = Column(Boolean, default=True, server_default="1", nullable=False)
     
     # リレーション
     user = relationship("User", back_populates="timeline_posts")
@@ -43,4 +52,33 @@ class TimelinePost(Base, TimestampMixin):
     def __repr__(self) -> str:
         title_preview = self.title or "No Title"
         content_preview = self.content[:50] + "..." if len(self.content) > 50 else self.content
-        return f"<TimelinePost(id={self.id}, title='{title_preview}', content='{content_preview}')>"
\ No newline at end of file
+        return f"<TimelinePost(id={self.id}, title='{title_preview}', content='{content_preview}')>"
+
+
+class TimelineFeedEntry(Base):
+    """ユーザーごとのフィード（投稿時に書き込む）"""
+    
+    __tablename__ = "timeline_feed_entries"
+    
+    # (user_id, post_id) の主キーがフィードのキーセットページングのインデックスを兼ねる
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("timeline_posts.id", ondelete="CASCADE"), primary_key=True)
+    
+    def __repr__(self) -> str:
+        return f"<TimelineFeedEntry(user_id={self.user_id}, post_id={self.post_id})>"
+
+
+class TimelinePullAuthor(Base):
+    """フィードに書き込まない投稿（fanned_out=False）を持つ投稿者"""
+    
+    __tablename__ = "timeline_pull_authors"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    since = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+    
+    def __repr__(self) -> str:
+        return f"<TimelinePullAuthor(user_id={self.user_id})>"
@@ -1,7 +1,7 @@
 """
 User model
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
 from sqlalchemy.orm import relationship
 
 from .base import Base, TimestampMixin
@@ -20,6 +20,9 @@ class User(Base, TimestampMixin):
     avatar_url = Column(Text, nullable=True)
     bio = Column(Text, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
+    # 無効化した日時と、データ削除ジョブでメッセージを削除し終えた日時
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
+    purged_at = Column(DateTime(timezone=True), nullable=True)
     
     # リレーション
     room_memberships = relationship("RoomMember", back_populates="user")
@@ -0,0 +1,193 @@
+"""
+SQL query profiler (opt-in)
+
+HTTPリクエスト・WebSocketメッセージ単位で、実行したSQLの件数・合計時間・
+文の形ごとの回数を集計する。集計はコンテキスト変数に置いた QueryProfile に
+エンジンのイベントから記録するため、プロファイル中でなければイベントは
+コンテキスト変数を1回読むだけで終わる。文の実行時間を測るイベントは
+backend.metrics のクエリ時間の計測と共用する。
+
+- 遅いクエリ（QUERY_PROFILING_SLOW_MS 以上）は1件ずつログに出す
+- 同じ形のSELECTが N_PLUS_ONE_THRESHOLD 回以上繰り返されたら N+1 の疑いとしてログに出す
+- テストでは tests.conftest.query_budget でクエリ数の上限を検証する
+"""
+import logging
+import re
+import time
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from backend.config import settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.engine import Connection, Engine, ExceptionContext, ExecutionContext
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryProfile:
+    """1リクエスト（または1メッセージ）分のクエリの集計"""
+
+    label: str
+    count: int = 0
+    total_seconds: float = 0.0
+    shapes: "Counter[str]" = field(default_factory=Counter)
+    slow: List[Tuple[float, str]] = field(default_factory=list)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+        if seconds * 1000 >= settings.query_profiling_slow_ms:
+            self.slow.append((seconds, statement))
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        """threshold回以上繰り返されたSELECTの形（N+1の疑い）"""
+        threshold = threshold or settings.query_profiling_n_plus_one_threshold
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold and shape.startswith(("SELECT", "WITH"))
+        ]
+
+    def summary(self) -> str:
+        lines = [f"{self.label}: {self.count} queries, {self.total_seconds * 1000:.1f}ms"]
+        for shape, count in self.shapes.most_common(5):
+            lines.append(f"  {count}x {shape[:200]}")
+        return "\n".join(lines)
+
+
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+_IN_LIST_PATTERN = re.compile(r"\((?:\s*(?:\?|%s|\$\d+|:\w+)\s*,)+\s*(?:\?|%s|\$\d+|:\w+)\s*\)")
+_NUMBERED_PARAM_PATTERN = re.compile(r"\$\d+")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """パラメータ数の違うIN句などをまとめた、文の形"""
+    shape = _WHITESPACE_PATTERN.sub(" ", statement).strip()
+    shape = _NUMBERED_PARAM_PATTERN.sub("?", shape)
+    return _IN_LIST_PATTERN.sub("(?, ...)", shape)
+
+
+def current_profile() -> Optional[QueryProfile]:
+    """実行中のプロファイル（無ければNone）"""
+    return _current.get()
+
+
+@contextmanager
+def profile_queries(label: str, log: bool = True) -> Iterator[QueryProfile]:
+    """ブロック内で実行されたクエリを集計する（入れ子の場合は外側に合算しない）"""
+    profile = QueryProfile(label)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        if log:
+            log_profile(profile)
+
+
+def log_profile(profile: QueryProfile) -> None:
+    """遅いクエリとN+1の疑いをログに出す"""
+    for seconds, statement in profile.slow:
+        logger.warning(
+            f"Slow query in {profile.label} ({seconds * 1000:.1f}ms): {statement_shape(statement)[:500]}"
+        )
+    for shape, count in profile.repeated():
+        logger.warning(f"Possible N+1 in {profile.label}: {count}x {shape[:500]}")
+    if profile.count:
+        logger.debug(profile.summary())
+
+
+QueryObserver = Callable[[str, float], None]
+
+# エンジンごとの、文の実行時間を受け取る関数（メトリクスなど）
+_observers: "weakref.WeakKeyDictionary[Any, List[QueryObserver]]" = weakref.WeakKeyDictionary()
+
+
+def install_query_profiler(engine: Any, observer: Optional[QueryObserver] = None) -> None:
+    """エンジンに文の実行時間を測るイベントを付ける（AsyncEngineも可）
+
+    イベントは1エンジンにつき1組だけ付け、測った時間を実行中のプロファイルと
+    observer（backend.metrics のヒストグラムなど）に渡す。何度呼んでもよい。
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    observers = _observers.get(sync_engine)
+    if observers is None:
+        observers = _observers[sync_engine] = []
+        _listen(sync_engine, observers)
+    if observer is not None and observer not in observers:
+        observers.append(observer)
+
+
+def _listen(sync_engine: "Engine", observers: List[QueryObserver]) -> None:
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(
+        conn: "Connection",
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Optional["ExecutionContext"],
+        executemany: bool,
+    ) -> None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(
+        conn: "Connection",
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Optional["ExecutionContext"],
+        executemany: bool,
+    ) -> None:
+        seconds = time.perf_counter() - conn.info["query_start"].pop()
+        profile = _current.get()
+        if profile is not None:
+            profile.record(statement, seconds)
+        for observer in observers:
+            observer(statement, seconds)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context: "ExceptionContext") -> None:
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+
+
+class QueryProfilerMiddleware:
+    """HTTPリクエストごとにクエリを集計し、Server-Timingヘッダで返すASGIミドルウェア"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with profile_queries(f"{scope['method']} {scope['path']}") as profile:
+
+            async def send_with_timing(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    timing = (
+                        f'db;dur={profile.total_seconds * 1000:.2f};desc="{profile.count} queries"'
+                    )
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"server-timing", timing.encode("latin-1"))
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
@@ -0,0 +1,455 @@
+"""
+Synthetic dataset generator and bulk loader for scale testing
+
+現実に近い偏りを持つユーザー・ルーム・メンバーシップ・メッセージを生成し、
+ORMを経由せずに一括投入する。
+
+- ルームの規模（メンバー数・メッセージ数）はZipf分布に従う
+- 一部のメッセージは同じルームの直近のメッセージへの返信（スレッド）になる
+- 本文には日本語・英語のテキスト、コードブロック、LaTeX数式が混ざる
+- SQLiteはexecutemany、PostgreSQL(asyncpg)はCOPYで投入する
+
+同じseedからは常に同じデータセットが生成されるため、性能測定の基準として使える。
+"""
+import json
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Table, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from backend.cache import clear_all_caches
+from backend.chat.content_parser import TEXT, Segments, has_code, has_math, parse_content
+from backend.chat.search_service import SearchService
+from backend.models.chat_room import ChatRoom, RoleType, RoomMember
+from backend.models.message import Message, MessageType
+from backend.models.search import MESSAGES_TRGM_INDEX
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 生成ユーザーのgithub_idはこの値から負の方向に割り当てる（開発用ユーザーと区別）
+SEED_GITHUB_ID_BASE = -1_000_000
+
+_WORDS_JA = [
+    "今日", "明日", "実装", "レビュー", "テスト", "バグ", "修正", "確認", "設計", "会議",
+    "データベース", "インデックス", "クエリ", "キャッシュ", "性能", "ベンチマーク", "デプロイ",
+    "ログ", "エラー", "仕様", "ドキュメント", "リリース", "ブランチ", "マージ", "依存配列",
+]
+_WORDS_EN = [
+    "useEffect", "async", "await", "latency", "throughput", "index", "query", "cache",
+    "deploy", "rollback", "merge", "review", "benchmark", "websocket", "thread", "schema",
+    "migration", "timeout", "retry", "pool", "cursor", "batch", "commit", "snapshot",
+]
+# 日本語の語を多めに混ぜる
+_WORDS = _WORDS_JA * 2 + _WORDS_EN
+_SENTENCE_ENDINGS = ["です。", "しました。", "ですか？", "かも。", "！", "。", " 👍", "?", "."]
+
+_CODE_SNIPPETS = [
+    ("python", "def fib(n):\n    return n if n < 2 else fib(n - 1) + fib(n - 2)\n"),
+    ("python", "async with session.begin():\n    await session.execute(stmt)\n"),
+    ("javascript", "useEffect(() => {\n  fetchMessages(roomId);\n}, [roomId]);\n"),
+    ("typescript", "const total = items.reduce((sum, x) => sum + x.count, 0);\n"),
+    ("rust", "fn main() {\n    println!(\"{}\", (1..=10).sum::<u32>());\n}\n"),
+    ("sql", "SELECT room_id, count(*) FROM messages GROUP BY room_id;\n"),
+    (None, "$ uvicorn backend.main:app --reload\n"),
+]
+_INLINE_CODE = ["`git rebase -i`", "`pip install -e .`", "`None`", "`O(n log n)`", "`await db.commit()`"]
+_LATEX = [
+    "$E = mc^2$",
+    "$\\sum_{i=1}^{n} i = \\frac{n(n+1)}{2}$",
+    "$$\\int_0^\\infty e^{-x^2} dx = \\frac{\\sqrt{\\pi}}{2}$$",
+    "$O(\\log n)$",
+    "$$\\nabla \\cdot \\mathbf{E} = \\frac{\\rho}{\\varepsilon_0}$$",
+    "\\(a^2 + b^2 = c^2\\)",
+]
+
+
+@dataclass
+class SeedConfig:
+    """生成するデータセットの規模と性質"""
+
+    users: int = 1000
+    rooms: int = 100
+    messages: int = 100_000
+    days: int = 365  # メッセージの作成日時を分布させる期間
+    zipf_exponent: float = 1.1  # ルーム規模の偏り（大きいほど一部のルームに集中）
+    reply_ratio: float = 0.15  # 返信になるメッセージの割合
+    code_ratio: float = 0.15
+    latex_ratio: float = 0.1
+    min_members: int = 2
+    seed: int = 0
+
+
+def zipf_weights(n: int, exponent: float) -> List[float]:
+    """順位kの重みが1/k^exponentとなる重み列"""
+    return [1.0 / (rank ** exponent) for rank in range(1, n + 1)]
+
+
+class DatasetGenerator:
+    """行データ（dict）を生成する。メッセージはバッチ単位で逐次生成する"""
+
+    def __init__(
+        self,
+        config: SeedConfig,
+        first_user_id: int = 1,
+        first_room_id: int = 1,
+        first_message_id: int = 1,
+        github_id_base: int = SEED_GITHUB_ID_BASE,
+        now: Optional[datetime] = None,
+    ):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.first_user_id = first_user_id
+        self.first_room_id = first_room_id
+        self.first_message_id = first_message_id
+        self.github_id_base = github_id_base
+        self.now = now or datetime.now(timezone.utc)
+        self.start = self.now - timedelta(days=config.days)
+
+        self.user_ids = list(range(first_user_id, first_user_id + config.users))
+        self.room_ids = list(range(first_room_id, first_room_id + config.rooms))
+        self.room_weights = zipf_weights(config.rooms, config.zipf_exponent)
+        self.members: Dict[int, List[int]] = {}
+
+    def users(self) -> List[Dict[str, Any]]:
+        """ユーザー行"""
+        rows = []
+        for index, user_id in enumerate(self.user_ids):
+            username = f"user{user_id:07d}"
+            rows.append(
+                {
+                    "id": user_id,
+                    "github_id": self.github_id_base - index,
+                    "username": username,
+                    "display_name": f"User {user_id}",
+                    "email": f"{username}@example.com",
+                    "avatar_url": None,
+                    "bio": None,
+                    "is_active": True,
+                    "created_at": self.start,
+                    "updated_at": self.start,
+                }
+            )
+        return rows
+
+    def rooms(self) -> List[Dict[str, Any]]:
+        """ルーム行（メンバー構成もここで決める）"""
+        config = self.config
+        largest = max(config.min_members, config.users)
+        rows = []
+        for rank, room_id in enumerate(self.room_ids):
+            # 最大のルームは全ユーザー、それ以降はZipf分布に従って小さくなる
+            size = int(largest * self.room_weights[rank])
+            size = min(config.users, max(config.min_members, size))
+            self.members[room_id] = self.rng.sample(self.user_ids, size)
+            rows.append(
+                {
+                    "id": room_id,
+                    "name": f"room-{room_id}",
+                    "description": f"Synthetic room #{rank + 1}",
+                    "is_private": rank % 10 == 9,
+                    "created_by": self.members[room_id][0],
+                    "created_at": self.start,
+                    "updated_at": self.start,
+                }
+            )
+        return rows
+
+    def memberships(self) -> List[Dict[str, Any]]:
+        """メンバーシップ行（rooms()の後に呼ぶ）"""
+        rows = []
+        for room_id in self.room_ids:
+            for index, user_id in enumerate(self.members[room_id]):
+                rows.append(
+                    {
+                        "user_id": user_id,
+                        "room_id": room_id,
+                        "role": RoleType.ADMIN if index == 0 else RoleType.MEMBER,
+                        "joined_at": self.start,
+                    }
+                )
+        return rows
+
+    def messages(self, batch_size: int = 10_000) -> Iterator[List[Dict[str, Any]]]:
+        """メッセージ行をバッチ単位で生成（rooms()の後に呼ぶ）
+
+        作成日時はIDの順に単調増加し、返信は常に親より新しい。
+        """
+        config = self.config
+        rng = self.rng
+        cum_weights: List[float] = []
+        total_weight = 0.0
+        for weight in self.room_weights:
+            total_weight += weight
+            cum_weights.append(total_weight)
+
+        span = (self.now - self.start).total_seconds()
+        recent: Dict[int, Deque[int]] = {room_id: deque(maxlen=50) for room_id in self.room_ids}
+
+        batch: List[Dict[str, Any]] = []
+        for index in range(config.messages):
+            message_id = self.first_message_id + index
+            room_id = rng.choices(self.room_ids, cum_weights=cum_weights)[0]
+            created_at = self.start + timedelta(seconds=span * index / max(1, config.messages))
+
+            parent_id = None
+            if recent[room_id] and rng.random() < config.reply_ratio:
+                # 直近のメッセージほど返信されやすい
+                candidates = recent[room_id]
+                parent_id = candidates[-1 - min(len(candidates) - 1, int(rng.expovariate(0.3)))]
+            recent[room_id].append(message_id)
+
+            content, segments, message_type = self._content()
+            batch.append(
+                {
+                    "id": message_id,
+                    "content": content,
+                    "message_type": message_type,
+                    "user_id": rng.choice(self.members[room_id]),
+                    "room_id": room_id,
+                    "parent_id": parent_id,
+                    "has_latex": has_math(segments),
+                    "has_code": has_code(segments),
+                    "segments": segments,
+                    "reply_count": 0,
+                    "last_reply_at": None,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            )
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+    def _sentence(self) -> str:
+        rng = self.rng
+        words = rng.choices(_WORDS, k=rng.randint(2, 8))
+        return " ".join(words) + rng.choice(_SENTENCE_ENDINGS)
+
+    def _content(self) -> Tuple[str, Segments, MessageType]:
+        """本文・セグメント・メッセージタイプを生成
+
+        文はテキストのみで構成されるため、解析はコードや数式の部分だけ行う
+        （種類が少ないためキャッシュに載る）。
+        """
+        rng = self.rng
+        roll = rng.random()
+        if roll < self.config.code_ratio:
+            language, code = rng.choice(_CODE_SNIPPETS)
+            suffix = f"\n```{language or ''}\n{code}```"
+            message_type = MessageType.CODE
+        elif roll < self.config.code_ratio + self.config.latex_ratio:
+            suffix = " " + rng.choice(_LATEX)
+            message_type = MessageType.LATEX
+        else:
+            sentence = " ".join(self._sentence() for _ in range(rng.randint(1, 3)))
+            if rng.random() < 0.1:
+                sentence += " " + rng.choice(_INLINE_CODE)
+                return sentence, parse_content(sentence), MessageType.TEXT
+            return sentence, ((TEXT, sentence),), MessageType.TEXT
+
+        sentence = self._sentence()
+        tail = parse_content(suffix)
+        head_text = tail[0][1] if tail and tail[0][0] == TEXT else None
+        if head_text is not None:
+            segments = ((TEXT, sentence + head_text),) + tail[1:]
+        else:
+            segments = ((TEXT, sentence),) + tail
+        return sentence + suffix, segments, message_type
+
+
+class BulkLoader:
+    """生成した行をテーブルへ一括投入する"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.use_copy = self.dialect == "postgresql" and engine.dialect.driver == "asyncpg"
+
+    async def next_ids(self) -> Dict[str, int]:
+        """既存データと衝突しない開始IDとgithub_idの基準値"""
+        async with self.engine.connect() as conn:
+            max_user = (await conn.execute(select(func.max(User.id)))).scalar() or 0
+            max_room = (await conn.execute(select(func.max(ChatRoom.id)))).scalar() or 0
+            max_message = (await conn.execute(select(func.max(Message.id)))).scalar() or 0
+            min_github = (await conn.execute(select(func.min(User.github_id)))).scalar() or 0
+        return {
+            "first_user_id": max_user + 1,
+            "first_room_id": max_room + 1,
+            "first_message_id": max_message + 1,
+            "github_id_base": min(SEED_GITHUB_ID_BASE, min_github - 1),
+        }
+
+    async def load(
+        self, generator: DatasetGenerator, batch_size: int = 10_000
+    ) -> Dict[str, Dict[str, float]]:
+        """データセットを投入し、テーブルごとの件数・所要時間・行/秒を返す"""
+        report: Dict[str, Dict[str, float]] = {}
+
+        await self._before_load()
+        try:
+            async with self.engine.connect() as conn:
+                previous_synchronous = await self._relax_durability(conn)
+                try:
+                    await self._load_table(conn, report, User.__table__, [generator.users()])
+                    await self._load_table(conn, report, ChatRoom.__table__, [generator.rooms()])
+                    await self._load_table(
+                        conn, report, RoomMember.__table__, _chunks(generator.memberships(), batch_size)
+                    )
+                    await self._load_table(
+                        conn, report, Message.__table__, generator.messages(batch_size)
+                    )
+                    await self._update_reply_counters(conn, report, generator.first_message_id)
+                    await self._reset_sequences(conn)
+                finally:
+                    await self._restore_durability(conn, previous_synchronous)
+        finally:
+            await self._after_load(report)
+            clear_all_caches()
+
+        return report
+
+    async def _load_table(
+        self,
+        conn: AsyncConnection,
+        report: Dict[str, Dict[str, float]],
+        table: Table,
+        batches: Any,
+    ) -> None:
+        started = time.perf_counter()
+        rows = 0
+        for batch in batches:
+            if not batch:
+                continue
+            if self.use_copy:
+                await self._copy(conn, table, batch)
+            else:
+                await conn.execute(insert(table), batch)
+            await conn.commit()
+            rows += len(batch)
+            logger.info(f"Loaded {rows} rows into {table.name}")
+
+        elapsed = time.perf_counter() - started
+        report[table.name] = {
+            "rows": rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(rows / elapsed) if elapsed > 0 else 0,
+        }
+
+    async def _copy(self, conn: AsyncConnection, table: Table, batch: Sequence[Dict[str, Any]]) -> None:
+        """asyncpgのCOPYで投入"""
+        columns = list(batch[0].keys())
+        records = [tuple(_copy_value(row[column]) for column in columns) for row in batch]
+        raw = await conn.get_raw_connection()
+        driver_connection = raw.driver_connection
+        if driver_connection is None:
+            raise RuntimeError(f"No asyncpg connection available to COPY into {table.name}")
+        await driver_connection.copy_records_to_table(
+            table.name, records=records, columns=columns
+        )
+
+    async def _update_reply_counters(
+        self, conn: AsyncConnection, report: Dict[str, Dict[str, float]], first_message_id: int
+    ) -> None:
+        """投入したメッセージへの返信から返信数と最終返信日時を集計"""
+        started = time.perf_counter()
+        reply = Message.__table__.alias("reply")
+        parents = (
+            select(reply.c.parent_id)
+            .where(reply.c.id >= first_message_id, reply.c.parent_id.is_not(None))
+            .distinct()
+        )
+        await conn.execute(
+            update(Message.__table__)
+            .where(Message.__table__.c.id.in_(parents))
+            .values(
+                reply_count=select(func.count())
+                .where(reply.c.parent_id == Message.__table__.c.id)
+                .scalar_subquery(),
+                last_reply_at=select(func.max(reply.c.created_at))
+                .where(reply.c.parent_id == Message.__table__.c.id)
+                .scalar_subquery(),
+            )
+        )
+        await conn.commit()
+        report["reply_counters"] = {"seconds": round(time.perf_counter() - started, 3)}
+
+    async def _reset_sequences(self, conn: AsyncConnection) -> None:
+        """ID明示で投入したためPostgreSQLのシーケンスを進める"""
+        if self.dialect != "postgresql":
+            return
+        for table in ("users", "chat_rooms", "room_members", "messages"):
+            await conn.execute(
+                text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                )
+            )
+        await conn.commit()
+
+    async def _relax_durability(self, conn: AsyncConnection) -> Optional[int]:
+        """SQLite: 投入中はfsyncを省略する（失敗時は投入し直せば良いデータのため）"""
+        if self.dialect != "sqlite":
+            return None
+        previous = (await conn.exec_driver_sql("PRAGMA synchronous")).scalar()
+        await conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        return previous
+
+    async def _restore_durability(self, conn: AsyncConnection, previous: Optional[int]) -> None:
+        if previous is not None:
+            await conn.exec_driver_sql(f"PRAGMA synchronous={int(previous)}")
+
+    async def _before_load(self) -> None:
+        """行ごとに更新される検索インデックスを外す"""
+        async with AsyncSession(self.engine) as db:
+            if self.dialect == "sqlite":
+                await SearchService.drop_triggers(db)
+            elif self.dialect == "postgresql":
+                await db.execute(text(f"DROP INDEX IF EXISTS {MESSAGES_TRGM_INDEX}"))
+                await db.commit()
+
+    async def _after_load(self, report: Dict[str, Dict[str, float]]) -> None:
+        """検索インデックスを作り直す"""
+        started = time.perf_counter()
+        async with AsyncSession(self.engine) as db:
+            await SearchService.reindex(db)
+        report["search_index"] = {"seconds": round(time.perf_counter() - started, 3)}
+
+
+def _chunks(rows: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _copy_value(value: Any) -> Any:
+    """COPY用の値へ変換（Enumは名前、JSONは文字列）"""
+    if isinstance(value, (MessageType, RoleType)):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+async def seed_database(
+    engine: AsyncEngine, config: SeedConfig, batch_size: int = 10_000
+) -> Dict[str, Dict[str, float]]:
+    """データセットを生成して投入"""
+    loader = BulkLoader(engine)
+    ids = await loader.next_ids()
+    generator = DatasetGenerator(
+        config,
+        first_user_id=ids["first_user_id"],
+        first_room_id=ids["first_room_id"],
+        first_message_id=ids["first_message_id"],
+        github_id_base=ids["github_id_base"],
+    )
+    return await loader.load(generator, batch_size)
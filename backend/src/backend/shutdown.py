@@ -0,0 +1,89 @@
+"""
+Graceful shutdown: drain WebSocket connections before the server stops
+
+uvicornは終了シグナルを受けると、lifespanのshutdownより前に全WebSocketを
+コード1012で閉じる。そのままでは全クライアントが同時に再接続して認証と
+履歴取得が集中するため、SIGTERM/SIGINTのハンドラを差し替えて先にドレイン
+（再接続の遅延の通知 → 処理中の書き込みの完了待ち → 切断）を行い、完了後に
+元のハンドラ（uvicornの終了処理）を呼ぶ。
+
+lifespanのshutdownでもドレインを呼ぶため、シグナルを経由しない終了
+（テストや他のASGIサーバー）でも同じ手順になる。ドレインは1回だけ行われる。
+"""
+import asyncio
+import logging
+import signal
+import threading
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+from backend.chat.websocket_manager import connection_manager
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_drain_task: Optional["asyncio.Task[Dict[str, Any]]"] = None
+
+
+async def drain_connections() -> Dict[str, Any]:
+    """設定の期限・遅延の範囲でWebSocket接続をドレインする（2回目以降は1回目の結果を待つ）"""
+    global _drain_task
+    if _drain_task is None:
+        _drain_task = asyncio.ensure_future(
+            connection_manager.drain(
+                settings.shutdown_drain_timeout_seconds,
+                settings.reconnect_delay_min_seconds,
+                settings.reconnect_delay_max_seconds,
+            )
+        )
+    return await asyncio.shield(_drain_task)
+
+
+def reset_drain() -> None:
+    """接続の受け付けを再開する（同じプロセスでアプリを起動し直す場合、主にテスト）"""
+    global _drain_task
+    _drain_task = None
+    connection_manager.draining = False
+
+
+def install_drain_on_signal(
+    drain: Callable[[], Coroutine[Any, Any, Any]],
+) -> Callable[[], None]:
+    """SIGTERM/SIGINTで元のハンドラより先にdrainを実行する
+
+    2回目のシグナルはドレインを待たずに元のハンドラへ渡す（強制終了）。
+    元に戻す関数を返す。メインスレッド以外やハンドラが無い場合は何もしない。
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return lambda: None
+
+    loop = asyncio.get_running_loop()
+    previous: Dict[int, Callable[..., Any]] = {}
+    started = False
+
+    def handle(signum: int, frame: Any) -> None:
+        nonlocal started
+        original = previous[signum]
+        if started:
+            original(signum, frame)
+            return
+        started = True
+        logger.info(f"Received signal {signum}, draining WebSocket connections")
+
+        def start() -> None:
+            task = loop.create_task(drain())
+            task.add_done_callback(lambda _: original(signum, frame))
+
+        loop.call_soon_threadsafe(start)
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        current = signal.getsignal(signum)
+        if callable(current):
+            previous[signum] = current
+            signal.signal(signum, handle)
+
+    def uninstall() -> None:
+        for signum, original in previous.items():
+            if signal.getsignal(signum) is handle:
+                signal.signal(signum, original)
+
+    return uninstall
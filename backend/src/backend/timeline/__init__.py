@@ -0,0 +1,3 @@
+"""
+Timeline (post feed) package for Lunir
+"""
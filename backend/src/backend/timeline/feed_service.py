@@ -0,0 +1,310 @@
+"""
+Timeline feed with fan-out-on-write
+
+投稿時に閲覧者ごとのフィード（timeline_feed_entries）へ書き込み、読み出しは
+(user_id, post_id) の主キーを post_id の降順にたどるキーセットページングで
+行う。投稿の総数に関係なく1ページの読み出しはページサイズ分の行で済む。
+
+閲覧者は投稿者とルームを共有するユーザー（フレンド機能は未実装のため、
+PUBLIC・FRIENDS とも同じ）。PRIVATE の投稿は投稿者自身のフィードにだけ入る。
+
+閲覧者が TIMELINE_FANOUT_MAX_AUDIENCE を超える、または直近24時間の投稿が
+TIMELINE_FANOUT_MAX_DAILY_POSTS 以上の投稿者の投稿は書き込みの件数が大きく
+なるため、フィードには書き込まず（fanned_out=False）、読み出し時にその
+投稿者の投稿を (user_id, id) のインデックスから集めて合わせる
+（fan-out-on-read）。そうした投稿者は timeline_pull_authors に記録する。
+
+フィードに書き込んだ投稿は書き込み時点の閲覧者のもので、後からルームに
+参加・退出しても変わらない。読み出し時に集める投稿は読み出し時点で
+ルームを共有している投稿者のものになる。
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple, cast
+
+from sqlalchemy import CursorResult, Insert, and_, desc, func, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from backend.cache import TTLCache
+from backend.chat.content_parser import has_code, has_math, parse_content
+from backend.config import settings
+from backend.metrics import Counter
+from backend.models.chat_room import RoomMember
+from backend.models.timeline import (
+    PostType,
+    TimelineFeedEntry,
+    TimelinePost,
+    TimelinePullAuthor,
+    VisibilityType,
+)
+from backend.models.user import User
+
+logger = logging.getLogger(__name__)
+
+_feed_entries = TimelineFeedEntry.__table__
+
+# 投稿の配信方法（push: フィードに書き込み / pull: 読み出し時に集める / private: 投稿者のみ）
+timeline_posts_total = Counter(
+    "lunir_timeline_posts",
+    "Timeline posts by delivery mode (push, pull, private)",
+    ["mode"],
+)
+timeline_feed_entries_written = Counter(
+    "lunir_timeline_feed_entries_written",
+    "Feed entries written on post (fan-out-on-write)",
+)
+
+# timeline_pull_authors の全件（件数は投稿の多い投稿者の数に限られる）
+pull_author_cache: "TTLCache[FrozenSet[int]]" = TTLCache(
+    "timeline_pull_authors", 1, settings.timeline_pull_author_cache_ttl_seconds
+)
+
+
+class PostRow(NamedTuple):
+    """フィードの1行"""
+    id: int
+    title: Optional[str]
+    content: str
+    post_type: PostType
+    visibility: VisibilityType
+    has_latex: bool
+    has_code: bool
+    created_at: datetime
+    user_id: int
+    username: Optional[str]
+    display_name: Optional[str]
+    avatar_url: Optional[str]
+
+
+# PostRowの順に並べたSELECT対象の列（UserとのJOINが必要）
+POST_ROW_COLUMNS = (
+    TimelinePost.id,
+    TimelinePost.title,
+    TimelinePost.content,
+    TimelinePost.post_type,
+    TimelinePost.visibility,
+    TimelinePost.has_latex,
+    TimelinePost.has_code,
+    TimelinePost.created_at,
+    TimelinePost.user_id,
+    User.username,
+    User.display_name,
+    User.avatar_url,
+)
+
+
+def post_row_fields(row: PostRow) -> Dict[str, Any]:
+    """フィードの投稿1件のレスポンス用dict"""
+    return {
+        "id": row.id,
+        "title": row.title,
+        "content": row.content,
+        "post_type": row.post_type.value,
+        "visibility": row.visibility.value,
+        "user": {
+            "id": row.user_id,
+            "username": row.username,
+            "display_name": row.display_name,
+            "avatar_url": row.avatar_url,
+        },
+        "has_latex": row.has_latex,
+        "has_code": row.has_code,
+        "created_at": row.created_at.isoformat(),
+    }
+
+
+class FeedService:
+    """タイムライン投稿とフィードのビジネスロジック"""
+
+    @staticmethod
+    async def get_audience(db: AsyncSession, author_id: int) -> List[int]:
+        """投稿者とルームを共有するユーザー（投稿者自身を除く）"""
+        author_rooms = aliased(RoomMember)
+        result = await db.execute(
+            select(RoomMember.user_id).distinct()
+            .join(author_rooms, author_rooms.room_id == RoomMember.room_id)
+            .where(and_(author_rooms.user_id == author_id, RoomMember.user_id != author_id))
+        )
+        return list(result.scalars())
+
+    @staticmethod
+    async def count_recent_posts(db: AsyncSession, author_id: int, limit: int) -> int:
+        """直近24時間の投稿数（limit件で数えるのをやめる）"""
+        since = datetime.now(timezone.utc) - timedelta(days=1)
+        recent = (
+            select(TimelinePost.id)
+            .where(and_(TimelinePost.user_id == author_id, TimelinePost.created_at >= since))
+            .limit(limit)
+            .subquery()
+        )
+        return (await db.execute(select(func.count()).select_from(recent))).scalar_one()
+
+    @staticmethod
+    async def create_post(
+        db: AsyncSession,
+        author_id: int,
+        content: str,
+        title: Optional[str] = None,
+        post_type: PostType = PostType.GENERAL,
+        visibility: VisibilityType = VisibilityType.PUBLIC,
+    ) -> TimelinePost:
+        """投稿を保存し、閲覧者のフィードに書き込む（投稿者自身のフィードには常に書き込む）"""
+        audience: List[int] = []
+        fan_out = True
+        if visibility != VisibilityType.PRIVATE:
+            audience = await FeedService.get_audience(db, author_id)
+            max_posts = settings.timeline_fanout_max_daily_posts
+            fan_out = (
+                len(audience) <= settings.timeline_fanout_max_audience
+                and await FeedService.count_recent_posts(db, author_id, max_posts) < max_posts
+            )
+
+        segments = parse_content(content)
+        post = TimelinePost(
+            title=title,
+            content=content,
+            post_type=post_type,
+            user_id=author_id,
+            has_latex=has_math(segments),
+            has_code=has_code(segments),
+            visibility=visibility,
+            fanned_out=fan_out,
+        )
+        db.add(post)
+        await db.flush()
+
+        recipients = [author_id] + (audience if fan_out else [])
+        await db.execute(
+            insert(_feed_entries),
+            [{"user_id": user_id, "post_id": post.id} for user_id in recipients],
+        )
+        new_pull_author = False
+        if not fan_out and author_id not in await FeedService.get_pull_authors(db):
+            new_pull_author = await FeedService._add_pull_author(db, author_id)
+        await db.commit()
+        await db.refresh(post)
+
+        if new_pull_author:
+            pull_author_cache.invalidate(())
+            logger.info(f"User {author_id} switched to fan-out-on-read ({len(audience)} readers)")
+        mode = "private" if visibility == VisibilityType.PRIVATE else "push" if fan_out else "pull"
+        timeline_posts_total.inc(mode=mode)
+        timeline_feed_entries_written.inc(len(recipients))
+        return post
+
+    @staticmethod
+    async def _add_pull_author(db: AsyncSession, author_id: int) -> bool:
+        """fan-out-on-read の投稿者に加える（加えた場合True）
+
+        同じ投稿者の投稿が同時に来ても主キー違反にならないよう、
+        ON CONFLICT DO NOTHING で挿入する。
+        """
+        dialect = db.get_bind().dialect.name
+        statement: Insert
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+            statement = pg_insert(TimelinePullAuthor).on_conflict_do_nothing(
+                index_elements=[TimelinePullAuthor.user_id]
+            )
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+            statement = sqlite_insert(TimelinePullAuthor).on_conflict_do_nothing(
+                index_elements=[TimelinePullAuthor.user_id]
+            )
+        else:
+            if await db.get(TimelinePullAuthor, author_id) is not None:
+                return False
+            db.add(TimelinePullAuthor(user_id=author_id))
+            return True
+
+        result = cast(
+            CursorResult[Any], await db.execute(statement.values(user_id=author_id))
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    async def get_pull_authors(db: AsyncSession) -> FrozenSet[int]:
+        """読み出し時に投稿を集める投稿者（キャッシュ経由）"""
+
+        async def load() -> FrozenSet[int]:
+            result = await db.execute(select(TimelinePullAuthor.user_id))
+            return frozenset(result.scalars())
+
+        return await pull_author_cache.get_or_load((), load)
+
+    @staticmethod
+    async def get_feed_rows(
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 50,
+        before_id: Optional[int] = None,
+    ) -> Tuple[List[PostRow], bool]:
+        """フィードの1ページ（新しい順）と、さらに古い投稿があるかを返す
+
+        フィードのエントリと、ルームを共有する fan-out-on-read の投稿者の投稿を
+        それぞれ limit + 1 件までキーセットで読み、post_id の降順に合わせる。
+        """
+        entries = (
+            select(*POST_ROW_COLUMNS)
+            .select_from(TimelineFeedEntry)
+            .join(TimelinePost, TimelinePost.id == TimelineFeedEntry.post_id)
+            .join(User, User.id == TimelinePost.user_id)
+            .where(TimelineFeedEntry.user_id == user_id)
+            .order_by(desc(TimelineFeedEntry.post_id))
+            .limit(limit + 1)
+        )
+        if before_id:
+            entries = entries.where(TimelineFeedEntry.post_id < before_id)
+        branches = [entries]
+
+        pull_authors = await FeedService.get_pull_authors(db)
+        if pull_authors:
+            for author_id in await FeedService._get_pull_authors_for(db, user_id, pull_authors):
+                posts = (
+                    select(*POST_ROW_COLUMNS)
+                    .join(User, User.id == TimelinePost.user_id)
+                    .where(
+                        and_(
+                            TimelinePost.user_id == author_id,
+                            TimelinePost.fanned_out.is_(False),
+                            TimelinePost.visibility != VisibilityType.PRIVATE,
+                        )
+                    )
+                    .order_by(desc(TimelinePost.id))
+                    .limit(limit + 1)
+                )
+                if before_id:
+                    posts = posts.where(TimelinePost.id < before_id)
+                branches.append(posts)
+
+        if len(branches) == 1:
+            query = branches[0]
+        else:
+            # 各投稿者のページをサブクエリで読み（それぞれインデックスの範囲走査）、まとめて並べる
+            merged = union_all(*(select(branch.subquery()) for branch in branches)).subquery()
+            query = select(merged).order_by(desc(merged.c.id)).limit(limit + 1)
+
+        rows = [PostRow._make(row) for row in (await db.execute(query)).all()]
+        return rows[:limit], len(rows) > limit
+
+    @staticmethod
+    async def _get_pull_authors_for(
+        db: AsyncSession, user_id: int, pull_authors: FrozenSet[int]
+    ) -> List[int]:
+        """ユーザーとルームを共有する fan-out-on-read の投稿者"""
+        user_rooms = aliased(RoomMember)
+        result = await db.execute(
+            select(RoomMember.user_id).distinct()
+            .join(user_rooms, user_rooms.room_id == RoomMember.room_id)
+            .where(
+                and_(
+                    user_rooms.user_id == user_id,
+                    RoomMember.user_id != user_id,
+                    RoomMember.user_id.in_(pull_authors),
+                )
+            )
+        )
+        return sorted(result.scalars())
@@ -0,0 +1,96 @@
+"""
+REST API router for timeline posts
+"""
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.auth.dependencies import get_current_user
+from backend.chat.read_models import encode_json
+from backend.models.base import get_db, get_read_db
+from backend.models.timeline import PostType, VisibilityType
+from backend.models.user import User
+from backend.timeline.feed_service import FeedService, PostRow, post_row_fields
+
+router = APIRouter(prefix="/api/v1/timeline", tags=["timeline"])
+
+MAX_POST_LENGTH = 10000
+
+
+class CreatePostRequest(BaseModel):
+    """投稿作成リクエスト"""
+
+    content: str
+    title: Optional[str] = None
+    post_type: PostType = PostType.GENERAL
+    visibility: VisibilityType = VisibilityType.PUBLIC
+
+
+@router.post("/posts", status_code=status.HTTP_201_CREATED)
+async def create_post(
+    request: CreatePostRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> Dict[str, Any]:
+    """タイムラインに投稿"""
+    if not request.content.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Post content cannot be empty"
+        )
+    if len(request.content) > MAX_POST_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Post too long (max {MAX_POST_LENGTH} characters)",
+        )
+    if request.title and len(request.title) > 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Title too long (max 255 characters)"
+        )
+
+    post = await FeedService.create_post(
+        db,
+        current_user.id,
+        request.content,
+        title=request.title.strip() if request.title else None,
+        post_type=request.post_type,
+        visibility=request.visibility,
+    )
+    return post_row_fields(
+        PostRow(
+            post.id,
+            post.title,
+            post.content,
+            post.post_type,
+            post.visibility,
+            post.has_latex,
+            post.has_code,
+            post.created_at,
+            current_user.id,
+            current_user.username,
+            current_user.display_name,
+            current_user.avatar_url,
+        )
+    )
+
+
+@router.get("/feed")
+async def get_feed(
+    limit: int = Query(50, ge=1, le=100),
+    before_id: Optional[int] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+) -> Response:
+    """フィードを新しい順に取得（次のページは next_before_id を before_id に渡す）"""
+    rows, has_more = await FeedService.get_feed_rows(db, current_user.id, limit, before_id)
+    return Response(
+        content=encode_json(
+            {
+                "posts": [post_row_fields(row) for row in rows],
+                "has_more": has_more,
+                "next_before_id": rows[-1].id if has_more else None,
+            }
+        ),
+        media_type="application/json",
+    )
@@ -0,0 +1,124 @@
+"""
+Tests for hot/cold message archiving
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+from backend.chat.archive_service import ArchiveService
+from backend.chat.chat_service import ChatService
+from backend.models.message import Message
+from backend.models.message_archive import MessageArchiveSegment
+from tests.conftest import create_room, create_user, query_budget
+
+
+async def _age_messages(db, ids, days):
+    """メッセージの作成日時を過去にずらす"""
+    old = datetime.now(timezone.utc) - timedelta(days=days)
+    await db.execute(update(Message).where(Message.id.in_(ids)).values(created_at=old))
+    await db.commit()
+
+
+@pytest.mark.asyncio
+async def test_archive_and_read_through(db):
+    """古いメッセージはセグメントへ移り、履歴はカーソルに沿って透過的に読める"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+
+    old_ids = [
+        (await ChatService.save_message(db, f"old {i}", alice.id, room.id)).id for i in range(5)
+    ]
+    new_ids = [
+        (await ChatService.save_message(db, f"new {i}", alice.id, room.id)).id for i in range(3)
+    ]
+    await _age_messages(db, old_ids, days=120)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=90)
+    archived = await ArchiveService.archive_older_than(db, cutoff, batch_size=2)
+    assert archived == 5
+
+    hot_count = (await db.execute(select(func.count(Message.id)))).scalar()
+    assert hot_count == 3
+    segments = (await db.execute(select(MessageArchiveSegment))).scalars().all()
+    assert sum(s.message_count for s in segments) == 5
+
+    # 最新ページはホットのみ
+    page = await ChatService.get_room_message_rows(db, room.id, limit=3)
+    assert [m.id for m in page] == new_ids
+
+    # ホットとコールドをまたぐページ
+    page = await ChatService.get_room_message_rows(db, room.id, limit=4)
+    assert [m.id for m in page] == old_ids[-1:] + new_ids
+    assert page[0].content == "old 4"
+    assert page[0].username == "alice"
+
+    # カーソルがコールド範囲に入った後
+    page = await ChatService.get_room_message_rows(db, room.id, limit=10, before_id=old_ids[3])
+    assert [m.id for m in page] == old_ids[:3]
+
+
+@pytest.mark.asyncio
+async def test_ancestors_of_hot_replies_stay_hot(db):
+    """ホットな返信の祖先はアーカイブされない"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    child = await ChatService.save_message(db, "child", alice.id, room.id, parent_id=root.id)
+    await ChatService.save_message(db, "grandchild", alice.id, room.id, parent_id=child.id)
+    lonely = await ChatService.save_message(db, "lonely", alice.id, room.id)
+    await _age_messages(db, [root.id, child.id, lonely.id], days=120)
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=90)
+    assert await ArchiveService.archive_room(db, room.id, cutoff) == 1
+
+    remaining = (await db.execute(select(Message.id).order_by(Message.id))).scalars().all()
+    assert lonely.id not in remaining
+    assert {root.id, child.id} <= set(remaining)
+
+
+@pytest.mark.asyncio
+async def test_cold_watermark_is_cached_until_archive(db):
+    """埋まったページの判定でウォーターマークを毎回読まず、アーカイブ後は読み直す"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    ids = [(await ChatService.save_message(db, f"m {i}", alice.id, room.id)).id for i in range(4)]
+
+    await ChatService.get_room_message_rows(db, room.id, limit=2)
+    with query_budget(1, "history page with cached watermark"):
+        page = await ChatService.get_room_message_rows(db, room.id, limit=2)
+    assert [row.id for row in page] == ids[2:]
+
+    # アーカイブ済みの古いメッセージより新しいホットのメッセージが残る（祖先の固定と同じ状況）
+    await _age_messages(db, [ids[1]], days=120)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=90)
+    assert await ArchiveService.archive_room(db, room.id, cutoff) == 1
+
+    page = await ChatService.get_room_message_rows(db, room.id, limit=2, before_id=ids[3])
+    assert [row.id for row in page] == [ids[1], ids[2]]
+
+
+@pytest.mark.asyncio
+async def test_batch_archived_by_another_worker_is_rolled_back(db, monkeypatch):
+    """他のワーカーが同じバッチを先に移した場合はセグメントを作らずに止める"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    room_id = room.id
+    ids = [(await ChatService.save_message(db, f"m {i}", alice.id, room.id)).id for i in range(3)]
+    await _age_messages(db, ids, days=120)
+    execute = db.execute
+
+    async def execute_after_other_worker(statement, *args, **kwargs):
+        # バッチを読んだ後、先行するワーカーが同じ行を移し終えた状態で削除する
+        if getattr(statement, "is_delete", False) and statement.table.name == "messages":
+            monkeypatch.setattr(db, "execute", execute)
+            await execute(delete(Message).where(Message.id == ids[0]))
+        return await execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", execute_after_other_worker)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=90)
+    assert await ArchiveService.archive_room(db, room_id, cutoff) == 0
+
+    assert (await db.execute(select(func.count(MessageArchiveSegment.id)))).scalar() == 0
+    assert (await db.execute(select(func.count(Message.id)))).scalar() == 3
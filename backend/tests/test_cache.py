@@ -0,0 +1,106 @@
+"""
+Tests for the process-local TTL/LRU cache and room caching
+"""
+import asyncio
+
+import pytest
+
+from backend.cache import TTLCache
+from backend.chat.chat_service import ChatService, room_cache, room_members_cache
+from tests.conftest import create_room, create_user
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ttl_and_lru_eviction():
+    """期限切れと件数上限による追い出し"""
+    clock = FakeClock()
+    cache = TTLCache("test-ttl", maxsize=2, ttl_seconds=10, clock=clock)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # aが最近使われた
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    clock.now = 11
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_are_collapsed():
+    """同じキーの同時読み込みは1回にまとめられる"""
+    cache = TTLCache("test-single-flight", maxsize=10, ttl_seconds=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+
+    results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+    assert results == ["value"] * 5
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_discards_result():
+    """読み込み中に無効化された値はキャッシュされない"""
+    cache = TTLCache("test-invalidate", maxsize=10, ttl_seconds=60)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def stale_loader():
+        started.set()
+        await release.wait()
+        return "stale"
+
+    task = asyncio.create_task(cache.get_or_load("key", stale_loader))
+    await started.wait()
+    cache.invalidate("key")
+    release.set()
+    assert await task == "stale"
+
+    async def fresh_loader():
+        return "fresh"
+
+    assert await cache.get_or_load("key", fresh_loader) == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_room_membership_cache_is_invalidated(db):
+    """参加・退出でメンバーIDのキャッシュが無効化される"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice)
+    hits = room_members_cache.stats()["hits"]
+
+    assert not await ChatService.is_user_in_room(db, bob.id, room.id)
+    assert await ChatService.is_user_in_room(db, alice.id, room.id)
+    assert room_members_cache.stats()["hits"] == hits + 1
+
+    await ChatService.join_room(db, bob.id, room.id)
+    assert await ChatService.is_user_in_room(db, bob.id, room.id)
+
+    await ChatService.leave_room(db, bob.id, room.id)
+    assert not await ChatService.is_user_in_room(db, bob.id, room.id)
+
+    invalidations = room_cache.stats()["invalidations"]
+    info = await ChatService.get_room_info(db, room.id)
+    assert info.name == "room" and info.retention_days is None
+    await ChatService.set_room_retention(db, room.id, 7)
+    assert (await ChatService.get_room_info(db, room.id)).retention_days == 7
+    assert room_cache.stats()["invalidations"] == invalidations + 1
+
+    assert await ChatService.get_room_info(db, 9999) is None
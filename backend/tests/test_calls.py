@@ -0,0 +1,150 @@
+"""
+Tests for call signaling and call participant persistence
+"""
+import json
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from backend.call.call_manager import CallManager, call_manager
+from backend.call.call_service import CallService
+from backend.call.signaling import handle_call_message, leave_call
+from backend.chat.websocket_manager import connection_manager
+from backend.models.call import CallParticipant, CallSession, CallStatus
+from tests.conftest import create_room, create_user, query_budget
+
+
+class FakeWebSocket:
+    """送信内容を記録するWebSocket"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    def of_type(self, message_type):
+        return [message for message in self.sent if message["type"] == message_type]
+
+
+@pytest_asyncio.fixture
+async def sockets():
+    """グローバルな接続・通話マネージャーにユーザーごとの偽のソケットを登録する"""
+    registered = {}
+
+    def connect(user):
+        registered[user.id] = connection_manager.active_connections[user.id] = FakeWebSocket()
+        return registered[user.id]
+
+    yield connect
+    for user_id in registered:
+        await leave_call(user_id)
+        connection_manager.active_connections.pop(user_id, None)
+    # テストDBと共に消える通話の未保存イベントを捨てる
+    call_manager.__init__()
+
+
+async def _participants(db):
+    result = await db.execute(select(CallParticipant).order_by(CallParticipant.id))
+    return [(row.user_id, row.left_at is not None) for row in result.scalars()]
+
+
+@pytest.mark.asyncio
+async def test_participant_events_are_written_in_batches(db):
+    """入退出はflushまで書き込まれず、同じバッチ内の参加・退出は1行にまとまる"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice, bob)
+    manager = CallManager()
+
+    call = await manager.join(db, room.id, {"id": alice.id})
+    await manager.join(db, room.id, {"id": bob.id})
+    manager.leave(bob.id)
+    assert await _participants(db) == []
+    assert manager.pending_count() == 2
+
+    assert await manager.flush(db) == 2
+    assert sorted(await _participants(db)) == [(alice.id, False), (bob.id, True)]
+
+    # 保存済みの参加者の退出は更新になり、最後の1人で通話が終わる
+    manager.leave(alice.id)
+    assert manager.get_call(room.id) is None
+    assert await manager.flush(db) == 2
+    assert sorted(await _participants(db)) == [(alice.id, True), (bob.id, True)]
+    session = await db.get(CallSession, call.session_id)
+    await db.refresh(session)
+    assert session.status == CallStatus.ENDED
+    assert session.ended_at is not None
+
+
+@pytest.mark.asyncio
+async def test_orphaned_sessions_are_ended_on_startup(db):
+    """アクティブのまま残った通話と参加者を終了する"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    session = await CallService.start_session(db, room.id, alice.id)
+    db.add(CallParticipant(session_id=session.id, user_id=alice.id))
+    await db.commit()
+
+    assert await CallService.end_orphaned_sessions(db) == 1
+    assert await CallService.end_orphaned_sessions(db) == 0
+    await db.refresh(session)
+    assert session.status == CallStatus.ENDED
+    assert await _participants(db) == [(alice.id, True)]
+
+
+@pytest.mark.asyncio
+async def test_signaling_relays_between_call_participants_without_queries(db, sockets):
+    """参加を通知し、offer・ICE candidateを相手にだけ中継する（中継はクエリ無し）"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    carol = await create_user(db, "carol", 3)
+    room = await create_room(db, "room", alice, bob, carol)
+    alice_ws, bob_ws, carol_ws = sockets(alice), sockets(bob), sockets(carol)
+
+    await handle_call_message(db, alice, room.id, "call_join", {})
+    await handle_call_message(db, bob, room.id, "call_join", {})
+    joined = bob_ws.of_type("call_joined")[0]["payload"]
+    assert [user["id"] for user in joined["participants"]] == [alice.id, bob.id]
+    assert alice_ws.of_type("call_participant_joined")[0]["payload"]["user"]["id"] == bob.id
+
+    with query_budget(0, "relay"):
+        await handle_call_message(
+            db, bob, room.id, "call_offer", {"target_user_id": alice.id, "sdp": "v=0 offer"}
+        )
+        await handle_call_message(
+            db,
+            alice,
+            room.id,
+            "call_ice_candidate",
+            {"target_user_id": bob.id, "candidate": {"candidate": "candidate:1", "sdpMid": "0"}},
+        )
+    offer = alice_ws.of_type("call_offer")[0]["payload"]
+    assert offer == {"session_id": joined["session_id"], "from_user_id": bob.id, "sdp": "v=0 offer"}
+    assert bob_ws.of_type("call_ice_candidate")[0]["payload"]["candidate"]["sdpMid"] == "0"
+
+    # 通話に参加していないユーザーとの間では中継しない
+    await handle_call_message(db, carol, room.id, "call_offer", {"target_user_id": alice.id, "sdp": "x"})
+    await handle_call_message(db, alice, room.id, "call_offer", {"target_user_id": carol.id, "sdp": "x"})
+    assert len(alice_ws.of_type("call_offer")) == 1
+    assert carol_ws.of_type("call_offer") == []
+    assert carol_ws.of_type("error")[0]["payload"]["message"] == "Not in a call"
+
+    await handle_call_message(db, bob, room.id, "call_leave", {})
+    assert alice_ws.of_type("call_participant_left")[0]["payload"]["user_id"] == bob.id
+    assert list(call_manager.get_call(room.id).participants) == [alice.id]
+
+
+@pytest.mark.asyncio
+async def test_non_members_cannot_join_call(db, sockets):
+    """ルームのメンバーでなければ通話に参加できない"""
+    alice = await create_user(db, "alice", 1)
+    mallory = await create_user(db, "mallory", 2)
+    room = await create_room(db, "room", alice)
+    mallory_ws = sockets(mallory)
+
+    await handle_call_message(db, mallory, room.id, "call_join", {})
+
+    assert call_manager.get_call(room.id) is None
+    assert mallory_ws.of_type("error")[0]["payload"]["message"] == "Not a member of this room"
@@ -0,0 +1,104 @@
+"""
+Tests for ETag / conditional GET on room endpoints
+"""
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.auth.dependencies import get_current_user
+from backend.chat.chat_service import ChatService
+from backend.chat.rest_router import router
+from backend.models.base import get_read_db
+from tests.conftest import create_room, create_user
+
+
+@pytest_asyncio.fixture
+async def api(db_engine):
+    """テストDBとログインユーザーを差し替えたAPIクライアントを作る関数"""
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    app = FastAPI()
+    app.include_router(router)
+
+    async def read_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_read_db] = read_db
+    clients = []
+
+    def client_for(user):
+        app.dependency_overrides[get_current_user] = lambda: user
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+        clients.append(client)
+        return client
+
+    yield client_for
+    for client in clients:
+        await client.aclose()
+
+
+async def _revalidate(client: httpx.AsyncClient, url: str) -> httpx.Response:
+    """直前の応答のETagで条件付きGETを行う"""
+    first = await client.get(url)
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "private, no-cache"
+    return await client.get(url, headers={"If-None-Match": first.headers["etag"]})
+
+
+@pytest.mark.asyncio
+async def test_room_endpoints_return_304_until_room_changes(db, api):
+    """メッセージ・参加・退出でETagが変わり、それまでは304を返す"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice)
+    await ChatService.save_message(db, "hello", alice.id, room.id)
+    client = api(alice)
+
+    urls = ["/api/v1/rooms", f"/api/v1/rooms/{room.id}", f"/api/v1/rooms/{room.id}/messages"]
+    etags = {}
+    for url in urls:
+        response = await _revalidate(client, url)
+        assert response.status_code == 304
+        assert response.content == b""
+        etags[url] = response.headers["etag"]
+
+    await ChatService.save_message(db, "again", alice.id, room.id)
+    for url in urls:
+        response = await client.get(url, headers={"If-None-Match": etags[url]})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etags[url]
+        etags[url] = response.headers["etag"]
+    assert [m["content"] for m in response.json()] == ["hello", "again"]
+
+    await ChatService.join_room(db, bob.id, room.id)
+    detail = await client.get(urls[1], headers={"If-None-Match": etags[urls[1]]})
+    assert detail.status_code == 200
+    assert len(detail.json()["members"]) == 2
+
+    # 古いページのカーソル指定は常に本文を返す
+    older = await client.get(f"{urls[2]}?before_id=999", headers={"If-None-Match": "*"})
+    assert older.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_respects_membership(db, api):
+    """退出後は有効だったETagでも304ではなく403になり、一覧からも消える"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice, bob)
+    client = api(bob)
+
+    detail = await client.get(f"/api/v1/rooms/{room.id}")
+    rooms = await client.get("/api/v1/rooms")
+    assert [r["id"] for r in rooms.json()] == [room.id]
+
+    await ChatService.leave_room(db, bob.id, room.id)
+    response = await client.get(
+        f"/api/v1/rooms/{room.id}", headers={"If-None-Match": detail.headers["etag"]}
+    )
+    assert response.status_code == 403
+    response = await client.get("/api/v1/rooms", headers={"If-None-Match": rooms.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json() == []
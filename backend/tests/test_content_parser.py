@@ -0,0 +1,65 @@
+"""
+Tests for message content parser
+"""
+from backend.chat.content_parser import SegmentCache, has_code, has_math, parse_content
+
+
+def test_plain_dollar_amounts_are_not_math():
+    """金額表記のドル記号は数式として扱わない"""
+    segments = parse_content("costs $5 and $10 today")
+    assert segments == (("text", "costs $5 and $10 today"),)
+    assert not has_math(segments)
+
+
+def test_inline_and_display_math():
+    """インライン数式とディスプレイ数式を分割する"""
+    segments = parse_content(r"let $x^2$ be \(y\) and $$\sum_i a_i$$ or \[z\]")
+    assert segments == (
+        ("text", "let "),
+        ("math", "x^2"),
+        ("text", " be "),
+        ("math", "y"),
+        ("text", " and "),
+        ("display_math", r"\sum_i a_i"),
+        ("text", " or "),
+        ("display_math", "z"),
+    )
+    assert has_math(segments)
+
+
+def test_fenced_code_with_language():
+    """フェンスコードブロックは言語付きで切り出し、中の$は数式にしない"""
+    segments = parse_content("see:\n```python\nprice = '$5$'\n```\ndone")
+    assert segments == (
+        ("text", "see:\n"),
+        ("code", "price = '$5$'", "python"),
+        ("text", "done"),
+    )
+    assert has_code(segments)
+    assert not has_math(segments)
+
+
+def test_inline_code_and_escapes():
+    """インラインコードとエスケープされたドル記号"""
+    segments = parse_content(r"run `echo $HOME` for \$HOME")
+    assert segments == (
+        ("text", "run "),
+        ("inline_code", "echo $HOME"),
+        ("text", " for $HOME"),
+    )
+
+
+def test_unclosed_markers_stay_text():
+    """閉じられていない記号はテキストのまま"""
+    assert parse_content("a ` b $$ c") == (("text", "a ` b $$ c"),)
+
+
+def test_segment_cache_hits_and_eviction():
+    """同一本文はキャッシュから返し、上限を超えると古いものから破棄する"""
+    cache = SegmentCache(maxsize=2)
+    first = cache.get_or_parse("$a$")
+    assert cache.get_or_parse("$a$") is first
+    cache.get_or_parse("b")
+    cache.get_or_parse("c")
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 1, "misses": 3}
+    assert cache.get_or_parse("$a$") is not first
@@ -0,0 +1,131 @@
+"""
+Tests for draining WebSocket connections on shutdown
+"""
+import asyncio
+import json
+import os
+import signal
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend.chat.websocket_manager import ConnectionManager, connection_manager
+from backend.main import app
+from backend.shutdown import install_drain_on_signal, reset_drain
+
+
+class FakeWebSocket:
+    """送信内容とクローズを記録するWebSocket"""
+
+    def __init__(self, events):
+        self.events = events
+        self.sent = []
+        self.close_code = None
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+        self.events.append("closed")
+
+
+def _manager(events, users=3):
+    manager = ConnectionManager()
+    manager.active_connections = {user_id: FakeWebSocket(events) for user_id in range(1, users + 1)}
+    manager.room_connections = {1: set(manager.active_connections)}
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_drain_notifies_and_closes_connections():
+    """再接続の遅延を範囲内で通知し、1012で閉じる"""
+    manager = _manager([])
+
+    summary = await manager.drain(1.0, reconnect_min_seconds=2.0, reconnect_max_seconds=5.0)
+
+    assert manager.draining
+    assert summary == {"connections": 3, "notified": True, "flushed": True, "in_flight": 0}
+    for websocket in manager.active_connections.values():
+        assert [message["type"] for message in websocket.sent] == ["server_restart"]
+        assert 2000 <= websocket.sent[0]["payload"]["reconnect_after_ms"] <= 5000
+        assert websocket.close_code == 1012
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_in_flight_messages():
+    """処理中のメッセージが終わってから接続を閉じる"""
+    events = []
+    manager = _manager(events, users=1)
+
+    async def handle_message():
+        with manager.track_in_flight():
+            await asyncio.sleep(0.05)
+            events.append("written")
+
+    handler = asyncio.create_task(handle_message())
+    await asyncio.sleep(0)
+    summary = await manager.drain(1.0, 0.0, 0.0)
+    await handler
+
+    assert summary["flushed"]
+    assert events == ["written", "closed"]
+
+
+@pytest.mark.asyncio
+async def test_drain_is_bounded_by_timeout():
+    """処理中のメッセージが終わらなくても期限で接続を閉じる"""
+    events = []
+    manager = _manager(events, users=1)
+    loop = asyncio.get_running_loop()
+
+    with manager.track_in_flight():
+        started = loop.time()
+        summary = await manager.drain(0.1, 0.0, 0.0)
+
+    assert loop.time() - started < 1.0
+    assert summary["flushed"] is False
+    assert summary["in_flight"] == 1
+    assert events == ["closed"]
+
+
+def test_new_connections_refused_while_draining():
+    """ドレイン中の新しい接続は認証の前に1012で断る"""
+    connection_manager.draining = True
+    try:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            with TestClient(app).websocket_connect("/ws/chat?token=invalid&room_id=1"):
+                pass
+        assert excinfo.value.code == 1012
+    finally:
+        reset_drain()
+
+
+@pytest.mark.asyncio
+async def test_signal_drains_before_original_handler():
+    """SIGTERMではドレインの完了後に元のハンドラ（サーバーの終了処理）を呼ぶ"""
+    calls = []
+    finished = asyncio.Event()
+
+    def exit_handler(signum, frame):
+        calls.append("exit")
+        finished.set()
+
+    original = signal.signal(signal.SIGTERM, exit_handler)
+
+    async def drain():
+        await asyncio.sleep(0.01)
+        calls.append("drained")
+
+    uninstall = install_drain_on_signal(drain)
+    try:
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(finished.wait(), timeout=5)
+    finally:
+        uninstall()
+        restored = signal.getsignal(signal.SIGTERM)
+        signal.signal(signal.SIGTERM, original)
+
+    assert calls == ["drained", "exit"]
+    assert restored is exit_handler
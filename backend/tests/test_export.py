@@ -0,0 +1,103 @@
+"""
+Tests for NDJSON room history export
+"""
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.chat.archive_service import ArchiveService
+from backend.chat.chat_service import ChatService
+from backend.chat.export_service import ExportService, gzip_stream
+from tests.conftest import create_room, create_user
+from tests.test_archive import _age_messages
+
+
+async def _collect(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+
+@pytest.mark.asyncio
+async def test_export_streams_cold_and_hot_in_order(db, db_engine):
+    """アーカイブ済みとホットのメッセージが古い順に1行ずつ出力される"""
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    other = await create_room(db, "other", alice)
+
+    old_ids = [
+        (await ChatService.save_message(db, f"old {i}", alice.id, room.id)).id for i in range(4)
+    ]
+    new_ids = [
+        (await ChatService.save_message(db, f"new {i} 日本語", alice.id, room.id)).id
+        for i in range(5)
+    ]
+    await ChatService.save_message(db, "elsewhere", alice.id, other.id)
+    await _age_messages(db, old_ids, days=120)
+    await ArchiveService.archive_older_than(
+        db, datetime.now(timezone.utc) - timedelta(days=90), batch_size=3
+    )
+
+    body = await _collect(
+        ExportService.iter_room_ndjson(session_factory, room.id, batch_size=2)
+    )
+    records = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+
+    assert [r["id"] for r in records] == old_ids + new_ids
+    assert records[0]["user"]["username"] == "alice"
+    assert records[-1]["content"] == "new 4 日本語"
+
+    # 期間指定（since以上、until未満）
+    since = datetime.now(timezone.utc) - timedelta(days=1)
+    body = await _collect(ExportService.iter_room_ndjson(session_factory, room.id, since=since))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == new_ids
+
+    until = datetime.now(timezone.utc) - timedelta(days=90)
+    body = await _collect(ExportService.iter_room_ndjson(session_factory, room.id, until=until))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == old_ids
+
+
+@pytest.mark.asyncio
+async def test_export_interleaves_pinned_ancestors_and_applies_offsets(db, db_engine):
+    """ホットに残る返信元とアーカイブ済みの行がID順に並び、UTC以外の期間指定も正しく絞り込む"""
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    lonely = await ChatService.save_message(db, "lonely", alice.id, room.id)
+    reply = await ChatService.save_message(db, "reply", alice.id, room.id, parent_id=root.id)
+    await _age_messages(db, [root.id, lonely.id, reply.id], days=120)
+    recent = await ChatService.save_message(db, "recent", alice.id, room.id, parent_id=reply.id)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=90)
+    assert await ArchiveService.archive_room(db, room.id, cutoff) == 1  # lonelyのみ
+
+    body = await _collect(ExportService.iter_room_ndjson(session_factory, room.id, batch_size=1))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == [
+        root.id, lonely.id, reply.id, recent.id
+    ]
+
+    # +09:00 の期間指定はUTCに直して比較する（ホット・アーカイブとも）
+    jst = timezone(timedelta(hours=9))
+    until = (datetime.now(timezone.utc) - timedelta(days=1)).astimezone(jst)
+    body = await _collect(ExportService.iter_room_ndjson(session_factory, room.id, until=until))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == [root.id, lonely.id, reply.id]
+    since = (datetime.now(timezone.utc) - timedelta(hours=2)).astimezone(jst)
+    body = await _collect(ExportService.iter_room_ndjson(session_factory, room.id, since=since))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == [recent.id]
+
+
+@pytest.mark.asyncio
+async def test_gzip_stream_round_trip():
+    """gzip_streamの出力はgzipとして展開できる"""
+
+    async def chunks():
+        for i in range(100):
+            yield f'{{"id":{i}}}\n'.encode()
+
+    compressed = await _collect(gzip_stream(chunks()))
+    lines = gzip.decompress(compressed).splitlines()
+    assert len(lines) == 100
+    assert json.loads(lines[-1]) == {"id": 99}
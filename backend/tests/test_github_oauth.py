@@ -0,0 +1,82 @@
+"""
+Tests for the shared GitHub HTTP client
+"""
+import httpx
+import pytest
+import pytest_asyncio
+
+from backend.auth.github_oauth import GitHubOAuthService
+
+
+@pytest_asyncio.fixture
+async def github_requests():
+    """モックのGitHubに向けた共有クライアントと、受けたリクエストのパス一覧"""
+    paths = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if request.url.path == "/login/oauth/access_token":
+            return httpx.Response(200, json={"access_token": "gho_test"})
+        token = request.headers["Authorization"].removeprefix("token ")
+        if request.url.path == "/user":
+            email = "public@example.com" if token == "public" else None
+            return httpx.Response(200, json={"id": 7, "login": "octocat", "email": email})
+        if request.url.path == "/user/emails":
+            if token == "malformed":
+                return httpx.Response(200, json={"message": "not a list"})
+            return httpx.Response(
+                200,
+                json=[
+                    "unexpected",
+                    {"email": "secondary@example.com", "primary": False},
+                    {"email": "octocat@example.com", "primary": True},
+                ],
+            )
+        return httpx.Response(404)
+
+    await GitHubOAuthService.close_client()
+    client = GitHubOAuthService.open_client(transport=httpx.MockTransport(handler))
+    yield paths
+    await GitHubOAuthService.close_client()
+    assert client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_login_uses_shared_client(github_requests):
+    """クライアントは共有され、/user/emails はメールアドレスが非公開の場合だけ呼ぶ"""
+    paths = github_requests
+
+    token = await GitHubOAuthService.exchange_code_for_token("code", "http://localhost/callback")
+    assert token == "gho_test"
+    shared = GitHubOAuthService.get_client()
+
+    user = await GitHubOAuthService.get_user_info(token)
+    assert user.login == "octocat"
+    assert user.email == "octocat@example.com"
+    assert paths[1:] == ["/user", "/user/emails"]
+    assert GitHubOAuthService.get_client() is shared
+
+    paths.clear()
+    user = await GitHubOAuthService.get_user_info("public")
+    assert user.email == "public@example.com"
+    assert paths == ["/user"]
+
+    # 形式が不正なメール一覧はメールアドレス無しとして扱う
+    user = await GitHubOAuthService.get_user_info("malformed")
+    assert user.login == "octocat" and user.email is None
+
+
+@pytest.mark.asyncio
+async def test_invalid_user_response_returns_none():
+    """ユーザー情報のJSONが壊れていればNoneを返し、メールは取得しない"""
+    paths = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        if request.url.path == "/user/emails":
+            return httpx.Response(200, json=[])
+        return httpx.Response(200, content=b"<html>not json</html>")
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        assert await GitHubOAuthService.get_user_info("gho_test", client=client) is None
+    assert paths == ["/user"]
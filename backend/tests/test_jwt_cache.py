@@ -0,0 +1,59 @@
+"""
+Tests for the verified-token cache
+"""
+import hashlib
+import time
+from datetime import timedelta
+
+from backend.auth import jwt_utils
+from backend.auth.jwt_utils import JWTManager, TokenData, token_cache
+from backend.config import settings
+
+
+def _token(user_id: int, expires_delta=None) -> str:
+    data = TokenData(user_id=user_id, github_id=user_id, username=f"user{user_id}")
+    return JWTManager.create_access_token(data, expires_delta)
+
+
+def test_verified_token_is_cached_until_exp():
+    """検証済みトークンはキャッシュされ、期限はトークンのexpを超えない"""
+    token = _token(101, timedelta(seconds=5))
+    hits = token_cache.stats()["hits"]
+
+    first = JWTManager.verify_token(token)
+    second = JWTManager.verify_token(token)
+    assert first == second and first.user_id == 101
+    assert token_cache.stats()["hits"] == hits + 1
+
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    expires_at, _ = token_cache._entries[key]
+    assert expires_at - time.monotonic() <= 5
+
+    # 期限切れ・改ざんされたトークンは拒否され、キャッシュもされない
+    assert JWTManager.verify_token(_token(102, timedelta(seconds=-1))) is None
+    assert JWTManager.verify_token(token[:-2] + "xx") is None
+
+
+def test_revoke_user_tokens():
+    """失効したユーザーのトークンはキャッシュ済みでも拒否される"""
+    token = _token(103)
+    other = _token(104)
+    assert JWTManager.verify_token(token) is not None
+    assert JWTManager.verify_token(other) is not None
+
+    JWTManager.revoke_user_tokens(103)
+
+    assert JWTManager.verify_token(token) is None
+    assert JWTManager.verify_token(other) is not None
+
+
+def test_expired_revocations_are_pruned(monkeypatch):
+    """有効期限より前の失効は次の失効時に取り除かれる"""
+    JWTManager.revoke_user_tokens(105)
+    assert 105 in jwt_utils._revoked_before
+
+    later = time.time() + settings.access_token_expire_minutes * 60 + 5
+    monkeypatch.setattr(jwt_utils.time, "time", lambda: later)
+    JWTManager.revoke_user_tokens(106)
+    assert 105 not in jwt_utils._revoked_before
+    assert 106 in jwt_utils._revoked_before
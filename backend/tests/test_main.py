@@ -1,8 +1,14 @@
 """
 Tests for main FastAPI application
 """
+import os
+import subprocess
+import sys
+
 import pytest
 from fastapi.testclient import TestClient
+
+import backend
 from backend.main import app
 
 client = TestClient(app)
@@ -36,8 +42,24 @@ def test_api_status():
     # 機能フラグの確認
     features = data["features"]
     assert features["chat"] is True
-    assert features["voice_call"] is False
-    assert features["timeline"] is False
+    assert features["voice_call"] is True
+    assert features["timeline"] is True
     assert features["latex_support"] is False
     assert features["code_highlight"] is False
-    assert features["github_auth"] is True
\ No newline at end of file
+    assert features["github_auth"] is True
+
+
+def test_import_defers_engines_and_http_client():
+    """インポートではエンジンを作らず、DBドライバとhttpxを読み込まない（起動を速くするため）"""
+    code = (
+        "import sys, backend.main, backend.models.base as base; "
+        "assert base._engines is None; "
+        "loaded = [name for name in ('aiosqlite', 'asyncpg', 'httpx') if name in sys.modules]; "
+        "assert not loaded, loaded; "
+        "base.AsyncReadSessionLocal(); "
+        "assert base._engines is not None"
+    )
+    src_dir = os.path.dirname(os.path.dirname(backend.__file__))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([src_dir, os.environ.get("PYTHONPATH", "")])}
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
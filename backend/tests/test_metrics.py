@@ -0,0 +1,101 @@
+"""
+Tests for the Prometheus-style metrics
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from backend.chat.websocket_manager import ConnectionManager
+from backend.main import app
+from backend.metrics import (
+    Counter,
+    Histogram,
+    broadcast_fanout,
+    db_pool_wait,
+    db_query_latency,
+    instrument_engine,
+    render_metrics,
+    statement_labels,
+    ws_connects,
+)
+from backend.models.user import User
+from backend.profiling import profile_queries
+from tests.conftest import create_user
+
+
+class FakeWebSocket:
+    """送信内容を記録するWebSocket"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def test_exposition_format():
+    """カウンタとヒストグラムをテキスト形式で出力する"""
+    # グローバルレジストリに登録せず /metrics に残さない
+    counter = Counter("test_events", "Events", ["code"], register=False)
+    counter.inc(code=1000)
+    counter.inc(2, code=1000)
+    histogram = Histogram(
+        "test_latency_seconds", "Latency", buckets=(0.1, 1.0), register=False
+    )
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    lines = counter.render() + histogram.render()
+    assert "test_events" not in render_metrics()
+    assert 'test_events_total{code="1000"} 3' in lines
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 3' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "test_latency_seconds_count 4" in lines
+    assert statement_labels("SELECT (SELECT 1 FROM a) AS x FROM chat_rooms") == ("SELECT", "chat_rooms")
+
+
+@pytest.mark.asyncio
+async def test_db_and_websocket_metrics(db, db_engine):
+    """クエリ・接続取得・ブロードキャストが記録され /metrics に出る"""
+    instrument_engine(db_engine, "test")
+    await create_user(db, "alice", 1)
+    await db.close()
+    selects = db_query_latency.count(engine="test", operation="SELECT", table="users")
+    await db.execute(select(User))
+    assert db_query_latency.count(engine="test", operation="SELECT", table="users") == selects + 1
+    assert db_query_latency.count(engine="test", operation="INSERT", table="users") == 1
+    assert db_pool_wait.count(engine="test") >= 1
+
+    # プロファイラと同じイベントで1回だけ測り、両方に同じ時間を渡す
+    instrument_engine(db_engine, "test")
+    assert len(db_engine.sync_engine.dispatch.after_cursor_execute) == 1
+    seconds = db_query_latency.sum(engine="test", operation="SELECT", table="users")
+    with profile_queries("metrics", log=False) as profile:
+        await db.execute(select(User))
+    assert profile.count == 1
+    assert db_query_latency.sum(
+        engine="test", operation="SELECT", table="users"
+    ) == pytest.approx(seconds + profile.total_seconds)
+
+    manager = ConnectionManager()
+    connects = ws_connects.value()
+    recipients = broadcast_fanout.sum(event="ping")
+    sockets = [FakeWebSocket() for _ in range(3)]
+    for index, websocket in enumerate(sockets):
+        user = User(id=index + 1, username=f"u{index}")
+        await manager.connect(websocket, user, room_id=1)
+    await manager.broadcast_to_room(1, {"type": "ping"}, exclude_user=1)
+
+    assert ws_connects.value() == connects + 3
+    assert broadcast_fanout.sum(event="ping") == recipients + 2
+    assert len(sockets[1].sent) == 2  # user_joined（3人目）+ ping
+
+    body = TestClient(app).get("/metrics")
+    assert body.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "lunir_websocket_connects_total" in body.text
+    assert 'lunir_db_query_seconds_count{engine="test",operation="SELECT",table="users"}' in body.text
@@ -0,0 +1,96 @@
+"""
+Tests for the SQL query profiler and query budgets
+"""
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.auth.dependencies import get_current_user
+from backend.auth.user_service import UserService
+from backend.chat.chat_service import ChatService
+from backend.chat.rest_router import router
+from backend.models.base import get_read_db
+from backend.profiling import QueryProfilerMiddleware, profile_queries, statement_shape
+from tests.conftest import create_room, create_user, query_budget
+
+
+@pytest.mark.asyncio
+async def test_hot_read_paths_stay_within_query_budget(db):
+    """ルーム一覧・詳細・履歴のクエリ数はメンバー数やメッセージ数に依存しない"""
+    users = [await create_user(db, f"user{i}", i) for i in range(1, 8)]
+    room = await create_room(db, "room", *users)
+    for index, user in enumerate(users):
+        await ChatService.save_message(db, f"hello {index}", user.id, room.id)
+
+    with query_budget(1):
+        rooms = await ChatService.get_user_rooms(db, users[0].id)
+    assert rooms[0].member_count == 7
+
+    with query_budget(2):
+        await ChatService.get_room_detail(db, room.id)
+        await ChatService.get_room_members(db, room.id)
+
+    # 本文 + アーカイブの水位
+    with query_budget(2):
+        rows = await ChatService.get_room_message_rows(db, room.id)
+    assert len(rows) == 7
+
+    # メンバーシップはキャッシュされるため2回目はクエリ無し
+    await ChatService.is_user_in_room(db, users[0].id, room.id)
+    with query_budget(0):
+        assert await ChatService.is_user_in_room(db, users[0].id, room.id)
+
+    with pytest.raises(AssertionError, match="query budget exceeded"):
+        with query_budget(1):
+            await ChatService.get_room_detail(db, room.id)
+            await ChatService.get_room_members(db, room.id)
+
+
+@pytest.mark.asyncio
+async def test_profiler_flags_repeated_selects(db, caplog):
+    """同じ形のSELECTの繰り返しをN+1の疑いとしてログに出す"""
+    users = [await create_user(db, f"user{i}", i) for i in range(1, 7)]
+
+    with caplog.at_level(logging.WARNING, logger="backend.profiling"):
+        with profile_queries("loop") as profile:
+            for user in users:
+                await UserService.get_user_by_id(db, user.id)
+
+    assert profile.count == 6
+    assert profile.total_seconds > 0
+    [(shape, count)] = profile.repeated()
+    assert count == 6 and shape.startswith("SELECT") and "FROM users" in shape
+    assert "Possible N+1 in loop: 6x" in caplog.text
+
+    # IN句のパラメータ数が違っても同じ形として数える
+    assert statement_shape("SELECT * FROM t WHERE id IN (?, ?,\n ?)") == statement_shape(
+        "SELECT * FROM t WHERE id IN ($1, $2)"
+    ) == "SELECT * FROM t WHERE id IN (?, ...)"
+
+
+@pytest.mark.asyncio
+async def test_middleware_reports_server_timing(db, db_engine):
+    """HTTPリクエストごとのクエリ数がServer-Timingヘッダで返る"""
+    alice = await create_user(db, "alice", 1)
+    await create_room(db, "room", alice)
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def read_db():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(QueryProfilerMiddleware)
+    app.dependency_overrides[get_read_db] = read_db
+    app.dependency_overrides[get_current_user] = lambda: alice
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/api/v1/rooms")
+
+    assert response.status_code == 200
+    assert response.headers["server-timing"].endswith('desc="2 queries"')
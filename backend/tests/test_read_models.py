@@ -0,0 +1,101 @@
+"""
+Tests for projected read models used by hot REST responses
+"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.chat.archive_service import ArchiveService
+from backend.chat.chat_service import ChatService
+from backend.chat.read_models import (
+    encode_message_rows,
+    message_row_fields,
+    room_detail_fields,
+    room_summary_fields,
+    thread_reply_fields,
+)
+from backend.chat.rest_router import (
+    MessageResponse,
+    RoomResponse,
+    ThreadReplyResponse,
+    ThreadResponse,
+)
+from tests.conftest import create_room, create_user
+from tests.test_archive import _age_messages
+
+
+@pytest.mark.asyncio
+async def test_message_rows_encode_same_json_as_response_model(db):
+    """列の射影から作るJSONがMessageResponseのスキーマどおりで、アーカイブ済みの行も同じ形になる"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice, bob)
+
+    old_ids = [
+        (await ChatService.save_message(db, f"old {i} $x^{i}$", alice.id, room.id)).id
+        for i in range(3)
+    ]
+    root = await ChatService.save_message(db, "```py\nprint('日本語')\n```", bob.id, room.id)
+    reply = await ChatService.save_message(db, "reply", alice.id, room.id, parent_id=root.id)
+    await _age_messages(db, old_ids, days=120)
+    await ArchiveService.archive_older_than(db, datetime.now(timezone.utc) - timedelta(days=90))
+
+    # ホットのみ・ホットとアーカイブをまたぐ・アーカイブのみのページ
+    expected_ids = {
+        (50, None): old_ids + [root.id, reply.id],
+        (3, None): [old_ids[2], root.id, reply.id],
+        (2, root.id): old_ids[1:],
+    }
+    for limit, before_id in expected_ids:
+        rows = await ChatService.get_room_message_rows(db, room.id, limit, before_id)
+        expected = [
+            MessageResponse(**message_row_fields(row)).model_dump(mode="json") for row in rows
+        ]
+        assert json.loads(encode_message_rows(rows)) == expected
+        assert [row.id for row in rows] == expected_ids[limit, before_id]
+
+    archived = await ChatService.get_room_message_rows(db, room.id, 1, root.id)
+    archived = json.loads(encode_message_rows(archived))
+    assert archived[0]["segments"] == [["text", "old 2 "], ["math", "x^2"]]
+    assert archived[0]["user"]["username"] == "alice"
+
+    rows = await ChatService.get_room_message_rows(db, room.id)
+    assert len(rows) == 5
+    assert rows[-2].reply_count == 1
+    assert "日本語".encode() in encode_message_rows(rows)
+
+
+@pytest.mark.asyncio
+async def test_room_and_thread_rows_match_public_schema(db):
+    """ルーム一覧・詳細・スレッドの行がレスポンススキーマを満たす"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice, bob)
+    solo = await create_room(db, "solo", alice)
+    await create_room(db, "elsewhere", bob)
+
+    rooms = await ChatService.get_user_rooms(db, alice.id)
+    summaries = [RoomResponse(**room_summary_fields(row)) for row in rooms]
+    assert [(r.id, r.member_count) for r in summaries] == [(room.id, 2), (solo.id, 1)]
+
+    detail = room_detail_fields(
+        await ChatService.get_room_detail(db, room.id),
+        await ChatService.get_room_members(db, room.id),
+    )
+    assert [(m["username"], m["role"]) for m in detail["members"]] == [
+        ("alice", "admin"),
+        ("bob", "member"),
+    ]
+    assert await ChatService.get_room_detail(db, 9999) is None
+
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    reply = await ChatService.save_message(db, "reply", bob.id, room.id, parent_id=root.id)
+    replies, has_more = await ChatService.get_thread_replies(db, root.id)
+    thread = ThreadResponse(
+        root=MessageResponse(**message_row_fields(await ChatService.get_message_row(db, root.id))),
+        replies=[ThreadReplyResponse(**thread_reply_fields(row, depth)) for row, depth in replies],
+        has_more=has_more,
+    )
+    assert thread.root.reply_count == 1
+    assert [(r.id, r.depth, r.user["username"]) for r in thread.replies] == [(reply.id, 1, "bob")]
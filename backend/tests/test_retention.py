@@ -0,0 +1,204 @@
+"""
+Tests for batched retention and purge jobs
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select, update
+
+from backend.auth.user_service import UserService
+from backend.chat.archive_service import ArchiveService, decode_segment
+from backend.chat.chat_service import ChatService
+from backend.chat.retention_service import RetentionService
+from backend.chat.search_service import SearchService
+from backend.models.chat_room import RoomMember
+from backend.models.message import Message
+from backend.models.message_archive import MessageArchiveSegment
+from backend.models.user import User
+from tests.conftest import create_room, create_user
+from tests.test_archive import _age_messages
+
+
+@pytest.mark.asyncio
+async def test_room_retention_deletes_in_batches(db):
+    """保持期間を過ぎたメッセージだけがバッチ単位で削除され、返信は切り離される"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    kept_room = await create_room(db, "kept", alice)
+
+    old = [
+        (await ChatService.save_message(db, f"expired {i}", alice.id, room.id)).id
+        for i in range(5)
+    ]
+    reply = await ChatService.save_message(db, "expired reply", alice.id, room.id, parent_id=old[0])
+    fresh_reply = await ChatService.save_message(
+        db, "fresh reply", alice.id, room.id, parent_id=old[1]
+    )
+    untouched = await ChatService.save_message(db, "expired elsewhere", alice.id, kept_room.id)
+    await _age_messages(db, old + [reply.id, untouched.id], days=40)
+
+    assert await ChatService.set_room_retention(db, room.id, 30)
+    report = await RetentionService.apply_retention(db, batch_size=2, pause_seconds=0)
+
+    assert report.deleted == 6
+    assert report.batches == 3
+    assert report.max_lock_seconds > 0
+
+    remaining = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [m.id for m in remaining] == [fresh_reply.id, untouched.id]
+    await db.refresh(remaining[0])
+    assert remaining[0].parent_id is None
+
+    # 削除済みメッセージは検索にも出ない
+    assert await SearchService.search_messages(db, alice.id, "expired", room_id=room.id) == []
+
+
+@pytest.mark.asyncio
+async def test_purge_keeps_parent_reply_counts(db):
+    """返信を削除した場合は残る親の返信数を数え直す"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice, bob)
+
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    await ChatService.save_message(db, "bob reply", bob.id, room.id, parent_id=root.id)
+    await ChatService.save_message(db, "alice reply", alice.id, room.id, parent_id=root.id)
+
+    old = datetime.now(timezone.utc) - timedelta(days=60)
+    await db.execute(
+        update(User).where(User.id == bob.id).values(is_active=False, deactivated_at=old)
+    )
+    await db.commit()
+
+    report = await RetentionService.purge_deactivated_users(db, pause_seconds=0)
+    assert report.deleted == 1
+
+    await db.refresh(root)
+    assert root.reply_count == 1
+    memberships = (
+        await db.execute(select(func.count(RoomMember.id)).where(RoomMember.user_id == bob.id))
+    ).scalar()
+    assert memberships == 0
+
+
+@pytest.mark.asyncio
+async def test_retention_drops_expired_archive_segments(db):
+    """セグメント全体が保持期間を過ぎたアーカイブは削除される"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    ids = [(await ChatService.save_message(db, f"m {i}", alice.id, room.id)).id for i in range(3)]
+    await _age_messages(db, ids, days=400)
+    await ArchiveService.archive_older_than(db, datetime.now(timezone.utc) - timedelta(days=90))
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=365)
+    report = await RetentionService.purge_room(db, room.id, cutoff, pause_seconds=0)
+
+    assert report.archive_segments == 1
+    assert (await db.execute(select(func.count(MessageArchiveSegment.id)))).scalar() == 0
+
+
+@pytest.mark.asyncio
+async def test_retention_rewrites_partly_expired_archive_segments(db):
+    """同じ月のセグメントでも保持期間を過ぎたメッセージだけを取り除き、履歴にも出さない"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    room_id = room.id
+
+    hot_root = await ChatService.save_message(db, "hot root", alice.id, room.id)
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    early_reply = await ChatService.save_message(db, "early", alice.id, room.id, parent_id=root.id)
+    kept = await ChatService.save_message(db, "kept", alice.id, room.id)
+    late_reply = await ChatService.save_message(db, "late", alice.id, room.id, parent_id=root.id)
+    cold_reply = await ChatService.save_message(
+        db, "cold reply", alice.id, room.id, parent_id=hot_root.id
+    )
+    hot_reply = await ChatService.save_message(
+        db, "hot reply", alice.id, room.id, parent_id=hot_root.id
+    )
+    days = {
+        hot_root.id: 2, root.id: 5, early_reply.id: 10,
+        kept.id: 20, late_reply.id: 25, cold_reply.id: 28,
+    }
+    ids = {name: message.id for name, message in [
+        ("hot_root", hot_root), ("kept", kept), ("late_reply", late_reply),
+        ("cold_reply", cold_reply), ("hot_reply", hot_reply),
+    ]}
+    for message_id, day in days.items():
+        await db.execute(
+            update(Message)
+            .where(Message.id == message_id)
+            .values(created_at=datetime(2026, 1, day, tzinfo=timezone.utc))
+        )
+    await db.commit()
+    db.expire_all()
+    # hot root は hot reply の返信元としてホットに残る
+    await ArchiveService.archive_older_than(db, datetime(2026, 6, 1, tzinfo=timezone.utc))
+    segments = (await db.execute(select(MessageArchiveSegment))).scalars().all()
+    assert [segment.message_count for segment in segments] == [5]
+
+    cutoff = datetime(2026, 1, 15, tzinfo=timezone.utc)
+    report = await RetentionService.purge_room(db, room_id, cutoff, pause_seconds=0)
+    assert report.deleted == 3
+    assert report.archive_segments == 1
+
+    db.expire_all()
+    segments = (await db.execute(select(MessageArchiveSegment))).scalars().all()
+    rows = {row["id"]: row for segment in segments for row in decode_segment(segment)}
+    assert set(rows) == {ids["kept"], ids["late_reply"], ids["cold_reply"]}
+    assert rows[ids["late_reply"]]["parent_id"] is None
+    assert rows[ids["cold_reply"]]["parent_id"] is None
+    assert segments[0].min_created_at.day == 20
+
+    history = await ChatService.get_room_message_rows(db, room_id)
+    assert [row.id for row in history] == [
+        ids["kept"], ids["late_reply"], ids["cold_reply"], ids["hot_reply"]
+    ]
+    assert history[-1].parent_id is None
+
+
+@pytest.mark.asyncio
+async def test_purge_deactivated_user_rewrites_archive_segments(db):
+    """無効ユーザーのアーカイブ済みメッセージもセグメントから削除し、返信を切り離す"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    room = await create_room(db, "room", alice, bob)
+
+    bob_root = await ChatService.save_message(db, "bob root", bob.id, room.id)
+    alice_reply = await ChatService.save_message(
+        db, "alice reply", alice.id, room.id, parent_id=bob_root.id
+    )
+    alice_root = await ChatService.save_message(db, "alice root", alice.id, room.id)
+    await ChatService.save_message(db, "bob reply", bob.id, room.id, parent_id=alice_root.id)
+    bob_only = await ChatService.save_message(db, "bob only", bob.id, room.id)
+    bob_id, alice_reply_id, alice_root_id = bob.id, alice_reply.id, alice_root.id
+    old_ids = [bob_root.id, alice_reply_id, alice_root_id, alice_root_id + 1, bob_only.id]
+    await _age_messages(db, old_ids, days=120)
+    db.expire_all()
+    await ArchiveService.archive_older_than(
+        db, datetime.now(timezone.utc) - timedelta(days=90), batch_size=4
+    )
+    assert (await db.execute(select(func.count(Message.id)))).scalar() == 0
+
+    await UserService.deactivate_user(db, bob_id)
+    assert (await db.execute(select(User.deactivated_at).where(User.id == bob_id))).scalar()
+    # 基準は updated_at ではなく無効化日時（無効化後に行が更新されても先送りされない）
+    await db.execute(
+        update(User)
+        .where(User.id == bob_id)
+        .values(deactivated_at=datetime.now(timezone.utc) - timedelta(days=60))
+    )
+    await db.commit()
+
+    report = await RetentionService.purge_deactivated_users(db, pause_seconds=0)
+    assert report.deleted == 3
+
+    segments = (await db.execute(select(MessageArchiveSegment))).scalars().all()
+    rows = {row["id"]: row for segment in segments for row in decode_segment(segment)}
+    assert set(rows) == {alice_reply_id, alice_root_id}
+    assert rows[alice_reply_id]["parent_id"] is None
+    assert rows[alice_root_id]["reply_count"] == 0
+    assert sum(segment.message_count for segment in segments) == 2
+
+    # 削除し終えたユーザーは次回の対象にならない
+    report = await RetentionService.purge_deactivated_users(db, pause_seconds=0)
+    assert report.batches == 0
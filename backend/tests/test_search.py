@@ -0,0 +1,139 @@
+"""
+Tests for full-text message search
+"""
+import pytest
+from sqlalchemy import text
+
+from backend.chat.chat_service import ChatService
+from backend.chat.search_service import SearchService, build_match_query, make_snippet
+from tests.conftest import create_room, create_user, requires_sqlite
+
+
+def test_build_match_query_quotes_terms():
+    """検索語はフレーズとしてクオートされる"""
+    assert build_match_query(['foo"bar', "useEffect"]) == '"foo""bar" AND "useEffect"'
+
+
+def test_make_snippet_escapes_content():
+    """本文はHTMLエスケープされ、ハイライトの<mark>タグだけが残る"""
+    snippet = make_snippet('<img src=x onerror="alert(1)"> mark me', ["mark", "img"])
+    assert snippet == (
+        "&lt;<mark>img</mark> src=x onerror=&quot;alert(1)&quot;&gt; <mark>mark</mark> me"
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_is_scoped_to_member_rooms(db):
+    """参加しているルームのメッセージのみがヒットする"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    shared = await create_room(db, "shared", alice, bob)
+    private = await create_room(db, "private", bob)
+
+    await ChatService.save_message(db, "useEffect の依存配列について", alice.id, shared.id)
+    await ChatService.save_message(db, "useEffect secret", bob.id, private.id)
+
+    results = await SearchService.search_messages(db, alice.id, "useEffect")
+    assert [r["room_id"] for r in results] == [shared.id]
+    assert "<mark>useEffect</mark>" in results[0]["snippet"]
+
+    # 日本語の部分一致
+    results = await SearchService.search_messages(db, alice.id, "依存配列")
+    assert len(results) == 1
+
+    # インデックスで引けない短い語
+    results = await SearchService.search_messages(db, alice.id, "配列")
+    assert len(results) == 1
+
+
+@requires_sqlite
+@pytest.mark.asyncio
+async def test_fts_snippet_escapes_content(db):
+    """FTS5のスニペットも本文をHTMLエスケープする"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    await ChatService.save_message(db, "<script>alert('useEffect')</script>", alice.id, room.id)
+
+    snippet = (await SearchService.search_messages(db, alice.id, "useEffect"))[0]["snippet"]
+    assert snippet.startswith("&lt;script&gt;alert(&#x27;<mark>useEffect</mark>&#x27;)")
+    assert "<script" not in snippet
+
+    # 目印に使う文字を含む本文でも<mark>の対応が崩れない
+    await ChatService.save_message(db, "\ue001\x03 stray\ue000 markers", alice.id, room.id)
+    snippet = (await SearchService.search_messages(db, alice.id, "stray"))[0]["snippet"]
+    assert snippet == "\x03 <mark>stray</mark> markers"
+
+
+@requires_sqlite
+@pytest.mark.asyncio
+async def test_reindex_rebuilds_from_messages(db):
+    """reindexで全メッセージが一度ずつ再登録され、その後の削除もインデックスに反映される"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    messages = [
+        await ChatService.save_message(db, f"message number {i}", alice.id, room.id)
+        for i in range(7)
+    ]
+
+    await db.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')"))
+    await db.commit()
+    assert await SearchService.search_messages(db, alice.id, "number") == []
+
+    progress = []
+    total = await SearchService.reindex(
+        db, batch_size=3, on_progress=lambda indexed, _: progress.append(indexed)
+    )
+    assert total == 7
+    assert progress == [3, 6, 7]
+    # トリガーで登録済みの行を含めて再構築しても二重に登録されない
+    assert await SearchService.reindex(db, batch_size=3) == 7
+    assert len(await SearchService.search_messages(db, alice.id, "number", limit=50)) == 7
+
+    await db.delete(messages[0])
+    await db.commit()
+    assert len(await SearchService.search_messages(db, alice.id, "number", limit=50)) == 6
+    await db.execute(text("INSERT INTO messages_fts(messages_fts, rank) VALUES ('integrity-check', 1)"))
+
+
+@requires_sqlite
+@pytest.mark.asyncio
+async def test_reindex_keeps_writes_made_between_batches(db, monkeypatch):
+    """バッチの合間の追加・更新・削除が、登録済みかどうかに関わらず一度ずつ反映される"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    messages = [
+        await ChatService.save_message(db, f"message number {i}", alice.id, room.id)
+        for i in range(6)
+    ]
+    index_range = SearchService._index_range
+    calls, added = [], []
+
+    async def index_range_with_writes(db, last_id, upper_id):
+        calls.append(last_id)
+        if len(calls) == 2:
+            # 1バッチ目（3件）は登録済み、残りは未登録の状態で書き込む
+            added.append(await ChatService.save_message(db, "message number new", alice.id, room.id))
+            for message in (messages[0], messages[4]):
+                await db.execute(
+                    text("UPDATE messages SET content = 'edited text' WHERE id = :id"),
+                    {"id": message.id},
+                )
+            await db.execute(
+                text("DELETE FROM messages WHERE id IN (:a, :b)"),
+                {"a": messages[1].id, "b": messages[5].id},
+            )
+            await db.commit()
+        return await index_range(db, last_id, upper_id)
+
+    monkeypatch.setattr(SearchService, "_index_range", index_range_with_writes)
+    await SearchService.reindex(db, batch_size=3)
+    monkeypatch.undo()
+
+    found = await SearchService.search_messages(db, alice.id, "number", limit=50)
+    assert sorted(r["id"] for r in found) == [messages[2].id, messages[3].id, added[0].id]
+    assert len(await SearchService.search_messages(db, alice.id, "edited", limit=50)) == 2
+    await db.execute(text("INSERT INTO messages_fts(messages_fts, rank) VALUES ('integrity-check', 1)"))
+
+    # 通常のトリガーに戻っている
+    await ChatService.save_message(db, "message number after", alice.id, room.id)
+    assert len(await SearchService.search_messages(db, alice.id, "number", limit=50)) == 4
@@ -0,0 +1,68 @@
+"""
+Tests for the synthetic dataset generator and bulk loader
+"""
+from collections import Counter
+
+import pytest
+from sqlalchemy import func, select
+
+from backend.chat.content_parser import _parse
+from backend.chat.search_service import SearchService
+from backend.models.chat_room import RoomMember
+from backend.models.message import Message
+from backend.models.user import User
+from backend.seed import DatasetGenerator, SeedConfig, seed_database
+from tests.conftest import create_user
+
+
+def test_generator_is_deterministic_and_skewed():
+    """同じseedからは同じデータが生成され、ルーム規模は偏る"""
+    config = SeedConfig(users=200, rooms=20, messages=3000, seed=42)
+
+    def generate():
+        generator = DatasetGenerator(config)
+        generator.users()
+        generator.rooms()
+        return [row for batch in generator.messages(batch_size=500) for row in batch]
+
+    first, second = generate(), generate()
+    assert [(m["room_id"], m["content"]) for m in first] == [
+        (m["room_id"], m["content"]) for m in second
+    ]
+
+    per_room = Counter(m["room_id"] for m in first)
+    assert per_room[1] > 5 * per_room[20]
+
+    # 事前計算したセグメントは書き込み時の解析結果と一致する
+    for message in first:
+        assert tuple(message["segments"]) == _parse(message["content"])
+
+    ids = {m["id"] for m in first}
+    replies = [m for m in first if m["parent_id"] is not None]
+    assert replies and all(m["parent_id"] in ids and m["parent_id"] < m["id"] for m in replies)
+
+
+@pytest.mark.asyncio
+async def test_seed_database_bulk_loads(db, db_engine):
+    """一括投入後も返信数と検索インデックスが整合する"""
+    existing = await create_user(db, "existing", 1)
+
+    config = SeedConfig(users=50, rooms=5, messages=1000, seed=1)
+    report = await seed_database(db_engine, config, batch_size=300)
+    assert report["messages"]["rows"] == 1000
+
+    assert (await db.execute(select(func.count(User.id)))).scalar() == 51
+    assert (await db.execute(select(func.count(Message.id)))).scalar() == 1000
+
+    replies = (
+        await db.execute(select(func.count(Message.id)).where(Message.parent_id.is_not(None)))
+    ).scalar()
+    assert (await db.execute(select(func.sum(Message.reply_count)))).scalar() == replies
+
+    # 生成ユーザーとしてルームに参加させ、投入済みメッセージが検索できることを確認
+    user_id, room_id = (
+        await db.execute(select(RoomMember.user_id, RoomMember.room_id).limit(1))
+    ).one()
+    results = await SearchService.search_messages(db, user_id, "useEffect", room_id=room_id)
+    assert results
+    assert existing.id not in {r["user"]["id"] for r in results}
@@ -0,0 +1,57 @@
+"""
+Tests for message threads
+"""
+import pytest
+
+from backend.chat.chat_service import ChatService
+from tests.conftest import create_room, create_user
+
+
+@pytest.mark.asyncio
+async def test_reply_updates_parent_counters(db):
+    """返信保存時に親メッセージの返信数と最終返信日時が更新される"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    await ChatService.save_message(db, "reply 1", alice.id, room.id, parent_id=root.id)
+    await ChatService.save_message(db, "reply 2", alice.id, room.id, parent_id=root.id)
+
+    history = await ChatService.get_room_message_rows(db, room.id)
+    parent = next(m for m in history if m.id == root.id)
+    assert parent.reply_count == 2
+    assert parent.last_reply_at is not None
+
+
+@pytest.mark.asyncio
+async def test_reply_to_other_room_is_rejected(db):
+    """別ルームのメッセージには返信できない"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+    other = await create_room(db, "other", alice)
+    root = await ChatService.save_message(db, "root", alice.id, other.id)
+
+    with pytest.raises(ValueError):
+        await ChatService.save_message(db, "reply", alice.id, room.id, parent_id=root.id)
+
+
+@pytest.mark.asyncio
+async def test_thread_tree_with_keyset_pagination(db):
+    """ネストした返信ツリーを深さ付きでページ取得できる"""
+    alice = await create_user(db, "alice", 1)
+    room = await create_room(db, "room", alice)
+
+    root = await ChatService.save_message(db, "root", alice.id, room.id)
+    first = await ChatService.save_message(db, "first", alice.id, room.id, parent_id=root.id)
+    nested = await ChatService.save_message(db, "nested", alice.id, room.id, parent_id=first.id)
+    await ChatService.save_message(db, "unrelated", alice.id, room.id)
+    last = await ChatService.save_message(db, "last", alice.id, room.id, parent_id=root.id)
+
+    page, has_more = await ChatService.get_thread_replies(db, root.id, limit=2)
+    assert [(m.id, depth) for m, depth in page] == [(first.id, 1), (nested.id, 2)]
+    assert has_more
+    assert page[0][0].username == "alice"
+
+    page, has_more = await ChatService.get_thread_replies(db, root.id, limit=2, after_id=nested.id)
+    assert [(m.id, depth) for m, depth in page] == [(last.id, 1)]
+    assert not has_more
@@ -0,0 +1,224 @@
+"""
+Tests for the timeline post feed (fan-out-on-write / fan-out-on-read)
+"""
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.auth.dependencies import get_current_user
+from backend.config import settings
+from backend.models.base import get_db, get_read_db
+from backend.models.chat_room import RoomMember
+from backend.models.timeline import TimelineFeedEntry, TimelinePullAuthor, VisibilityType
+from backend.timeline.feed_service import FeedService
+from backend.timeline.router import router
+from tests.conftest import create_room, create_user, query_budget, requires_sqlite
+
+
+async def _feed_ids(db, user, limit=50, before_id=None):
+    rows, _ = await FeedService.get_feed_rows(db, user.id, limit, before_id)
+    return [row.id for row in rows]
+
+
+async def _read_all(db, user, limit):
+    """キーセットで最後までページングし、全ページの投稿IDを返す"""
+    ids, before_id = [], None
+    while True:
+        rows, has_more = await FeedService.get_feed_rows(db, user.id, limit, before_id)
+        ids.extend(row.id for row in rows)
+        if not has_more:
+            return ids
+        before_id = rows[-1].id
+
+
+@pytest.mark.asyncio
+async def test_posts_are_written_to_room_mates_feeds(db):
+    """ルームを共有するユーザーのフィードに書き込み、PRIVATEは投稿者のみ"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    carol = await create_user(db, "carol", 3)
+    await create_room(db, "room", alice, bob)
+    await create_room(db, "other", carol)
+
+    public = await FeedService.create_post(db, alice.id, "hello $x^2$")
+    private = await FeedService.create_post(
+        db, alice.id, "note to self", visibility=VisibilityType.PRIVATE
+    )
+
+    assert public.fanned_out and public.has_latex
+    assert await _feed_ids(db, alice) == [private.id, public.id]
+    assert await _feed_ids(db, bob) == [public.id]
+    assert await _feed_ids(db, carol) == []
+    entries = await db.execute(select(func.count()).select_from(TimelineFeedEntry))
+    assert entries.scalar_one() == 3
+
+
+@pytest.mark.asyncio
+async def test_feed_pages_are_read_with_keyset_pagination(db):
+    """ページごとに1クエリで、重複・欠落なく最後まで読める"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    await create_room(db, "room", alice, bob)
+    posts = [await FeedService.create_post(db, alice.id, f"post {i}") for i in range(5)]
+    await FeedService.get_pull_authors(db)
+
+    with query_budget(1, "feed page"):
+        rows, has_more = await FeedService.get_feed_rows(db, bob.id, 2)
+    assert [row.id for row in rows] == [posts[4].id, posts[3].id]
+    assert has_more
+    assert rows[0].username == "alice"
+
+    assert await _read_all(db, bob, 2) == [post.id for post in reversed(posts)]
+
+
+@pytest.mark.asyncio
+async def test_prolific_authors_fall_back_to_fan_out_on_read(db, monkeypatch):
+    """投稿の多い投稿者はフィードに書き込まず、読み出し時に合わせる"""
+    monkeypatch.setattr(settings, "timeline_fanout_max_daily_posts", 2)
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    carol = await create_user(db, "carol", 3)
+    room = await create_room(db, "room", alice, bob, carol)
+
+    expected = []
+    for i in range(4):
+        expected.append((await FeedService.create_post(db, alice.id, f"alice {i}")).id)
+        expected.append((await FeedService.create_post(db, carol.id, f"carol {i}")).id)
+    expected.reverse()
+
+    pulled = await db.execute(select(TimelinePullAuthor.user_id).order_by(TimelinePullAuthor.user_id))
+    assert list(pulled.scalars()) == [alice.id, carol.id]
+    bob_entries = await db.execute(
+        select(func.count()).select_from(TimelineFeedEntry).where(TimelineFeedEntry.user_id == bob.id)
+    )
+    assert bob_entries.scalar_one() == 4  # 2人の最初の2件ずつ
+
+    # 書き込んだ投稿と読み出し時に集めた投稿が投稿順に重複なく並ぶ
+    for limit in (1, 3, 50):
+        assert await _read_all(db, bob, limit) == expected
+    # 投稿者自身のフィードには全ての投稿が入り、他の投稿者の投稿も合わせる
+    assert await _read_all(db, alice, 3) == expected
+
+    with query_budget(2, "feed page with pull authors"):
+        await FeedService.get_feed_rows(db, bob.id, 3, expected[2])
+
+    # 読み出し時に集める投稿はルームを退出すると見えなくなる
+    await db.execute(
+        delete(RoomMember).where(RoomMember.room_id == room.id, RoomMember.user_id == bob.id)
+    )
+    await db.commit()
+    assert len(await _read_all(db, bob, 50)) == 4
+
+
+@requires_sqlite
+@pytest.mark.asyncio
+async def test_pull_author_page_skips_fanned_out_history(db, db_engine, monkeypatch):
+    """書き込み済みの投稿が多い投稿者でも、読み出し時の投稿はインデックスの範囲だけを読む"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    await create_room(db, "room", alice, bob)
+    history = [(await FeedService.create_post(db, alice.id, f"pushed {i}")).id for i in range(30)]
+    monkeypatch.setattr(settings, "timeline_fanout_max_daily_posts", 2)
+    pulled = [(await FeedService.create_post(db, alice.id, f"pulled {i}")).id for i in range(3)]
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    # 読み出し時の投稿より古いページ（書き込み済みの投稿だけが対象）
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        rows, has_more = await FeedService.get_feed_rows(db, bob.id, 5, pulled[0])
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+    assert [row.id for row in rows] == history[:-6:-1] and has_more
+
+    statement, parameters = statements[-1]
+    connection = await db.connection()
+    plan = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    details = [row[3] for row in plan.all() if "timeline_posts USING INDEX" in row[3]]
+    assert details == [
+        "SEARCH timeline_posts USING INDEX ix_timeline_posts_user_id_fanned_out_id "
+        "(user_id=? AND fanned_out=? AND id<?)"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pull_author_is_added_once(db, monkeypatch):
+    """投稿者の追加が重なっても主キー違反にならない"""
+    monkeypatch.setattr(settings, "timeline_fanout_max_daily_posts", 0)
+    alice = await create_user(db, "alice", 1)
+    assert await FeedService.get_pull_authors(db) == frozenset()
+
+    assert await FeedService._add_pull_author(db, alice.id)
+    assert not await FeedService._add_pull_author(db, alice.id)
+    await db.commit()
+
+    # 別の投稿が先に追加した直後（キャッシュは古いまま）の投稿
+    post = await FeedService.create_post(db, alice.id, "pulled")
+    assert not post.fanned_out
+    pulled = await db.execute(select(func.count()).select_from(TimelinePullAuthor))
+    assert pulled.scalar_one() == 1
+
+
+@pytest_asyncio.fixture
+async def api(db_engine):
+    """テストDBとログインユーザーを差し替えたAPIクライアントを作る関数"""
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    app = FastAPI()
+    app.include_router(router)
+
+    async def session():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_read_db] = session
+    clients = []
+
+    def client_for(user):
+        app.dependency_overrides[get_current_user] = lambda: user
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+        clients.append(client)
+        return client
+
+    yield client_for
+    for client in clients:
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_feed_endpoints(db, api):
+    """投稿してフィードをページングで取得する"""
+    alice = await create_user(db, "alice", 1)
+    bob = await create_user(db, "bob", 2)
+    await create_room(db, "room", alice, bob)
+    client = api(alice)
+
+    response = await client.post("/api/v1/timeline/posts", json={"content": "  "})
+    assert response.status_code == 400
+    for i in range(3):
+        response = await client.post(
+            "/api/v1/timeline/posts",
+            json={"content": f"`code` {i}", "post_type": "code_snippet"},
+        )
+        assert response.status_code == 201
+    assert response.json()["has_code"] is True
+
+    first = (await client.get("/api/v1/timeline/feed", params={"limit": 2})).json()
+    assert [post["content"] for post in first["posts"]] == ["`code` 2", "`code` 1"]
+    assert first["has_more"] is True
+    assert first["posts"][0]["user"]["username"] == "alice"
+    assert first["posts"][0]["post_type"] == "code_snippet"
+
+    second = (
+        await client.get(
+            "/api/v1/timeline/feed", params={"limit": 2, "before_id": first["next_before_id"]}
+        )
+    ).json()
+    assert [post["content"] for post in second["posts"]] == ["`code` 0"]
+    assert second == {**second, "has_more": False, "next_before_id": None}
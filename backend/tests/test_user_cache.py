@@ -0,0 +1,38 @@
+"""
+Tests for the authenticated-user cache
+"""
+import pytest
+from sqlalchemy import update
+
+from backend.auth.github_oauth import GitHubUser
+from backend.auth.user_service import UserService, user_cache
+from backend.models.user import User
+from tests.conftest import create_user
+
+
+@pytest.mark.asyncio
+async def test_cached_user_is_invalidated_on_update_and_deactivation(db):
+    """GitHub情報の更新と無効化でキャッシュが無効化される"""
+    alice = await create_user(db, "alice", 1)
+    hits = user_cache.stats()["hits"]
+
+    first = await UserService.get_cached_user_by_id(db, alice.id)
+    second = await UserService.get_cached_user_by_id(db, alice.id)
+    assert first.username == second.username == "alice"
+    assert first is not second  # リクエストごとに独立したインスタンス
+    assert user_cache.stats()["hits"] == hits + 1
+
+    # キャッシュを経由しない更新はTTLの間は見えない
+    await db.execute(update(User).where(User.id == alice.id).values(display_name="direct"))
+    await db.commit()
+    assert (await UserService.get_cached_user_by_id(db, alice.id)).display_name == "alice"
+
+    github_user = GitHubUser({"id": 1, "login": "alice-renamed", "name": "Alice"})
+    await UserService.update_user_from_github(db, alice, github_user)
+    cached = await UserService.get_cached_user_by_id(db, alice.id)
+    assert cached.username == "alice-renamed"
+
+    assert await UserService.deactivate_user(db, alice.id)
+    assert (await UserService.get_cached_user_by_id(db, alice.id)).is_active is False
+
+    assert await UserService.get_cached_user_by_id(db, 9999) is None
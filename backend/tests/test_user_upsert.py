@@ -0,0 +1,57 @@
+"""
+Tests for the write-avoiding GitHub user upsert
+"""
+import pytest
+from sqlalchemy import event, func, select
+
+from backend.auth.github_oauth import GitHubUser
+from backend.auth.user_service import UserService
+from backend.models.user import User
+
+
+def _github_user(**overrides) -> GitHubUser:
+    data = {"id": 42, "login": "octocat", "name": "Octo Cat", "email": "octo@example.com"}
+    data.update(overrides)
+    return GitHubUser(data)
+
+
+@pytest.mark.asyncio
+async def test_login_only_writes_when_profile_changes(db, db_engine):
+    """プロフィールに変更が無いログインでは書き込みが発生しない"""
+    writes = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            writes.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        user = await UserService.get_or_create_user_from_github(db, _github_user())
+        assert user.id is not None and user.username == "octocat"
+        assert len(writes) == 1
+
+        same = await UserService.get_or_create_user_from_github(db, _github_user())
+        assert same.id == user.id
+        assert len(writes) == 1
+
+        renamed = await UserService.get_or_create_user_from_github(
+            db, _github_user(login="octocat2")
+        )
+        assert renamed.id == user.id and renamed.username == "octocat2"
+        # upsertと参加ルームの更新カウンタ
+        assert len(writes) == 3
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest.mark.asyncio
+async def test_upsert_handles_existing_row_without_integrity_error(db):
+    """同じGitHub IDの行が既にあってもupsertは一意制約違反にならない"""
+    first = await UserService.upsert_user_from_github(db, _github_user())
+    # 同時ログインで相手が先に同じ内容を書き込んだ状況
+    second = await UserService.upsert_user_from_github(db, _github_user())
+    changed = await UserService.upsert_user_from_github(db, _github_user(bio="hello"))
+
+    assert first.id == second.id == changed.id
+    assert changed.bio == "hello"
+    assert (await db.execute(select(func.count(User.id)))).scalar() == 1
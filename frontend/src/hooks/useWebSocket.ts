@@ -24,6 +24,7 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
   const wsRef = useRef<WebSocket | null>(null)
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null)
   const reconnectAttempts = useRef(0)
+  const restartDelayRef = useRef<number | null>(null) // サーバー再起動時に通知された再接続までの遅延
   const isConnectingRef = useRef(false) // 接続試行中フラグを追加
   const optionsRef = useRef(options)
 
@@ -94,6 +95,12 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
           case 'connected':
             console.log('WebSocket authenticated successfully')
             break
+          case 'server_restart':
+            // 全クライアントが同時に再接続しないよう、サーバーが割り当てた遅延の後に再接続する
+            if (data.payload && typeof data.payload === 'object' && data.payload !== null && 'reconnect_after_ms' in data.payload) {
+              restartDelayRef.current = (data.payload as { reconnect_after_ms: number }).reconnect_after_ms
+            }
+            break
           default:
             console.log('Unknown message type:', data.type)
         }
@@ -114,6 +121,19 @@ export function useWebSocket(options: UseWebSocketOptions = {}) {
       setConnectionStatus('disconnected')
       isConnectingRef.current = false
 
+      // サーバーの再起動: エラー扱いせず、通知された遅延の後に再接続
+      if (event.code === 1012 && restartDelayRef.current !== null) {
+        const delay = restartDelayRef.current
+        restartDelayRef.current = null
+        console.log(`Server restarting, reconnecting in ${delay}ms...`)
+        reconnectTimeoutRef.current = setTimeout(() => {
+          if (!isConnectingRef.current) {
+            connect(roomId)
+          }
+        }, delay)
+        return
+      }
+
       // エラー詳細をユーザーに通知
       if (event.code === 4001) {
         optionsRef.current.onError?.('認証に失敗しました')